@@ -1,26 +1,47 @@
 from __future__ import annotations
 
-from .api import (
-    run_file_sql,
-    sas_to_pandas,
-    wrds_to_pg,
-    wrds_update,
-    wrds_update_csv,
-    wrds_update_pq,
-)
+import importlib
 
-from .postgres.engine import make_engine
-from .postgres.ddl import process_sql
-from .sas.metadata import proc_contents
+# Public names and the modules that define them. They are imported on first
+# use, so `import wrds2pg` (and the command-line tool) starts quickly without
+# loading pandas, pyarrow, SQLAlchemy or paramiko.
+_EXPORTS = {
+    "wrds_update": ".api",
+    "wrds_update_async": ".api",
+    "wrds_update_pq": ".api",
+    "wrds_update_csv": ".api",
+    "wrds_update_ipc": ".api",
+    "wrds_update_duckdb": ".api",
+    "wrds_update_multi": ".api",
+    "wrds_to_pg": ".api",
+    "wrds_to_pg_async": ".postgres.aio",
+    "sas_to_pandas": ".api",
+    "sas_to_arrow": ".api",
+    "run_file_sql": ".api",
+    "run_sql_script": ".postgres.script",
+    "read_wrds_pq": ".files.parquet",
+    "read_wrds_pq_pandas": ".files.parquet",
+    "iter_wrds_pq": ".files.parquet",
+    "read_wrds_ipc": ".files.ipc",
+    "csv_to_pg": ".postgres.ingest",
+    "pg_to_arrow": ".postgres.arrow",
+    "pg_to_pq": ".postgres.arrow",
+    "make_engine": ".postgres.engine",
+    "process_sql": ".postgres.ddl",
+    "proc_contents": ".sas.metadata",
+    "Progress": ".progress",
+    "plan_update": ".plan",
+}
 
-__all__ = [
-    "wrds_update",
-    "wrds_update_pq",
-    "wrds_update_csv",
-    "wrds_to_pg",
-    "sas_to_pandas",
-    "run_file_sql",
-    "make_engine",
-    "process_sql",
-    "proc_contents"
-]
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,8 +1,122 @@
 # wrds2pg/_utils.py
 from __future__ import annotations
 
+import io
+import os
+import re
 from datetime import datetime, timezone
 
+_SIZE_UNITS = {"": 1, "k": 10**3, "m": 10**6, "g": 10**9, "t": 10**12,
+               "ki": 2**10, "mi": 2**20, "gi": 2**30, "ti": 2**40}
+
 def get_now() -> str:
     """Return current UTC time as a compact string."""
     return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+def parse_size(size) -> int:
+    """Return a size in bytes from an int or a string like "512MB" or "2GiB"."""
+    if isinstance(size, (int, float)):
+        return int(size)
+    m = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([kmgt]i?)?b?\s*", str(size), re.IGNORECASE)
+    if not m:
+        raise ValueError(f"Cannot parse size {size!r}; use bytes or e.g. '512MB', '2GiB'.")
+    return int(float(m.group(1)) * _SIZE_UNITS[(m.group(2) or "").lower()])
+
+def rss_bytes() -> int | None:
+    """Return the resident set size of this process, or None if unknown."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # peak rather than current RSS; kilobytes on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if os.uname().sysname == "Darwin" else rss * 1024
+
+class IterStream(io.TextIOBase):
+    """
+    Read-only text stream over an iterator of strings.
+
+    Lets generated text (e.g., CSV built from decoded chunks) be consumed by
+    code written for SAS output streams, which uses `readline()` and
+    `read(n)`.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buf = ""
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def _next_chunk(self):
+        """Replace the consumed buffer with the next chunk; False at EOF."""
+        for chunk in self._chunks:
+            if chunk:
+                self._buf = self._buf[self._pos:] + chunk
+                self._pos = 0
+                return True
+        return False
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            parts = [self._buf[self._pos:], *self._chunks]
+            self._buf, self._pos = "", 0
+            return "".join(parts)
+        while len(self._buf) - self._pos < size:
+            if not self._next_chunk():
+                break
+        out = self._buf[self._pos:self._pos + size]
+        self._pos += len(out)
+        return out
+
+    def readline(self, size=-1):
+        while True:
+            end = self._buf.find("\n", self._pos)
+            if end >= 0:
+                end += 1
+                break
+            if not self._next_chunk():
+                end = len(self._buf)
+                break
+        if size is not None and size >= 0:
+            end = min(end, self._pos + size)
+        out = self._buf[self._pos:end]
+        self._pos = end
+        return out
+
+class EncodedStream(io.RawIOBase):
+    """
+    Read-only byte stream over a text stream, encoding as it reads.
+
+    Lets byte-oriented readers (e.g., `pyarrow.csv.open_csv()`) consume a
+    text stream such as `IterStream` or a decoded SAS stream. Wrap it in
+    `io.BufferedReader` for efficient `readline()`.
+    """
+
+    def __init__(self, stream, encoding="utf-8", chunk_size=1 << 20):
+        self._stream = stream
+        self._encoding = encoding
+        self._chunk_size = chunk_size
+        self._buf = b""
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while self._pos >= len(self._buf):
+            text = self._stream.read(self._chunk_size)
+            if not text:
+                return 0
+            self._buf = text.encode(self._encoding)
+            self._pos = 0
+        n = min(len(b), len(self._buf) - self._pos)
+        b[:n] = self._buf[self._pos:self._pos + n]
+        self._pos += n
+        return n
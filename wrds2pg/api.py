@@ -1,14 +1,72 @@
+"""
+Update local copies of WRDS tables.
+
+`wrds_update()` (PostgreSQL), `wrds_update_pq()` (Parquet),
+`wrds_update_ipc()` (Arrow IPC), `wrds_update_duckdb()` (DuckDB),
+`wrds_update_csv()` (gzipped CSV) and `wrds_update_multi()` (several of
+these at once) share the following options.
+
+source: string [Optional]
+    How data are obtained from WRDS. The default `"sas"` runs SAS's
+    PROC EXPORT on WRDS. `"sftp"` downloads the raw `.sas7bdat` file over
+    SFTP and decodes it locally, which avoids SAS formatting time on WRDS
+    for very large tables. `where` is not supported with `"sftp"`.
+    `"pg"` copies the table from a PostgreSQL server (`pg_source`)
+    without any CSV: binary COPY into PostgreSQL, or typed batches into
+    Parquet, IPC or DuckDB. `where` is then SQL.
+
+fix_local: Boolean [Optional]
+    Set to `True` to apply `fix_cr` and `fix_missing` to the data stream
+    locally rather than having SAS do it for every row on WRDS.
+    Default is `False`.
+
+progress: Progress or callable [Optional]
+    Receives per-stage timing and throughput while the update runs
+    (see `wrds2pg.progress.Progress`). A bare callable is called with a
+    `ProgressEvent` every few seconds and once at the end. Pass a
+    `Progress` instance to read the breakdown afterwards with
+    `progress.summary()`.
+
+spool: ExtractSpool or Boolean [Optional]
+    Local store of compressed WRDS extracts (see
+    `wrds2pg.spool.ExtractSpool`). When the same extract of the same
+    version of the table is stored, it is replayed from local disk
+    instead of being downloaded again (e.g., after changing `col_types`
+    or to rebuild a database); otherwise the download is stored.
+    Default is a spool in `WRDS2PG_SPOOL_DIR`, if that is set.
+
+pg_source: SQLAlchemy engine [Optional]
+    Source server for `source="pg"`. Default is the WRDS PostgreSQL
+    server (`make_wrds_engine()`). The freshness check uses the source
+    table's comment if it holds a "Last modified" stamp (as tables
+    written by `wrds_update()` do), otherwise SAS on WRDS.
+
+metrics: sink, list of sinks or string [Optional]
+    Where to send a structured record of the run (table, outcome,
+    duration, freshness-check and metadata time, bytes, rows, retries
+    and per-stage times). See `wrds2pg.metrics.get_metrics_sinks()`:
+    e.g., "runs.jsonl" appends JSON lines, a directory gets Prometheus
+    textfile-collector files and "otel" records OpenTelemetry spans.
+    The default is to use the environment value `WRDS2PG_METRICS`.
+"""
 from __future__ import annotations
 
+import asyncio
+import codecs
+import csv
+import functools
+import inspect
+import io
 import os
 import tempfile
 from pathlib import Path
 
-from ._utils import get_now
+from ._utils import EncodedStream, get_now, parse_size
+from .progress import as_progress
 
 # --- SAS / WRDS ---
 from .sas.stream import get_process_stream, get_wrds_process_stream
-from .sas.metadata import get_modified_str, get_table_metadata
+from .sas.metadata import get_modified_str, get_modified_str_async, get_table_metadata
 
 # --- Postgres ---
 from .postgres.ddl import (
@@ -19,21 +77,95 @@ from .postgres.ddl import (
     create_role,
     create_table_sql,
 )
-from .postgres.engine import make_engine
+from .postgres.engine import make_engine, make_wrds_engine
 from .postgres.copy import wrds_to_pg, wrds_process_to_pg
 
 # --- Files ---
 from .files.csv import (
     wrds_to_csv,
     get_modified_csv,
+    set_csv_col_types,
     set_modified_csv,
 )
 from .files.paths import get_pq_file
-from .files.parquet import (
-    get_modified_pq,
-    csv_to_pq_arrow_stream,
-)
 
+def _recorded(mode):
+    """
+    Decorate an update function to send a run record to its `metrics` sinks.
+
+    The record is built from the function's `progress` after it returns or
+    raises (see `wrds2pg.metrics.run_record()`).
+    """
+    def decorate(func):
+        signature = inspect.signature(func)
+
+        def bind(args, kwargs):
+            from .metrics import get_metrics_sinks
+
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            params = bound.arguments
+            sinks = get_metrics_sinks(params["metrics"])
+            if sinks:
+                table = f'{params["schema"]}.{params["alt_table_name"] or params["table_name"]}'
+                params["progress"] = as_progress(params["progress"], table=table)
+            return bound, sinks, params.get("source", "sas")
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                bound, sinks, source = bind(args, kwargs)
+                if not sinks:
+                    return await func(*bound.args, **bound.kwargs)
+                from .metrics import emit_run
+
+                progress = bound.arguments["progress"]
+                try:
+                    result = await func(*bound.args, **bound.kwargs)
+                except (Exception, asyncio.CancelledError) as e:
+                    emit_run(sinks, progress.finish(), mode, source, error=e)
+                    raise
+                emit_run(sinks, progress.summary(), mode, source)
+                return result
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound, sinks, source = bind(args, kwargs)
+            if not sinks:
+                return func(*bound.args, **bound.kwargs)
+            from .metrics import emit_run
+
+            progress = bound.arguments["progress"]
+            try:
+                result = func(*bound.args, **bound.kwargs)
+            except Exception as e:
+                emit_run(sinks, progress.finish(), mode, source, error=e)
+                raise
+            emit_run(sinks, progress.summary(), mode, source)
+            return result
+
+        return wrapper
+    return decorate
+
+def _get_modified(table_name, sas_schema, wrds_id, encoding, source, pg_source):
+    """
+    Return the WRDS last-modified string of a table.
+
+    With `source="pg"`, the comment of the source table is used if it holds
+    one (as written by `wrds_update()`); otherwise SAS is asked if a WRDS ID
+    is available.
+    """
+    if source == "pg":
+        from .postgres.source import get_pg_modified
+
+        modified = get_pg_modified(table_name, sas_schema, pg_source)
+        if modified or wrds_id is None:
+            return modified
+    return get_modified_str(table_name, sas_schema, wrds_id, encoding=encoding)
+
+@_recorded("pg")
 def wrds_update(
     table_name, schema,
     host=None,
@@ -46,7 +178,8 @@ def wrds_update(
     alt_table_name=None,
     col_types=None, create_roles=True,
     encoding=None, sas_schema=None, sas_encoding=None,
-    tz="UTC",
+    tz="UTC", source="sas", fix_local=False,
+    checkpoint_rows=None, progress=None, spool=None, pg_source=None, metrics=None,
 ):
     """Update a PostgreSQL table using WRDS SAS data.
 
@@ -138,6 +271,16 @@ def wrds_update(
     sas_encoding: string
         Encoding of the SAS data file.
 
+    source, fix_local, progress, spool, pg_source, metrics: [Optional]
+        Options shared by the update functions; see the `wrds2pg.api`
+        module documentation.
+
+    checkpoint_rows: Integer [Optional]
+        If set, data are committed in batches of about this many rows to a
+        staging table. If the connection to WRDS drops, the transfer resumes
+        from the last committed row instead of starting over. The existing
+        table is replaced only when the new one is complete.
+
     Returns
     -------
     Boolean indicating function reached the end.
@@ -158,10 +301,12 @@ def wrds_update(
     if dbname is None:
         dbname = os.environ.get("PGDATABASE")
 
-    if wrds_id is None:
+    if wrds_id is None and not (source == "pg" and pg_source is not None):
         raise ValueError(
             "You must provide `wrds_id` or set the `WRDS_ID` environment variable."
         )
+    if source == "pg" and pg_source is None:
+        pg_source = make_wrds_engine(wrds_id)
 
     if sas_schema is None:
         sas_schema = schema
@@ -171,20 +316,26 @@ def wrds_update(
     if engine is None:
         engine = make_engine(host=host, dbname=dbname)
 
+    progress = as_progress(progress, table=f"{schema}.{alt_table_name}")
+
     # 1. Get comments from PostgreSQL database
     comment = get_table_comment(alt_table_name, schema, engine)
 
     # 2. Get modified date from WRDS
-    modified = get_modified_str(table_name, sas_schema, wrds_id, encoding=encoding)
+    with progress.timed("freshness"):
+        modified = _get_modified(table_name, sas_schema, wrds_id, encoding, source, pg_source)
     if not modified:
+        progress.finish("unavailable")
         return False
 
     # 3. If updated table available, get from WRDS
     if modified == comment and not force:
         print(f"{schema}.{alt_table_name} already up to date.")
+        progress.finish("up_to_date")
         return False
     elif modified == "" and not force:
         print("WRDS flaked out!")
+        progress.finish("unavailable")
         return False
     else:
         if force:
@@ -212,6 +363,13 @@ def wrds_update(
             sas_schema=sas_schema,
             sas_encoding=sas_encoding,
             tz=tz,
+            source=source,
+            fix_local=fix_local,
+            checkpoint_rows=checkpoint_rows,
+            progress=progress,
+            spool=spool,
+            modified=modified,
+            pg_source=pg_source,
         )
 
         set_table_comment(alt_table_name, schema, modified, engine)
@@ -233,8 +391,125 @@ def wrds_update(
                 engine,
             )
 
+        progress.finish("updated")
         return True
     
+@_recorded("pg")
+async def wrds_update_async(
+    table_name, schema,
+    host=None,
+    wrds_id=None,
+    dbname=None,
+    engine=None,
+    force=False,
+    fix_missing=False, fix_cr=False, drop=None, keep=None,
+    obs=None, rename=None, where=None,
+    alt_table_name=None,
+    col_types=None, create_roles=True,
+    encoding=None, sas_schema=None, sas_encoding=None,
+    tz="UTC", progress=None, metrics=None,
+):
+    """Update a PostgreSQL table using WRDS SAS data, in an asyncio program.
+
+    This is `wrds_update()` as a coroutine. The freshness check and the
+    export are SAS jobs whose output is read without blocking the event
+    loop, and data are loaded with psycopg's `AsyncConnection` COPY, so
+    many checks and transfers can be interleaved in one loop. SAS output
+    is read only as fast as PostgreSQL takes it.
+
+    The new table is loaded and swapped in, with its comment and grants, in
+    one transaction (see `wrds2pg.postgres.aio.wrds_to_pg_async()`). If
+    the task is cancelled (e.g., by `asyncio.timeout()` or
+    `task.cancel()`), the SAS job on WRDS is stopped, the load is rolled
+    back and the existing table is left unchanged.
+
+    Parameters
+    ----------
+    Parameters are as for `wrds_update()`. Only SAS on WRDS is supported
+    as a source (no `source`, `fix_local`, `checkpoint_rows`, `spool` or
+    `pg_source`). `engine`, if given, is a SQLAlchemy engine used only for
+    its connection parameters.
+
+    Returns
+    -------
+    Boolean indicating whether the table was updated.
+
+    Examples
+    ----------
+    >>> async def update_all(tables, jobs=4):
+    ...     limit = asyncio.Semaphore(jobs)   # WRDS limits concurrent sessions
+    ...     async def update(table):
+    ...         async with limit:
+    ...             return await wrds_update_async(table, "crsp")
+    ...     return await asyncio.gather(*(update(t) for t in tables))
+    >>> asyncio.run(update_all(["dsi", "msi", "stocknames"]))
+    """
+    from .postgres.aio import get_table_comment_async, wrds_to_pg_async
+
+    if wrds_id is None:
+        wrds_id = os.environ.get("WRDS_ID")
+    if wrds_id is None:
+        raise ValueError(
+            "You must provide `wrds_id` or set the `WRDS_ID` environment variable."
+        )
+
+    if sas_schema is None:
+        sas_schema = schema
+    if alt_table_name is None:
+        alt_table_name = table_name
+
+    if engine is None:
+        engine = make_engine(host=host, dbname=dbname)
+
+    progress = as_progress(progress, table=f"{schema}.{alt_table_name}")
+
+    comment = await get_table_comment_async(alt_table_name, schema, engine)
+
+    with progress.timed("freshness"):
+        modified = await get_modified_str_async(table_name, sas_schema, wrds_id,
+                                                encoding=encoding or "utf-8")
+    if not modified:
+        progress.finish("unavailable")
+        return False
+
+    if modified == comment and not force:
+        print(f"{schema}.{alt_table_name} already up to date.")
+        progress.finish("up_to_date")
+        return False
+
+    if force:
+        print("Forcing update based on user request.")
+    else:
+        print(f"Updated {schema}.{table_name} is available.")
+        print("Getting from WRDS.")
+
+    await wrds_to_pg_async(
+        table_name=table_name,
+        schema=schema,
+        engine=engine,
+        wrds_id=wrds_id,
+        fix_missing=fix_missing,
+        fix_cr=fix_cr,
+        drop=drop,
+        keep=keep,
+        obs=obs,
+        rename=rename,
+        where=where,
+        alt_table_name=alt_table_name,
+        encoding=encoding,
+        col_types=col_types,
+        create_roles=create_roles,
+        sas_schema=sas_schema,
+        sas_encoding=sas_encoding,
+        tz=tz,
+        progress=progress,
+        modified=modified,
+    )
+
+    progress.finish("updated")
+    return True
+
+@_recorded("parquet")
 def wrds_update_pq(
     table_name,
     schema,
@@ -253,6 +528,14 @@ def wrds_update_pq(
     encoding="utf-8",
     sas_schema=None,
     sas_encoding=None,
+    source="sas",
+    fix_local=False,
+    progress=None,
+    spool=None,
+    pg_source=None,
+    metrics=None,
+    memory_limit=None,
+    delta=False,
 ):
     """Update a local parquet version of a WRDS table.
 
@@ -330,6 +613,29 @@ def wrds_update_pq(
         
     sas_encoding: string
         Encoding of the SAS data file.
+
+    source, fix_local, progress, spool, pg_source, metrics: [Optional]
+        Options shared by the update functions; see the `wrds2pg.api`
+        module documentation.
+
+    memory_limit: int or string [Optional]
+        Resident memory the process should stay under while converting CSV
+        to Parquet, in bytes or as a string such as "2GB" or "512MiB".
+        CSV block size, parsing threads and row-group size are chosen to fit
+        (see `wrds2pg.files.parquet.memory_plan()`), so several conversions
+        can share a machine. Peak resident memory is printed and recorded
+        as the `peak_rss` counter of `progress`. Applies to SAS sources.
+
+    delta: boolean [Optional]
+        Write row groups of a fixed number of rows, in export order, and
+        store a digest of each in the file metadata (see
+        `wrds2pg.files.parquet.get_row_group_digests()`). Row groups whose
+        rows are unchanged since the last `delta=True` update are encoded
+        to the same bytes, so tools that sync files by block (rsync, object
+        store sync) transfer only what changed; e.g., appending rows to a
+        table changes only its last row groups. The number of unchanged
+        row groups is printed and recorded as the `row_groups_unchanged`
+        counter of `progress`. Applies to SAS sources.
     
     Returns
     -------
@@ -343,10 +649,21 @@ def wrds_update_pq(
                         "audit", drop="match: closest: prior:")
     """
     # --- resolve environment-backed defaults ---
+    from .postgres.arrow import pg_to_pq
+    from .postgres.source import get_pg_table_metadata
+    from .files.parquet import (
+        get_modified_pq,
+        csv_to_pq_arrow_stream,
+        get_row_group_digests,
+        memory_plan,
+    )
+
     if wrds_id is None:
         wrds_id = os.environ.get("WRDS_ID")
-    if wrds_id is None:
+    if wrds_id is None and not (source == "pg" and pg_source is not None):
         raise ValueError("You must provide `wrds_id` or set the `WRDS_ID` environment variable.")
+    if source == "pg" and pg_source is None:
+        pg_source = make_wrds_engine(wrds_id)
 
     if data_dir is None:
         data_dir = os.environ.get("DATA_DIR")
@@ -360,20 +677,22 @@ def wrds_update_pq(
         alt_table_name = table_name
 
     pq_file = get_pq_file(table_name=alt_table_name, schema=schema, data_dir=data_dir)
+    progress = as_progress(progress, table=f"{schema}.{alt_table_name}")
+    if memory_limit is not None:
+        memory_plan(memory_limit)  # an unworkable limit fails before downloading
 
-    modified = get_modified_str(
-        table_name=table_name,
-        sas_schema=sas_schema,
-        wrds_id=wrds_id,
-        encoding=encoding,
-    )
-    if modified is None:
+    with progress.timed("freshness"):
+        modified = _get_modified(table_name, sas_schema, wrds_id, encoding, source,
+                                 pg_source)
+    if not modified:
+        progress.finish("unavailable")
         return False
 
     pq_modified = get_modified_pq(pq_file)
 
     if modified == pq_modified and not force:
         print(f"{schema}.{alt_table_name} already up to date.")
+        progress.finish("up_to_date")
         return False
 
     if force:
@@ -383,8 +702,34 @@ def wrds_update_pq(
         print("Getting from WRDS.")
 
     print(f"Beginning file download at {get_now()} UTC.")
+
+    if source == "pg":
+        with progress.timed("pg_metadata"):
+            meta = get_pg_table_metadata(table_name, sas_schema, pg_source, drop=drop,
+                                         keep=keep, rename=rename, col_types=col_types)
+        pg_to_pq(table_name, sas_schema, pg_source, pq_file=pq_file, meta=meta,
+                 modified=modified, where=where, obs=obs, progress=progress)
+        print("Parquet file: " + str(pq_file))
+        print(f"Completed creation of parquet file at {get_now()}.\n")
+        progress.finish("updated")
+        return True
+
     print("Saving data to temporary CSV.")
 
+    with progress.timed("sas_metadata"):
+        meta = get_table_metadata(
+            table_name=table_name,
+            wrds_id=wrds_id,
+            drop=drop,
+            keep=keep,
+            rename=rename,
+            sas_schema=sas_schema,
+            encoding=encoding,
+            col_types=col_types,    # user overrides
+        )
+    names = meta["names"]
+    col_types_out = meta["col_types"]
+
     csv_file = tempfile.NamedTemporaryFile(suffix=".csv.gz", delete=False).name
     try:
         wrds_to_csv(
@@ -402,23 +747,25 @@ def wrds_update_pq(
             where=where,
             sas_schema=sas_schema,
             sas_encoding=sas_encoding,
+            source=source,
+            col_types=col_types_out,
+            fix_local=fix_local,
+            progress=progress,
+            spool=spool,
+            modified=modified,
         )
 
         print("Converting temporary CSV to parquet.")
-        meta = get_table_metadata(
-            table_name=table_name,
-            wrds_id=wrds_id,
-            drop=drop,
-            keep=keep,
-            rename=rename,
-            sas_schema=sas_schema,
-            encoding=encoding,
-            col_types=col_types,    # user overrides
-        )
-        
-        names = meta["names"]
-        col_types_out = meta["col_types"]
-        csv_to_pq_arrow_stream(csv_file, pq_file, names, col_types_out, modified)
+        previous = get_row_group_digests(pq_file) if delta else None
+        csv_to_pq_arrow_stream(csv_file, pq_file, names, col_types_out, modified,
+                               memory_limit=memory_limit, delta=delta, previous=previous,
+                               progress=progress)
+        if delta:
+            print(f"{progress.counters.get('row_groups_unchanged', 0)} of "
+                  f"{progress.counters.get('row_groups', 0)} row groups unchanged.")
+        if memory_limit is not None and "peak_rss" in progress.counters:
+            print(f"Peak memory use: {progress.counters['peak_rss'] / 2**20:.0f} MiB "
+                  f"(limit {parse_size(memory_limit) / 2**20:.0f} MiB).")
 
     finally:
         # optional: clean up the temp csv; only do this if csv_to_pq doesn't need it afterward
@@ -429,8 +776,312 @@ def wrds_update_pq(
 
     print("Parquet file: " + str(pq_file))
     print(f"Completed creation of parquet file at {get_now()}.\n")
+    progress.finish("updated")
     return True
 
+@_recorded("ipc")
+def wrds_update_ipc(
+    table_name,
+    schema,
+    wrds_id=None,
+    data_dir=None,
+    force=False,
+    fix_missing=False,
+    fix_cr=False,
+    drop=None,
+    keep=None,
+    obs=None,
+    rename=None,
+    where=None,
+    alt_table_name=None,
+    col_types=None,
+    encoding="utf-8",
+    sas_schema=None,
+    sas_encoding=None,
+    source="sas",
+    fix_local=False,
+    compression=None,
+    progress=None,
+    spool=None,
+    pg_source=None,
+    metrics=None,
+):
+    """Update a local Arrow IPC (Feather v2) version of a WRDS table.
+
+    The file is `{data_dir}/{schema}/{alt_table_name}.arrow` and carries the
+    WRDS last-modified stamp in its schema metadata, as Parquet files do.
+    Column types follow `col_types` as for `wrds_update_pq()`. An
+    uncompressed file can be memory-mapped and loaded without copying or
+    decoding (see `read_wrds_ipc()`), which suits tables read many times;
+    it is larger on disk than Parquet.
+
+    CSV from WRDS is converted as it arrives, without a temporary file.
+
+    Parameters
+    ----------
+    compression: string [Optional]
+        None (default) for an uncompressed, memory-mappable file, or "lz4"
+        or "zstd" for smaller files that must be decompressed when read.
+
+    Other parameters are those of `wrds_update_pq()`.
+
+    Returns
+    -------
+    Boolean indicating function reached the end.
+    This should mean that an Arrow IPC file was created.
+
+    Examples
+    ----------
+    >>> wrds_update_ipc("dsf", "crsp", keep="permno date ret")
+    >>> dsf = read_wrds_ipc("dsf", "crsp")
+    """
+    # --- resolve environment-backed defaults ---
+    import pyarrow as pa
+
+    from .postgres.arrow import _column_plan, iter_pg_arrow
+    from .postgres.source import get_pg_table_metadata
+    from .files.ipc import IPCWriter, csv_batches, get_ipc_file, get_modified_ipc
+    from .files.parquet import _arrow_schema
+
+    if wrds_id is None:
+        wrds_id = os.environ.get("WRDS_ID")
+    if wrds_id is None and not (source == "pg" and pg_source is not None):
+        raise ValueError("You must provide `wrds_id` or set the `WRDS_ID` environment variable.")
+    if source == "pg" and pg_source is None:
+        pg_source = make_wrds_engine(wrds_id)
+
+    if sas_schema is None:
+        sas_schema = schema
+    if alt_table_name is None:
+        alt_table_name = table_name
+
+    ipc_file = get_ipc_file(alt_table_name, schema, data_dir)
+    progress = as_progress(progress, table=f"{schema}.{alt_table_name}")
+
+    with progress.timed("freshness"):
+        modified = _get_modified(table_name, sas_schema, wrds_id, encoding, source,
+                                 pg_source)
+    if not modified:
+        progress.finish("unavailable")
+        return False
+
+    if modified == get_modified_ipc(ipc_file) and not force:
+        print(f"{schema}.{alt_table_name} already up to date.")
+        progress.finish("up_to_date")
+        return False
+
+    if force:
+        print("Forcing update based on user request.")
+    else:
+        print(f"Updated {schema}.{alt_table_name} is available.")
+    print(f"Beginning file download at {get_now()} UTC.")
+
+    if source == "pg":
+        with progress.timed("pg_metadata"):
+            meta = get_pg_table_metadata(table_name, sas_schema, pg_source, drop=drop,
+                                         keep=keep, rename=rename, col_types=col_types)
+        with IPCWriter(ipc_file, modified, compression=compression, progress=progress,
+                       schema=pa.schema(_column_plan(meta)[2])) as writer:
+            for batch in iter_pg_arrow(table_name, sas_schema, pg_source, where=where,
+                                       obs=obs, meta=meta, progress=progress):
+                writer.write_batch(batch)
+    else:
+        with progress.timed("sas_metadata"):
+            meta = get_table_metadata(
+                table_name=table_name,
+                wrds_id=wrds_id,
+                drop=drop,
+                keep=keep,
+                rename=rename,
+                sas_schema=sas_schema,
+                encoding=encoding,
+                col_types=col_types,
+            )
+        # the file is kept only if the SAS job also ends without error
+        with IPCWriter(ipc_file, modified, compression=compression, progress=progress,
+                       schema=_arrow_schema(meta["names"], meta["col_types"])) as writer, \
+                get_wrds_process_stream(
+                    table_name=table_name,
+                    schema=sas_schema,
+                    wrds_id=wrds_id,
+                    drop=drop,
+                    keep=keep,
+                    fix_cr=fix_cr,
+                    fix_missing=fix_missing,
+                    obs=obs,
+                    rename=rename,
+                    where=where,
+                    sas_encoding=sas_encoding,
+                    stream_encoding=encoding,
+                    source=source,
+                    col_types=meta["col_types"],
+                    fix_local=fix_local,
+                    progress=progress,
+                    spool=spool,
+                    modified=modified,
+                ) as stream:
+            for batch in csv_batches(EncodedStream(stream, encoding), meta["names"],
+                                     meta["col_types"], progress=progress):
+                writer.write_batch(batch)
+
+    print("Arrow IPC file: " + str(ipc_file))
+    print(f"Completed creation of Arrow IPC file at {get_now()}.\n")
+    progress.finish("updated")
+    return True
+
+@_recorded("duckdb")
+def wrds_update_duckdb(
+    table_name,
+    schema,
+    database=None,
+    wrds_id=None,
+    force=False,
+    fix_missing=False,
+    fix_cr=False,
+    drop=None,
+    keep=None,
+    obs=None,
+    rename=None,
+    where=None,
+    alt_table_name=None,
+    col_types=None,
+    encoding="utf-8",
+    sas_schema=None,
+    sas_encoding=None,
+    source="sas",
+    fix_local=False,
+    progress=None,
+    spool=None,
+    pg_source=None,
+    metrics=None,
+):
+    """Update a table in a local DuckDB database.
+
+    The table `schema.alt_table_name` gets the column types of
+    `wrds_update()` (from `get_table_metadata()` and `col_types`, mapped to
+    DuckDB types). CSV from WRDS is parsed into Arrow batches as it arrives
+    and inserted through DuckDB's Arrow scan in a single pass, without a
+    temporary file. The WRDS last-modified stamp is recorded in the table
+    `main._wrds2pg_sync`, which serves the freshness check as the table
+    comment does for `wrds_update()`.
+
+    Parameters
+    ----------
+    database: string or DuckDB connection [Optional]
+        Path of the DuckDB database file, or an open connection.
+        The default is to use the environment value `DUCKDB_DATABASE`.
+
+    Other parameters are those of `wrds_update()`. Requires `duckdb`.
+
+    Returns
+    -------
+    Boolean indicating function reached the end.
+    This should mean that the table was updated.
+
+    Examples
+    ----------
+    >>> wrds_update_duckdb("dsi", "crsp", database="~/wrds.duckdb")
+    >>> wrds_update_duckdb("funda", "comp", database="~/wrds.duckdb",
+                           keep="gvkey datadate fyear at sale",
+                           col_types={"fyear": "integer"})
+    """
+    # --- resolve environment-backed defaults ---
+    from .duck import batches_to_duckdb, connect_duckdb, get_modified_duckdb
+    from .postgres.arrow import iter_pg_arrow
+    from .postgres.source import get_pg_table_metadata
+    from .files.ipc import csv_batches
+
+    if wrds_id is None:
+        wrds_id = os.environ.get("WRDS_ID")
+    if wrds_id is None and not (source == "pg" and pg_source is not None):
+        raise ValueError("You must provide `wrds_id` or set the `WRDS_ID` environment variable.")
+    if source == "pg" and pg_source is None:
+        pg_source = make_wrds_engine(wrds_id)
+
+    if sas_schema is None:
+        sas_schema = schema
+    if alt_table_name is None:
+        alt_table_name = table_name
+
+    con, close = connect_duckdb(database)
+    try:
+        progress = as_progress(progress, table=f"{schema}.{alt_table_name}")
+
+        with progress.timed("freshness"):
+            modified = _get_modified(table_name, sas_schema, wrds_id, encoding, source,
+                                     pg_source)
+        if not modified:
+            progress.finish("unavailable")
+            return False
+
+        if modified == get_modified_duckdb(alt_table_name, schema, con) and not force:
+            print(f"{schema}.{alt_table_name} already up to date.")
+            progress.finish("up_to_date")
+            return False
+
+        if force:
+            print("Forcing update based on user request.")
+        else:
+            print(f"Updated {schema}.{alt_table_name} is available.")
+        print(f"Beginning file download at {get_now()} UTC.")
+
+        if source == "pg":
+            with progress.timed("pg_metadata"):
+                meta = get_pg_table_metadata(table_name, sas_schema, pg_source, drop=drop,
+                                             keep=keep, rename=rename, col_types=col_types)
+            batches = iter_pg_arrow(table_name, sas_schema, pg_source, where=where,
+                                    obs=obs, meta=meta, progress=progress)
+        else:
+            with progress.timed("sas_metadata"):
+                meta = get_table_metadata(
+                    table_name=table_name,
+                    wrds_id=wrds_id,
+                    drop=drop,
+                    keep=keep,
+                    rename=rename,
+                    sas_schema=sas_schema,
+                    encoding=encoding,
+                    col_types=col_types,
+                )
+
+            def sas_batches():
+                # a SAS error reported when the stream closes surfaces here,
+                # before the new table replaces the old one
+                with get_wrds_process_stream(
+                    table_name=table_name,
+                    schema=sas_schema,
+                    wrds_id=wrds_id,
+                    drop=drop,
+                    keep=keep,
+                    fix_cr=fix_cr,
+                    fix_missing=fix_missing,
+                    obs=obs,
+                    rename=rename,
+                    where=where,
+                    sas_encoding=sas_encoding,
+                    stream_encoding=encoding,
+                    source=source,
+                    col_types=meta["col_types"],
+                    fix_local=fix_local,
+                    progress=progress,
+                    spool=spool,
+                    modified=modified,
+                ) as stream:
+                    yield from csv_batches(EncodedStream(stream, encoding), meta["names"],
+                                           meta["col_types"], progress=progress)
+            batches = sas_batches()
+
+        batches_to_duckdb(batches, alt_table_name, schema, meta["names"],
+                          meta["col_types"], modified, con, progress=progress)
+    finally:
+        if close:
+            con.close()
+
+    print(f"Completed update of {schema}.{alt_table_name} at {get_now()} UTC.\n")
+    progress.finish("updated")
+    return True
+
+@_recorded("csv")
 def wrds_update_csv(
     table_name,
     schema,
@@ -445,9 +1096,15 @@ def wrds_update_csv(
     rename=None,
     where=None,
     alt_table_name=None,
+    col_types=None,
     encoding="utf-8",
     sas_schema=None,
     sas_encoding=None,
+    source="sas",
+    fix_local=False,
+    progress=None,
+    spool=None,
+    metrics=None,
 ):
     """Update a local gzipped CSV version of a WRDS table.
 
@@ -498,6 +1155,11 @@ def wrds_update_csv(
         Basename of CSV file. Used when file should have different name from
         table_name.
 
+    col_types: Dict [Optional]
+        Column types, as for `wrds_update()`. The types of the export are
+        stored next to the CSV file (`{table}.col_types.json`) for
+        `csv_to_pg()`.
+
     encoding: string [Optional]
         Encoding to be used for text emitted by SAS.
 
@@ -508,6 +1170,10 @@ def wrds_update_csv(
     sas_encoding: string
         Encoding of the SAS data file.
 
+    source, fix_local, progress, spool, metrics: [Optional]
+        Options shared by the update functions; see the `wrds2pg.api`
+        module documentation. `source="pg"` is not supported.
+
     Returns
     -------
     Boolean indicating whether the file was created or updated.
@@ -538,20 +1204,24 @@ def wrds_update_csv(
     schema_dir.mkdir(parents=True, exist_ok=True)
 
     csv_file = (schema_dir / alt_table_name).with_suffix(".csv.gz")
+    progress = as_progress(progress, table=f"{schema}.{alt_table_name}")
 
-    modified = get_modified_str(
-        table_name=table_name,
-        sas_schema=sas_schema,
-        wrds_id=wrds_id,
-        encoding=encoding,
-    )
+    with progress.timed("freshness"):
+        modified = get_modified_str(
+            table_name=table_name,
+            sas_schema=sas_schema,
+            wrds_id=wrds_id,
+            encoding=encoding,
+        )
     if modified is None:
+        progress.finish("unavailable")
         return False
 
     csv_modified = get_modified_csv(csv_file) if csv_file.exists() else ""
 
     if modified == csv_modified and not force:
         print(f"{schema}.{alt_table_name} already up to date.\n")
+        progress.finish("up_to_date")
         return False
 
     if force:
@@ -562,6 +1232,18 @@ def wrds_update_csv(
 
     print(f"Beginning file download at {get_now()} UTC.")
 
+    with progress.timed("sas_metadata"):
+        meta = get_table_metadata(
+            table_name=table_name,
+            wrds_id=wrds_id,
+            drop=drop,
+            keep=keep,
+            rename=rename,
+            sas_schema=sas_schema,
+            encoding=encoding,
+            col_types=col_types,
+        )
+
     wrds_to_csv(
         table_name=table_name,
         schema=schema,
@@ -577,16 +1259,367 @@ def wrds_update_csv(
         encoding=encoding,
         sas_schema=sas_schema,
         sas_encoding=sas_encoding,
+        source=source,
+        col_types=meta["col_types"],
+        fix_local=fix_local,
+        progress=progress,
+        spool=spool,
+        modified=modified,
     )
 
+    set_csv_col_types(csv_file, meta["names"], meta["col_types"])
     set_modified_csv(csv_file, modified)
     print(f"Completed file download at {get_now()} UTC.\n")
+    progress.finish("updated")
     return True
             
-def sas_to_pandas(sas_code, wrds_id=None, fpath=None, encoding="utf-8"):
+@_recorded("multi")
+def wrds_update_multi(
+    table_name,
+    schema,
+    sinks,
+    wrds_id=None,
+    force=False,
+    fix_missing=False,
+    fix_cr=False,
+    drop=None,
+    keep=None,
+    obs=None,
+    rename=None,
+    where=None,
+    alt_table_name=None,
+    col_types=None,
+    encoding="utf-8",
+    sas_schema=None,
+    sas_encoding=None,
+    source="sas",
+    fix_local=False,
+    max_chunks=8,
+    progress=None,
+    spool=None,
+    metrics=None,
+):
+    """Update several local copies of a WRDS table from one extraction.
+
+    The table is read from WRDS once and the CSV stream is copied to each
+    sink concurrently (see `wrds2pg.tee.tee_stream()`), instead of running
+    `wrds_update()`, `wrds_update_pq()` and `wrds_update_csv()` separately.
+    Each sink keeps its own last-modified stamp (table comment, Parquet
+    metadata or file time); sinks that are already up to date are skipped.
+
+    Parameters
+    ----------
+    table_name:
+        Name of table (based on name of WRDS SAS file).
+
+    schema:
+        Name of schema (normally the SAS library name).
+
+    sinks: list
+        Any of `wrds2pg.tee.PostgresSink(engine)`,
+        `wrds2pg.tee.ParquetSink(data_dir)`, `wrds2pg.tee.IPCSink(data_dir)`,
+        `wrds2pg.tee.DuckDBSink(database)` and `wrds2pg.tee.CSVSink(data_dir)`,
+        including several of one kind (e.g., two PostgreSQL servers).
+
+    wrds_id: string [Optional]
+        The WRDS ID used to access WRDS SAS via SSH.
+        Default is to use the environment value `WRDS_ID`.
+
+    force: Boolean [Optional]
+        Update every sink without checking stamps. Default is `False`.
+
+    fix_missing, fix_cr, drop, keep, obs, rename, where, alt_table_name,
+    col_types, encoding, sas_schema, sas_encoding, source, fix_local:
+        As for `wrds_update()`. `col_types` are PostgreSQL types and also
+        set Parquet column types.
+
+    max_chunks: Integer [Optional]
+        Chunks of about 1 MB buffered per sink. Reading from WRDS pauses
+        while the slowest sink's buffer is full.
+
+    progress: Progress or callable [Optional]
+        As for `wrds_update()`. Stage `tee` is the fan-out; each
+        sink reports its usual stages (`copy_write`, `parquet_write`,
+        `gzip_write`).
+
+    spool, metrics: [Optional]
+        As for `wrds_update()`. Runs are recorded with mode "multi".
+
+    Returns
+    -------
+    Boolean indicating whether any sink was updated.
+    If some sinks fail, the others are still updated and `RuntimeError`
+    is raised afterwards.
+
+    Examples
+    ----------
+    >>> from wrds2pg.tee import CSVSink, ParquetSink, PostgresSink
+    >>> wrds_update_multi("dsi", "crsp",
+    ...                   [PostgresSink(), ParquetSink("~/pq_data"), CSVSink("~/csv_data")])
+    """
+    from .tee import tee_stream
+
+    if wrds_id is None:
+        wrds_id = os.environ.get("WRDS_ID")
+    if wrds_id is None:
+        raise ValueError("You must provide `wrds_id` or set the `WRDS_ID` environment variable.")
+    if not sinks:
+        raise ValueError("You must provide at least one sink.")
+
+    if sas_schema is None:
+        sas_schema = schema
+    if alt_table_name is None:
+        alt_table_name = table_name
+
+    progress = as_progress(progress, table=f"{schema}.{alt_table_name}")
+
+    with progress.timed("freshness"):
+        modified = get_modified_str(table_name, sas_schema, wrds_id, encoding=encoding)
+    if not modified:
+        progress.finish("unavailable")
+        return False
+
+    stale = [sink for sink in sinks
+             if force or sink.modified(schema, alt_table_name) != modified]
+    if not stale:
+        print(f"{schema}.{alt_table_name} already up to date.")
+        progress.finish("up_to_date")
+        return False
+
+    if force:
+        print("Forcing update based on user request.")
+    else:
+        print(f"Updated {schema}.{alt_table_name} is available.")
+    print(f"Beginning file download at {get_now()} UTC.")
+    print("Writing to " + ", ".join(sink.name for sink in stale) + ".")
+
+    with progress.timed("sas_metadata"):
+        meta = get_table_metadata(
+            table_name=table_name,
+            wrds_id=wrds_id,
+            drop=drop,
+            keep=keep,
+            rename=rename,
+            sas_schema=sas_schema,
+            encoding=encoding,
+            col_types=col_types,
+        )
+
+    def open_stream():
+        return get_wrds_process_stream(
+            table_name=table_name,
+            schema=sas_schema,
+            wrds_id=wrds_id,
+            drop=drop,
+            keep=keep,
+            fix_cr=fix_cr,
+            fix_missing=fix_missing,
+            obs=obs,
+            rename=rename,
+            where=where,
+            sas_encoding=sas_encoding,
+            stream_encoding=encoding,
+            source=source,
+            col_types=meta["col_types"],
+            fix_local=fix_local,
+            progress=progress,
+            spool=spool,
+            modified=modified,
+        )
+
+    errors = tee_stream(open_stream, stale, schema, alt_table_name, meta, modified,
+                        encoding=encoding, max_chunks=max_chunks, progress=progress)
+    failed = {name: e for name, e in errors.items() if e is not None}
+
+    print(f"Completed file download at {get_now()} UTC.\n")
+    if failed:
+        progress.finish("partial")
+        details = "; ".join(f"{name}: {e!r}" for name, e in failed.items())
+        raise RuntimeError(
+            f"{len(failed)} of {len(stale)} sinks failed for {schema}.{alt_table_name}: "
+            f"{details}"
+        ) from next(iter(failed.values()))
+    progress.finish("updated")
+    return True
+
+def _arrow_csv_batches(sas_code, wrds_id, fpath, encoding, col_types, block_size):
+    """Yield the Arrow schema, then the record batches, of SAS CSV output."""
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+
+    from .files.parquet import _arrow_convert_options
+
+    with get_process_stream(
+        sas_code,
+        wrds_id=wrds_id,
+        fpath=fpath,
+        encoding=encoding,
+    ) as stream:
+        # Read SAS's bytes directly when they are already UTF-8; otherwise
+        # re-encode the decoded text for Arrow.
+        buffer = getattr(stream, "buffer", None)
+        if buffer is not None and codecs.lookup(encoding).name == "utf-8":
+            raw = buffer
+        else:
+            raw = io.BufferedReader(EncodedStream(stream), buffer_size=block_size)
+
+        header = raw.readline().decode("utf-8").rstrip("\r\n")
+        if not header:
+            raise RuntimeError("SAS code produced no CSV output.")
+        names = [name.strip().lower() for name in next(csv.reader([header]))]
+        col_types = {k.lower(): v for k, v in (col_types or {}).items()}
+
+        convert_options = _arrow_convert_options(names, col_types)
+        try:
+            reader = pacsv.open_csv(
+                raw,
+                read_options=pacsv.ReadOptions(block_size=block_size, column_names=names),
+                convert_options=convert_options,
+            )
+        except pa.ArrowInvalid as e:
+            if "Empty CSV" not in str(e):
+                raise
+            # Header only: no rows to infer types from.
+            yield pa.schema([(name, convert_options.column_types.get(name, pa.string()))
+                             for name in names])
+            return
+        yield reader.schema
+        yield from reader
+
+def _resolve_wrds_id(wrds_id, fpath):
+    if wrds_id is None:
+        wrds_id = os.environ.get("WRDS_ID")
+
+    if fpath is None and wrds_id is None:
+        raise ValueError(
+            "One of `wrds_id`, the environment variable `WRDS_ID`, "
+            "or `fpath` must be set."
+        )
+    return wrds_id
+
+def sas_to_arrow(sas_code, wrds_id=None, fpath=None, encoding="utf-8",
+                 col_types=None, block_size=1 << 20):
+    """Run SAS code on WRDS or locally and stream its CSV output as Arrow.
+
+    The SAS job starts immediately; rows are parsed as they arrive, so
+    memory use is bounded by `block_size` rather than by the size of the
+    output. Column names are converted to lower case.
+
+    Parameters
+    ----------
+    sas_code: string
+        SAS code that writes CSV to stdout (e.g., from `PROC EXPORT`).
+
+    wrds_id: string [Optional]
+        The WRDS ID to be used to access WRDS SAS.
+        Default is to use the environment value `WRDS_ID`.
+
+    fpath: string [Optional]
+        Run local SAS instead of SAS on WRDS.
+
+    encoding: string [Optional]
+        Encoding of the SAS output. Default is "utf-8".
+
+    col_types: Dict [Optional]
+        PostgreSQL types for some or all columns (e.g.,
+        `{"permno": "integer", "date": "date"}`), converted to Arrow types as
+        in `wrds_update_pq()`. Other columns are inferred from the first
+        block of data, so give types for columns whose early values are not
+        representative (e.g., integers in early rows, decimals later).
+
+    block_size: int [Optional]
+        Bytes of CSV parsed per record batch.
+
+    Returns
+    -------
+    pyarrow.RecordBatchReader
+        Read it to the end (or close it) to finish the SAS job.
+
+    Examples
+    ----------
+    >>> reader = sas_to_arrow("proc export data=crsp.dsi outfile=stdout dbms=csv; run;",
+    ...                       col_types={"date": "date"})
+    >>> table = reader.read_all()
+    """
+    import pyarrow as pa
+
+    wrds_id = _resolve_wrds_id(wrds_id, fpath)
+    batches = _arrow_csv_batches(sas_code, wrds_id, fpath, encoding,
+                                 col_types, block_size)
+    schema = next(batches)
+    return pa.RecordBatchReader.from_batches(schema, batches)
+
+def _pandas_types_mapper(pd, dtype_backend):
+    import pyarrow as pa
+
+    if dtype_backend == "pyarrow":
+        return pd.ArrowDtype
+    if dtype_backend == "numpy_nullable":
+        return {
+            pa.int8(): pd.Int8Dtype(), pa.int16(): pd.Int16Dtype(),
+            pa.int32(): pd.Int32Dtype(), pa.int64(): pd.Int64Dtype(),
+            pa.float32(): pd.Float32Dtype(), pa.float64(): pd.Float64Dtype(),
+            pa.bool_(): pd.BooleanDtype(), pa.string(): pd.StringDtype(),
+        }.get
+    return None
+
+def _arrow_chunks(reader, chunksize):
+    """Regroup the batches of `reader` into tables of `chunksize` rows."""
+    import pyarrow as pa
+
+    pending, n = [], 0
+    for batch in reader:
+        pending.append(batch)
+        n += batch.num_rows
+        while n >= chunksize:
+            table = pa.Table.from_batches(pending, schema=reader.schema)
+            yield table.slice(0, chunksize)
+            rest = table.slice(chunksize)
+            pending, n = rest.to_batches(), rest.num_rows
+    if n:
+        yield pa.Table.from_batches(pending, schema=reader.schema)
+
+def _pandas_chunks(pd, sas_code, wrds_id, fpath, encoding, chunksize,
+                   dtype_backend, col_types):
+    if dtype_backend == "pyarrow" or col_types:
+        mapper = _pandas_types_mapper(pd, dtype_backend)
+        reader = sas_to_arrow(sas_code, wrds_id=wrds_id, fpath=fpath,
+                              encoding=encoding, col_types=col_types)
+        with reader:
+            for table in _arrow_chunks(reader, chunksize):
+                yield table.to_pandas(types_mapper=mapper)
+        return
+
+    kwargs = {"dtype_backend": dtype_backend} if dtype_backend else {}
+    with get_process_stream(
+        sas_code,
+        wrds_id=wrds_id,
+        fpath=fpath,
+        encoding=encoding,
+    ) as stream:
+        for df in pd.read_csv(stream, chunksize=chunksize, **kwargs):
+            df.columns = df.columns.str.lower()
+            yield df
+
+def sas_to_pandas(sas_code, wrds_id=None, fpath=None, encoding="utf-8",
+                  chunksize=None, dtype_backend=None, col_types=None, cache=None):
     """Run SAS code on WRDS or locally and return a pandas DataFrame.
     One of `wrds_id`, the environment
-    variable `WRDS_ID`, or `fpath` must be set."""
+    variable `WRDS_ID`, or `fpath` must be set.
+
+    With `chunksize`, return an iterator of DataFrames of up to `chunksize`
+    rows instead; data are read from SAS only as the iterator is consumed.
+
+    `dtype_backend` may be "pyarrow" (Arrow-backed columns, parsed with
+    `sas_to_arrow()`; strings take far less memory than object dtype) or
+    "numpy_nullable", as in `pandas.read_csv()`. `col_types` gives
+    PostgreSQL types for columns (see `sas_to_arrow()`) and also selects
+    the Arrow parser.
+
+    `cache=True` (or a `wrds2pg.cache.ResultCache`) reuses an earlier result
+    of the same code if the tables it reads have not been modified since,
+    loading it from local Parquet instead of running SAS. It cannot be
+    combined with `chunksize`."""
     try:
         import pandas as pd
     except ImportError as e:
@@ -595,34 +1628,71 @@ def sas_to_pandas(sas_code, wrds_id=None, fpath=None, encoding="utf-8"):
             "Install it with `pip install pandas`."
         ) from e
 
-    if wrds_id is None:
-        wrds_id = os.environ.get("WRDS_ID")
+    import pyarrow as pa
 
-    if fpath is None and wrds_id is None:
+    from .cache import cached_table, get_result_cache
+
+    if dtype_backend not in (None, "numpy_nullable", "pyarrow"):
         raise ValueError(
-            "One of `wrds_id`, the environment variable `WRDS_ID`, "
-            "or `fpath` must be set."
+            f"Unknown dtype_backend {dtype_backend!r}; "
+            "use 'numpy_nullable' or 'pyarrow'."
         )
-
+    if chunksize is not None and chunksize < 1:
+        raise ValueError("`chunksize` must be a positive integer.")
+    cache = get_result_cache(cache)
+    if cache is not None and chunksize is not None:
+        raise ValueError("`cache` cannot be combined with `chunksize`.")
+
+    wrds_id = _resolve_wrds_id(wrds_id, fpath)
+
+    if cache is not None:
+        def compute():
+            df = sas_to_pandas(sas_code, wrds_id=wrds_id, fpath=fpath, encoding=encoding,
+                               dtype_backend=dtype_backend, col_types=col_types)
+            return pa.Table.from_pandas(df, preserve_index=False)
+
+        table = cached_table(cache, sas_code, compute, wrds_id=wrds_id, fpath=fpath,
+                             encoding=encoding, col_types=col_types,
+                             arrow=dtype_backend == "pyarrow" or bool(col_types))
+        return table.to_pandas(types_mapper=_pandas_types_mapper(pd, dtype_backend))
+
+    if chunksize is not None:
+        return _pandas_chunks(pd, sas_code, wrds_id, fpath, encoding, chunksize,
+                              dtype_backend, col_types)
+
+    if dtype_backend == "pyarrow" or col_types:
+        table = sas_to_arrow(sas_code, wrds_id=wrds_id, fpath=fpath,
+                             encoding=encoding, col_types=col_types).read_all()
+        return table.to_pandas(types_mapper=_pandas_types_mapper(pd, dtype_backend))
+
+    kwargs = {"dtype_backend": dtype_backend} if dtype_backend else {}
     with get_process_stream(
         sas_code,
         wrds_id=wrds_id,
         fpath=fpath,
         encoding=encoding,
     ) as stream:
-        df = pd.read_csv(stream)
+        df = pd.read_csv(stream, **kwargs)
 
     df.columns = df.columns.str.lower()
     return df
 
-def run_file_sql(file, engine):
-    f = open(file, 'r')
-    sql = f.read()
+def run_file_sql(file, engine, jobs=1, infer=True):
+    """
+    Run the SQL statements in `file`, printing each one's time.
+
+    Statements are split properly (semicolons in literals, comments and
+    `$$` bodies are kept) and run with `run_sql_script()`: with `jobs` > 1,
+    statements that do not depend on each other run concurrently.
+
+    Examples
+    ----------
+    >>> run_file_sql("ccm.sql", make_engine(), jobs=8)
+    """
+    from .postgres.script import run_sql_script
+
+    with open(file, "r") as f:
+        sql = f.read()
     print("Running SQL in %s" % file)
-    
-    for i in sql.split(";"):
-        j = i.strip()
-        if j != "":
-            print("\nRunning SQL: %s;" % j)
-            process_sql(j, engine)
+    return run_sql_script(sql, engine, jobs=jobs, infer=infer, verbose=True)
 
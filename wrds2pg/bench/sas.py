@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import os
+import time
+
+from ..sas.codegen import get_wrds_sas
+from ..sas.stream import get_process_stream
+
+def _time_export(sas_code, wrds_id, fpath, encoding, read_size):
+    start = time.perf_counter()
+    first_byte = None
+    nbytes = 0
+    with get_process_stream(sas_code, wrds_id=wrds_id, fpath=fpath,
+                            encoding=encoding) as stream:
+        while True:
+            data = stream.read(read_size)
+            if not data:
+                break
+            if first_byte is None:
+                first_byte = time.perf_counter() - start
+            nbytes += len(data)
+    return {
+        "time_to_first_byte": first_byte,
+        "seconds": time.perf_counter() - start,
+        "chars": nbytes,
+    }
+
+def benchmark_time_to_first_byte(
+    table_name,
+    schema,
+    wrds_id=None,
+    fpath=None,
+    encoding="utf-8",
+    read_size=1 << 16,
+    **sas_options,
+):
+    """
+    Compare SAS exports using a DATA step view against a materialized copy.
+
+    Both variants of the code from `get_wrds_sas()` are run with the same
+    options (pass at least one of `fix_missing`, `drop`, `keep`, `obs`,
+    `where` or `col_types`, otherwise no DATA step is generated).
+
+    Returns
+    -------
+    dict
+        `{"view": {...}, "materialized": {...}}`, each with
+        `time_to_first_byte` and total `seconds` (both in seconds) and the
+        number of `chars` received.
+
+    Examples
+    ----------
+    >>> benchmark_time_to_first_byte("dsf", "crsp", fix_missing=True,
+    ...                              where="date >= '01jan2020'd")
+    """
+    if wrds_id is None and fpath is None:
+        wrds_id = os.environ.get("WRDS_ID")
+
+    results = {}
+    for label, view in [("view", True), ("materialized", False)]:
+        sas_code = get_wrds_sas(table_name, schema, wrds_id=wrds_id, fpath=fpath,
+                                view=view, **sas_options)
+        results[label] = _time_export(sas_code, wrds_id, fpath, encoding, read_size)
+    return results
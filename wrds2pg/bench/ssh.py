@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+import paramiko
+
+from ..sas.ssh import SSHConfig
+
+# One CSV-like line, repeated to fill the requested payload.
+_PAYLOAD_LINE = b"10001,1986-01-07,2.5625,-0.024390244,3680,NASDAQ SMALL CAP\n"
+
+class _StreamServer(paramiko.ServerInterface):
+    """Accept any user without authentication and allow exec requests."""
+
+    def __init__(self):
+        self.command = None
+        self.event = threading.Event()
+
+    def get_allowed_auths(self, username):
+        return "none"
+
+    def check_auth_none(self, username):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        self.command = command.decode("utf-8")
+        self.event.set()
+        return True
+
+def _send_payload(channel, nbytes, chunk_size=1 << 16):
+    block = _PAYLOAD_LINE * (chunk_size // len(_PAYLOAD_LINE) + 1)
+    remaining = nbytes
+    while remaining > 0:
+        n = channel.send(block[:min(remaining, chunk_size)])
+        if n <= 0:
+            break
+        remaining -= n
+    channel.send_exit_status(0)
+    channel.close()
+
+def _serve_connection(conn, host_key):
+    transport = paramiko.Transport(conn)
+    transport.add_server_key(host_key)
+    server = _StreamServer()
+    try:
+        transport.start_server(server=server)
+        channel = transport.accept(timeout=30)
+        if channel is None or not server.event.wait(30):
+            return
+        # The stand-in understands one command: `head -c <nbytes> /dev/zero`
+        # (the same command used against a real host).
+        nbytes = int(server.command.split()[2])
+        _send_payload(channel, nbytes)
+        # Let the client hang up first; closing our end while it still has
+        # unread data in flight resets the connection and truncates the read.
+        deadline = time.monotonic() + 60
+        while transport.is_active() and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        transport.close()
+
+@contextmanager
+def local_ssh_server() -> Iterator[tuple[str, int]]:
+    """
+    Run an in-process SSH server on localhost and yield `(host, port)`.
+
+    The server accepts any user with "none" authentication and answers
+    `head -c <nbytes> /dev/zero` by streaming `nbytes` of CSV-like data.
+    It stands in for sshd when measuring raw channel throughput.
+    """
+    host_key = paramiko.RSAKey.generate(2048)
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(8)
+    listener.settimeout(0.2)
+    stop = threading.Event()
+
+    def accept_loop():
+        while not stop.is_set():
+            try:
+                conn, _ = listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            threading.Thread(
+                target=_serve_connection, args=(conn, host_key), daemon=True
+            ).start()
+
+    thread = threading.Thread(target=accept_loop, daemon=True)
+    thread.start()
+    try:
+        yield listener.getsockname()
+    finally:
+        stop.set()
+        thread.join()
+        listener.close()
+
+def benchmark_ssh_throughput(
+    config: SSHConfig | None = None,
+    wrds_id: str | None = None,
+    nbytes: int = 256 * 1024 * 1024,
+    read_size: int = 1 << 20,
+) -> dict:
+    """
+    Measure raw SSH channel throughput for a given `SSHConfig`.
+
+    Parameters
+    ----------
+    config : SSHConfig, optional
+        Settings to test. Defaults to `SSHConfig()`.
+    wrds_id : str, optional
+        If given, connect to `config.host` as this user and read
+        `head -c nbytes /dev/zero` from the remote host. Otherwise a local
+        in-process SSH server (see `local_ssh_server()`) is used and
+        `config.host` / `config.port` are ignored.
+    nbytes : int
+        Number of bytes to transfer.
+    read_size : int
+        Bytes requested per `recv()` call.
+
+    Returns
+    -------
+    dict
+        Keys `bytes`, `seconds`, `mb_per_s`, `cipher`, `window_size` and
+        `max_packet_size`.
+
+    Examples
+    ----------
+    >>> for window in [2**21, 2**24, 2**26]:
+    ...     print(benchmark_ssh_throughput(SSHConfig(window_size=window)))
+    """
+    if config is None:
+        config = SSHConfig()
+
+    command = f"head -c {int(nbytes)} /dev/zero"
+
+    if wrds_id is not None:
+        client = config.connect(wrds_id)
+        try:
+            return _time_channel(client.get_transport(), command, config, read_size)
+        finally:
+            client.close()
+
+    with local_ssh_server() as (host, port):
+        sock = socket.create_connection((host, port))
+        transport = config.make_transport(sock)
+        try:
+            transport.start_client()
+            transport.auth_none("bench")
+            return _time_channel(transport, command, config, read_size)
+        finally:
+            transport.close()
+
+def _time_channel(transport, command, config, read_size):
+    channel = transport.open_session()
+    start = time.perf_counter()
+    channel.exec_command(command)
+    received = 0
+    while True:
+        data = channel.recv(read_size)
+        if not data:
+            break
+        received += len(data)
+    channel.recv_exit_status()
+    seconds = time.perf_counter() - start
+
+    return {
+        "bytes": received,
+        "seconds": seconds,
+        "mb_per_s": received / seconds / 1e6 if seconds else float("inf"),
+        "cipher": transport.remote_cipher,
+        "window_size": config.window_size,
+        "max_packet_size": config.max_packet_size,
+    }
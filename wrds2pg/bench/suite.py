@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+
+from ..metrics import JSONLinesSink, run_record
+from ..progress import Progress
+from ..sas.fake import FakeWRDSTransport
+from ..sas.transport import use_transport
+
+BENCH_SCHEMA = "wrds2pg_bench"
+
+def _package_version():
+    try:
+        return version("wrds2pg")
+    except PackageNotFoundError:
+        return None
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                             cwd=Path(__file__).resolve().parent,
+                             capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+def _results_path(results_file):
+    if results_file is None:
+        results_file = os.environ.get("WRDS2PG_BENCH_RESULTS", "wrds2pg_bench.jsonl")
+    return Path(results_file)
+
+def _run_target(target, table_name, engine, data_dir, progress):
+    # Imported here: wrds2pg.api imports this package's modules.
+    from ..api import wrds_update, wrds_update_csv, wrds_update_pq
+
+    if target == "pg":
+        wrds_update(table_name, BENCH_SCHEMA, wrds_id="fake", engine=engine,
+                    force=True, create_roles=False, progress=progress)
+    elif target == "csv":
+        wrds_update_csv(table_name, BENCH_SCHEMA, wrds_id="fake", data_dir=data_dir,
+                        force=True, progress=progress)
+    elif target == "parquet":
+        wrds_update_pq(table_name, BENCH_SCHEMA, wrds_id="fake", data_dir=data_dir,
+                       force=True, progress=progress)
+    else:
+        raise ValueError(f"Unknown target {target!r}; use 'pg', 'csv' or 'parquet'.")
+
+def run_benchmark_suite(
+    rows=(100_000, 1_000_000),
+    width=20,
+    targets=("pg", "csv", "parquet"),
+    engine=None,
+    data_dir=None,
+    rate=None,
+    startup=0.0,
+    repeat=1,
+    results_file=None,
+    label=None,
+):
+    """
+    Time the PostgreSQL, CSV and Parquet paths end to end against fake WRDS.
+
+    Each case runs the real update function (`wrds_update()`,
+    `wrds_update_csv()` or `wrds_update_pq()`) with `force=True` while
+    `FakeWRDSTransport` stands in for SAS on WRDS, and appends one record
+    per run to `results_file` so results can be tracked over time with
+    `compare_benchmarks()`.
+
+    Parameters
+    ----------
+    rows : sequence of int
+        Table sizes to test.
+    width : int
+        Number of columns in the synthetic tables.
+    targets : sequence of str
+        Any of "pg", "csv" and "parquet".
+    engine : SQLAlchemy engine, optional
+        Database for "pg". Default is `make_engine()` (uses `PGHOST`,
+        `PGDATABASE` etc.). Tables go in schema `wrds2pg_bench`.
+    data_dir : str, optional
+        Directory for "csv" and "parquet" output. Default is a temporary
+        directory, removed afterwards.
+    rate : float, optional
+        Limit fake WRDS output to this many characters per second.
+    startup : float
+        Seconds each fake SAS job waits before producing output.
+    repeat : int
+        Runs per case.
+    results_file : str, optional
+        JSON-lines file that results are appended to. Default is the
+        environment value `WRDS2PG_BENCH_RESULTS` or "wrds2pg_bench.jsonl".
+    label : str, optional
+        Free-form label stored with each record (e.g., a branch name).
+
+    Returns
+    -------
+    list of dict
+        The records written, as from `wrds2pg.metrics.run_record()`, plus
+        `case`, `rows_per_s`, `mb_per_s`, `label`, `version`, `commit` and
+        `python`.
+
+    Examples
+    ----------
+    >>> run_benchmark_suite(rows=[1_000_000], targets=["parquet"], rate=40e6)
+    """
+    sink = JSONLinesSink(_results_path(results_file))
+    commit = _git_commit()
+    tmp_dir = None
+    if data_dir is None and set(targets) & {"csv", "parquet"}:
+        tmp_dir = data_dir = tempfile.mkdtemp(prefix="wrds2pg_bench_")
+
+    if "pg" in targets:
+        from ..postgres.ddl import process_sql
+        from ..postgres.engine import make_engine
+
+        if engine is None:
+            engine = make_engine()
+        process_sql(f"CREATE SCHEMA IF NOT EXISTS {BENCH_SCHEMA}", engine)
+
+    records = []
+    try:
+        for n in rows:
+            table_name = f"synthetic_{n}_{width}"
+            transport = FakeWRDSTransport(rows=n, width=width, rate=rate,
+                                          startup=startup)
+            for target in targets:
+                for _ in range(repeat):
+                    progress = Progress(table=f"{BENCH_SCHEMA}.{table_name}")
+                    with use_transport(transport):
+                        _run_target(target, table_name, engine, data_dir, progress)
+                    record = run_record(progress.finish(), mode=target, source="fake")
+                    seconds = record["duration"] or float("nan")
+                    record.update({
+                        "case": f"{target}-{n}x{width}",
+                        "rows_per_s": n / seconds,
+                        "mb_per_s": (record["bytes"] or 0) / seconds / 1e6,
+                        "label": label,
+                        "version": _package_version(),
+                        "commit": commit,
+                        "python": platform.python_version(),
+                    })
+                    sink.emit(record)
+                    records.append(record)
+                    print(f"{record['case']}: {seconds:.2f}s "
+                          f"({record['rows_per_s']:,.0f} rows/s)")
+        if "pg" in targets:
+            for n in rows:
+                process_sql(f'DROP TABLE IF EXISTS {BENCH_SCHEMA}."synthetic_{n}_{width}"',
+                            engine)
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    return records
+
+def compare_benchmarks(results_file=None, window=5):
+    """
+    Compare the latest run of each benchmark case with earlier runs.
+
+    Parameters
+    ----------
+    results_file : str, optional
+        File written by `run_benchmark_suite()` (same default).
+    window : int
+        Number of earlier runs whose median is the baseline.
+
+    Returns
+    -------
+    list of dict
+        One per case: `case`, `latest` and `baseline` durations in seconds,
+        `ratio` (latest / baseline; above 1 is slower), the `commit` of the
+        latest run, and the slowest stage of the latest run (`bottleneck`).
+    """
+    runs = {}
+    with open(_results_path(results_file), encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                runs.setdefault(record["case"], []).append(record)
+
+    out = []
+    for case, records in sorted(runs.items()):
+        latest = records[-1]
+        earlier = [r["duration"] for r in records[:-1][-window:]]
+        baseline = statistics.median(earlier) if earlier else None
+        # sas_export is wall time around the whole transfer, not a stage of its own.
+        busy = {name: s["busy"] for name, s in (latest.get("stages") or {}).items()
+                if name != "sas_export"}
+        out.append({
+            "case": case,
+            "latest": latest["duration"],
+            "baseline": baseline,
+            "ratio": latest["duration"] / baseline if baseline else None,
+            "commit": latest.get("commit"),
+            "bottleneck": max(busy, key=busy.get) if busy else None,
+        })
+    return out
@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import time
+import uuid
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+_QUOTED = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""")
+_BLOCK_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+_STATEMENT_COMMENT = re.compile(r"(^|;)\s*\*[^;]*;")
+# Two-level names (`lib.member`). Besides tables, this matches `alias.column`
+# references in PROC SQL; those are not tables and get no stamp.
+_TABLE_REF = re.compile(r"(?<![\w.&])([a-z_]\w*)\.([a-z_]\w*)\b(?!\.)", re.I)
+
+def normalize_sas_code(sas_code: str) -> str:
+    """
+    Return `sas_code` with comments removed, whitespace collapsed and text
+    outside quoted strings in lower case, so trivially different snippets
+    share a cache entry.
+    """
+    parts = _QUOTED.split(sas_code)
+    for i in range(0, len(parts), 2):
+        text = _BLOCK_COMMENT.sub(" ", parts[i])
+        text = _STATEMENT_COMMENT.sub(r"\1", text)
+        parts[i] = re.sub(r"\s+", " ", text).lower()
+    return "".join(parts).strip()
+
+def referenced_tables(sas_code: str) -> list[tuple[str, str]]:
+    """
+    Return the `(library, member)` pairs that `sas_code` may read, in lower case.
+
+    Every two-level name outside comments and quoted strings is included,
+    so tables in comma-separated PROC SQL `FROM` lists are not missed.
+    Names that are not tables (e.g., `a.permno` for a column of alias `a`)
+    are dropped by `get_table_stamps()`. `work` and `dictionary` tables are
+    skipped.
+    """
+    parts = _QUOTED.split(_BLOCK_COMMENT.sub(" ", sas_code))
+    code = " ".join(_STATEMENT_COMMENT.sub(r"\1", p) for p in parts[0::2])
+    found = []
+    for lib, mem in _TABLE_REF.findall(code):
+        pair = (lib.lower(), mem.lower())
+        if pair[0] not in ("work", "dictionary") and pair not in found:
+            found.append(pair)
+    return found
+
+def get_table_stamps(tables, wrds_id=None, fpath=None, encoding="utf-8") -> dict:
+    """
+    Return last-modified stamps for `tables` (a list of `(library, member)`).
+
+    On WRDS, one SAS job reads all stamps from `dictionary.tables`. With
+    `fpath`, the modification times of the local `.sas7bdat` files are used.
+    Tables that do not exist are omitted.
+    """
+    if not tables:
+        return {}
+    if fpath is not None:
+        stamps = {}
+        for lib, mem in tables:
+            path = Path(fpath) / f"{mem}.sas7bdat"
+            if path.exists():
+                stamps[f"{lib}.{mem}"] = str(path.stat().st_mtime)
+        return stamps
+
+    from .sas.stream import get_process_stream  # local import to avoid circular import
+
+    where = " or ".join(
+        f"(libname = \"{lib.upper()}\" and memname = \"{mem.upper()}\")"
+        for lib, mem in tables
+    )
+    sas_code = f"""
+        proc sql;
+            create table _stamps as
+            select libname, memname, modate format=datetime19.
+            from dictionary.tables
+            where {where};
+        quit;
+
+        proc export data=_stamps outfile=stdout dbms=csv replace;
+        run;
+    """
+    with get_process_stream(sas_code, wrds_id=wrds_id, encoding=encoding) as stream:
+        text = stream.read()
+
+    stamps = {}
+    for row in csv.DictReader(io.StringIO(text)):
+        row = {k.strip().lower(): (v or "").strip() for k, v in row.items()}
+        if row.get("memname"):
+            stamps[f"{row['libname'].lower()}.{row['memname'].lower()}"] = row["modate"]
+    return stamps
+
+class ResultCache:
+    """
+    Local cache of SAS query results, stored as Parquet.
+
+    An entry is keyed by the normalized SAS code (see `normalize_sas_code()`)
+    and the parameters that affect parsing. It is used without contacting
+    WRDS for `ttl` seconds; after that, the last-modified stamps of the
+    tables the code reads (see `referenced_tables()`) are fetched in a
+    single SAS job and the entry is reused only if they are unchanged.
+    When the cache exceeds `max_bytes`, least recently used entries are
+    removed.
+
+    Parameters
+    ----------
+    directory : str, optional
+        Where entries are stored. Default is the environment value
+        `WRDS2PG_CACHE_DIR` or `~/.cache/wrds2pg`.
+    ttl : float
+        Seconds during which an entry is trusted without checking stamps.
+    max_bytes : int
+        Maximum total size of cached Parquet files.
+
+    Examples
+    ----------
+    >>> cache = ResultCache(ttl=3600)
+    >>> sas_to_pandas(sas_code, cache=cache)
+    """
+
+    def __init__(self, directory=None, ttl=24 * 3600, max_bytes=2 * 1024**3):
+        if directory is None:
+            directory = os.environ.get(
+                "WRDS2PG_CACHE_DIR", Path.home() / ".cache" / "wrds2pg"
+            )
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+    def key(self, sas_code: str, **params) -> str:
+        payload = json.dumps([normalize_sas_code(sas_code), params],
+                             sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _paths(self, key):
+        return self.directory / f"{key}.parquet", self.directory / f"{key}.json"
+
+    def _write_json(self, path, data):
+        tmp = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        tmp.write_text(json.dumps(data))
+        os.replace(tmp, path)
+
+    def get(self, key, stamps=None) -> pa.Table | None:
+        """
+        Return the cached table for `key`, or None.
+
+        `stamps` is a callable returning current table stamps; it is called
+        only when the entry is older than `ttl`.
+        """
+        data_path, meta_path = self._paths(key)
+        try:
+            meta = json.loads(meta_path.read_text())
+            table = pq.read_table(data_path, memory_map=True)
+        except (OSError, ValueError, pa.ArrowException):
+            return None
+
+        now = time.time()
+        if now - meta["validated"] >= self.ttl:
+            if stamps is None or stamps() != meta["stamps"]:
+                return None
+            meta["validated"] = now
+        meta["used"] = now
+        self._write_json(meta_path, meta)
+        return table
+
+    def put(self, key, table: pa.Table, stamps: dict, sas_code: str = "") -> None:
+        """Store `table` under `key` and evict old entries if over `max_bytes`."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        data_path, meta_path = self._paths(key)
+        tmp = data_path.with_name(f"{data_path.name}.{uuid.uuid4().hex}.tmp")
+        pq.write_table(table, tmp)
+        os.replace(tmp, data_path)
+        now = time.time()
+        self._write_json(meta_path, {
+            "validated": now,
+            "used": now,
+            "stamps": stamps,
+            "sas_code": sas_code,
+        })
+        self.evict()
+
+    def evict(self) -> None:
+        """Remove least recently used entries until the cache fits `max_bytes`."""
+        entries = []
+        for meta_path in self.directory.glob("*.json"):
+            data_path = meta_path.with_suffix(".parquet")
+            try:
+                used = json.loads(meta_path.read_text())["used"]
+                size = data_path.stat().st_size
+            except (OSError, ValueError, KeyError):
+                continue
+            entries.append((used, size, data_path, meta_path))
+
+        total = sum(size for _, size, _, _ in entries)
+        for _, size, data_path, meta_path in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            for path in (meta_path, data_path):
+                path.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        for path in self.directory.glob("*.json"):
+            path.with_suffix(".parquet").unlink(missing_ok=True)
+            path.unlink(missing_ok=True)
+
+def get_result_cache(cache) -> ResultCache | None:
+    """Resolve the `cache` argument: None/False, True (default cache) or a `ResultCache`."""
+    if cache is None or cache is False:
+        return None
+    if cache is True:
+        return ResultCache()
+    if isinstance(cache, ResultCache):
+        return cache
+    raise ValueError(f"Unsupported cache {cache!r}; use True or a ResultCache.")
+
+def cached_table(cache, sas_code, compute, wrds_id=None, fpath=None,
+                 encoding="utf-8", **params) -> pa.Table:
+    """
+    Return the result of `sas_code` from `cache`, or `compute()` and store it.
+
+    `compute` returns a `pyarrow.Table`. `params` are further values that
+    affect the result (e.g., `col_types`) and are part of the key.
+    """
+    tables = referenced_tables(sas_code)
+    key = cache.key(sas_code, fpath=fpath, encoding=encoding, **params)
+
+    def stamps():
+        return get_table_stamps(tables, wrds_id=wrds_id, fpath=fpath, encoding=encoding)
+
+    table = cache.get(key, stamps)
+    if table is not None:
+        return table
+
+    # Take stamps before running the query, so a table updated meanwhile
+    # is re-read next time rather than cached as current.
+    current = stamps()
+    table = compute()
+    cache.put(key, table, current, sas_code)
+    return table
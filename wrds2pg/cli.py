@@ -0,0 +1,260 @@
+"""
+Command-line interface: update or check the tables listed in a manifest.
+
+Heavy dependencies (pandas, pyarrow, SQLAlchemy, paramiko) are imported
+only when a table is processed, so the tool starts quickly.
+"""
+from __future__ import annotations
+
+import argparse
+import contextvars
+import inspect
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+_UPDATE_FUNCTIONS = {
+    "pg": "wrds_update",
+    "parquet": "wrds_update_pq",
+    "ipc": "wrds_update_ipc",
+    "duckdb": "wrds_update_duckdb",
+    "csv": "wrds_update_csv",
+}
+
+def load_manifest(path) -> list[dict]:
+    """
+    Read a TOML or YAML manifest and return one dict of options per table.
+
+    The manifest has an optional `defaults` table and a list `tables`; each
+    entry needs `table` and `schema` and may set `target` ("pg", "parquet",
+    "ipc", "duckdb", "csv" or a list of these) and any argument of the update function for
+    that target (`col_types`, `where`, `keep`, `fix_cr`, `data_dir` ...).
+    Entry values override defaults.
+
+    Examples
+    ----------
+    ```toml
+    [defaults]
+    target = "parquet"
+    data_dir = "~/pq_data"
+
+    [[tables]]
+    schema = "crsp"
+    table = "msf"
+
+    [[tables]]
+    schema = "comp"
+    table = "funda"
+    target = ["pg", "parquet"]
+    keep = "gvkey datadate fyear at"
+    col_types = { fyear = "integer" }
+    ```
+    """
+    path = Path(path)
+    if path.suffix.lower() in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError as e:
+            raise ImportError(
+                "YAML manifests require PyYAML. "
+                "Install it with `pip install pyyaml` or use TOML."
+            ) from e
+        with open(path, encoding="utf-8") as f:
+            data = yaml.safe_load(f) or {}
+    else:
+        try:
+            import tomllib
+        except ImportError:  # Python < 3.11
+            import tomli as tomllib
+        with open(path, "rb") as f:
+            data = tomllib.load(f)
+
+    defaults = data.get("defaults") or {}
+    specs = []
+    for i, entry in enumerate(data.get("tables") or []):
+        spec = {"target": "pg", **defaults, **entry}
+        # defaults that a target's function does not take are ignored
+        spec["_defaults"] = set(defaults) - set(entry)
+        if "table" not in spec or "schema" not in spec:
+            raise ValueError(f"Manifest entry {i + 1} needs `table` and `schema`.")
+        targets = spec["target"] if isinstance(spec["target"], list) else [spec["target"]]
+        for target in targets:
+            if target not in _UPDATE_FUNCTIONS:
+                raise ValueError(
+                    f"Unknown target {target!r} for {spec['schema']}.{spec['table']}; "
+                    "use 'pg', 'parquet', 'ipc', 'duckdb' or 'csv'."
+                )
+        specs.append(spec)
+    return specs
+
+def _name(spec):
+    return f"{spec['schema']}.{spec.get('alt_table_name') or spec['table']}"
+
+def _target_label(spec):
+    target = spec["target"]
+    return "+".join(target) if isinstance(target, list) else target
+
+def _kwargs(func, spec, skip=()):
+    """Arguments of `func` from `spec`; raise on options it does not take."""
+    params = inspect.signature(func).parameters
+    options = {k: v for k, v in spec.items()
+               if k not in ("table", "schema", "target", "_defaults", *skip)
+               and (k in params or k not in spec["_defaults"])}
+    unknown = sorted(set(options) - set(params))
+    if unknown:
+        raise ValueError(f"{_name(spec)}: unknown option(s) for {func.__name__}(): "
+                         + ", ".join(unknown))
+    return options
+
+def _multi_sinks(spec):
+    """Sinks for an entry with several targets (see `wrds_update_multi()`)."""
+    from .tee import CSVSink, DuckDBSink, IPCSink, ParquetSink, PostgresSink
+
+    sinks = []
+    for target in spec["target"]:
+        if target == "pg":
+            from .postgres.engine import make_engine
+
+            engine = make_engine(host=spec.get("host"), dbname=spec.get("dbname"))
+            sinks.append(PostgresSink(engine, create_roles=spec.get("create_roles", True),
+                                      tz=spec.get("tz", "UTC")))
+        elif target == "parquet":
+            sinks.append(ParquetSink(spec.get("data_dir"),
+                                     memory_limit=spec.get("memory_limit")))
+        elif target == "ipc":
+            sinks.append(IPCSink(spec.get("data_dir"), compression=spec.get("compression")))
+        elif target == "duckdb":
+            sinks.append(DuckDBSink(spec.get("database")))
+        else:
+            sinks.append(CSVSink(spec.get("csv_dir")))
+    return sinks
+
+def _prepare(spec):
+    """Return a function that runs the update for `spec` with a `Progress`."""
+    from . import api
+
+    if isinstance(spec["target"], list):
+        func = api.wrds_update_multi
+        skip = ("host", "dbname", "create_roles", "tz", "data_dir", "csv_dir", "compression",
+                "database", "memory_limit")
+        kwargs = _kwargs(func, spec, skip=skip)
+        kwargs["sinks"] = _multi_sinks(spec)
+    else:
+        func = getattr(api, _UPDATE_FUNCTIONS[spec["target"]])
+        kwargs = _kwargs(func, spec)
+    for key in ("data_dir", "csv_dir"):
+        if isinstance(kwargs.get(key), str):
+            kwargs[key] = os.path.expanduser(kwargs[key])
+
+    def run(progress):
+        return func(spec["table"], spec["schema"], progress=progress, **kwargs)
+    return run
+
+def _run_one(spec, run):
+    from .progress import Progress
+
+    progress = Progress(table=_name(spec))
+    start = time.perf_counter()
+    try:
+        run(progress)
+        outcome, error = progress.summary().get("outcome") or "done", None
+    except Exception as e:
+        outcome, error = "error", f"{type(e).__name__}: {e}"
+    return {"table": _name(spec), "target": _target_label(spec), "outcome": outcome,
+            "seconds": time.perf_counter() - start, "error": error}
+
+def _check_one(spec):
+    from .plan import _local_state
+    from .sas.metadata import get_modified_str
+
+    start = time.perf_counter()
+    alt_table_name = spec.get("alt_table_name") or spec["table"]
+    try:
+        modified = get_modified_str(spec["table"], spec.get("sas_schema") or spec["schema"],
+                                    spec.get("wrds_id") or os.environ.get("WRDS_ID"),
+                                    encoding=spec.get("encoding") or "utf-8")
+        statuses = []
+        targets = spec["target"] if isinstance(spec["target"], list) else [spec["target"]]
+        for target in targets:
+            if not modified:
+                statuses.append("unavailable")
+                continue
+            engine, data_dir = None, None
+            if target == "pg":
+                from .postgres.engine import make_engine
+
+                engine = make_engine(host=spec.get("host"), dbname=spec.get("dbname"))
+            elif target != "duckdb":
+                key = "csv_dir" if target == "csv" and len(targets) > 1 else "data_dir"
+                env = "CSV_DIR" if target == "csv" else "DATA_DIR"
+                data_dir = spec.get(key) or os.environ.get(env)
+                if data_dir is None:
+                    raise ValueError(f"Set `{key}` or `{env}` for target {target!r}.")
+            local, _ = _local_state(target, spec["schema"], alt_table_name, engine, data_dir,
+                                    spec.get("database"))
+            statuses.append("current" if local == modified
+                            else "stale" if local else "missing")
+        outcome, error = "+".join(statuses), None
+    except Exception as e:
+        outcome, error = "error", f"{type(e).__name__}: {e}"
+    return {"table": _name(spec), "target": _target_label(spec), "outcome": outcome,
+            "seconds": time.perf_counter() - start, "error": error}
+
+def _print_summary(results, file=sys.stdout):
+    width = max([len(r["table"]) for r in results] + [5])
+    print(f"\n{'table':<{width}}  {'target':<14} {'outcome':<12} {'seconds':>8}", file=file)
+    for r in results:
+        print(f"{r['table']:<{width}}  {r['target']:<14} {r['outcome']:<12} "
+              f"{r['seconds']:>8.1f}", file=file)
+        if r["error"]:
+            print(f"{'':<{width}}  {r['error']}", file=file)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="wrds2pg",
+        description="Update WRDS tables listed in a TOML or YAML manifest.",
+    )
+    parser.add_argument("manifest", help="TOML (.toml) or YAML (.yaml, .yml) manifest")
+    parser.add_argument("-c", "--check", action="store_true",
+                        help="only compare WRDS last-modified dates with local copies")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="tables to process in parallel (default 1)")
+    parser.add_argument("-t", "--table", action="append", default=[],
+                        help="process only this table (schema.table or table); repeatable")
+    parser.add_argument("-f", "--force", action="store_true",
+                        help="update even if local copies are current")
+    parser.add_argument("--metrics", help="metrics sinks (see WRDS2PG_METRICS)")
+    parser.add_argument("--wrds-id", help="WRDS ID (default WRDS_ID)")
+    args = parser.parse_args(argv)
+
+    specs = load_manifest(args.manifest)
+    if args.table:
+        wanted = {t.lower() for t in args.table}
+        specs = [s for s in specs
+                 if _name(s).lower() in wanted or s["table"].lower() in wanted]
+    for spec in specs:
+        if args.wrds_id:
+            spec["wrds_id"] = args.wrds_id
+        if args.force:
+            spec["force"] = True
+        if args.metrics:
+            spec["metrics"] = args.metrics
+
+    if args.check:
+        tasks = [(_check_one, spec) for spec in specs]
+    else:
+        # prepare everything first so option errors surface before any download
+        tasks = [(_run_one, spec, _prepare(spec)) for spec in specs]
+
+    with ThreadPoolExecutor(max_workers=max(args.jobs, 1)) as pool:
+        # each task runs in a copy of this context (e.g., a `use_transport()` override)
+        futures = [pool.submit(contextvars.copy_context().run, *task) for task in tasks]
+        results = [future.result() for future in futures]
+
+    _print_summary(results)
+    return 1 if any(r["outcome"] == "error" for r in results) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
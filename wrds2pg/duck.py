@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import os
+import re
+import time
+
+from .progress import as_progress
+
+# Table in the `main` schema holding each table's WRDS last-modified stamp
+SYNC_TABLE = "_wrds2pg_sync"
+
+# PostgreSQL type (as in `col_types`) -> DuckDB type
+_PG_TO_DUCKDB = {
+    "text": "VARCHAR",
+    "varchar": "VARCHAR",
+    "character varying": "VARCHAR",
+    "boolean": "BOOLEAN",
+    "smallint": "SMALLINT",
+    "integer": "INTEGER",
+    "int": "INTEGER",
+    "int4": "INTEGER",
+    "bigint": "BIGINT",
+    "int8": "BIGINT",
+    "real": "REAL",
+    "float4": "REAL",
+    "float8": "DOUBLE",
+    "double precision": "DOUBLE",
+    "date": "DATE",
+    "time": "TIME",
+    "time without time zone": "TIME",
+    "timestamp": "TIMESTAMP",
+    "timestamp without time zone": "TIMESTAMP",
+    "timestamptz": "TIMESTAMPTZ",
+    "timestamp with time zone": "TIMESTAMPTZ",
+    "bytea": "BLOB",
+    "uuid": "UUID",
+    "json": "JSON",
+    "jsonb": "JSON",
+}
+
+def duckdb_type(pg_type):
+    """Return the DuckDB type for a PostgreSQL type (VARCHAR if unknown)."""
+    t = pg_type.strip().lower()
+    m = re.fullmatch(r"(numeric|decimal)\s*\((\d+)\s*,\s*(\d+)\)", t)
+    if m:
+        precision, scale = int(m.group(2)), int(m.group(3))
+        return f"DECIMAL({precision},{scale})" if precision <= 38 else "DOUBLE"
+    if t in ("numeric", "decimal"):
+        return "DOUBLE"
+    return _PG_TO_DUCKDB.get(re.sub(r"\(.*\)$", "", t).strip(), "VARCHAR")
+
+def connect_duckdb(database=None):
+    """
+    Return a DuckDB connection and whether the caller should close it.
+
+    `database` is a path, a DuckDB connection, or None for the environment
+    value `DUCKDB_DATABASE`.
+    """
+    try:
+        import duckdb
+    except ImportError as e:
+        raise ImportError(
+            "DuckDB targets require duckdb. "
+            "Install it with `pip install duckdb` or `pip install wrds2pg[duckdb]`."
+        ) from e
+    if isinstance(database, duckdb.DuckDBPyConnection):
+        return database, False
+    if database is None:
+        database = os.environ.get("DUCKDB_DATABASE")
+    if database is None:
+        raise ValueError("You must provide `database` or set the"
+                         " `DUCKDB_DATABASE` environment variable.")
+    if database != ":memory:":
+        database = os.path.expanduser(str(database))
+    return duckdb.connect(database), True
+
+def _ensure_sync_table(con):
+    con.execute(
+        f'CREATE TABLE IF NOT EXISTS main."{SYNC_TABLE}" ('
+        "schema_name VARCHAR, table_name VARCHAR, last_modified VARCHAR, "
+        "updated_at TIMESTAMP, PRIMARY KEY (schema_name, table_name))"
+    )
+
+def _literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+def get_modified_duckdb(table_name, schema, database=None):
+    """Return the stamp recorded for `schema.table_name`, or '' if none."""
+    con, close = connect_duckdb(database)
+    try:
+        # literals rather than parameters: DuckDB imports pandas and pyarrow
+        # to bind parameters, which would slow `wrds2pg --check`
+        exists = con.execute(
+            "SELECT count(*) FROM information_schema.tables "
+            f"WHERE table_schema = 'main' AND table_name = {_literal(SYNC_TABLE)}"
+        ).fetchone()[0]
+        if not exists:
+            return ""
+        row = con.execute(
+            f'SELECT s.last_modified FROM main."{SYNC_TABLE}" AS s '
+            "JOIN information_schema.tables AS t "
+            "ON t.table_schema = s.schema_name AND t.table_name = s.table_name "
+            f"WHERE s.schema_name = {_literal(schema)} AND s.table_name = {_literal(table_name)}"
+        ).fetchone()
+        return row[0] if row else ""
+    finally:
+        if close:
+            con.close()
+
+def batches_to_duckdb(batches, table_name, schema, names, col_types, modified,
+                      database=None, progress=None):
+    """
+    Load Arrow record batches into a typed DuckDB table.
+
+    A table with DuckDB equivalents of `col_types` (PostgreSQL types, as
+    from `get_table_metadata()`) is filled batch by batch through DuckDB's
+    Arrow scan, so only one batch is held in memory. It then replaces
+    `schema.table_name` and `modified` is recorded in the sync table in
+    one transaction, so readers see the old or the new table, never a
+    partial one.
+
+    `progress` receives the `duckdb_write` stage.
+    """
+    progress = as_progress(progress)
+    con, close = connect_duckdb(database)
+    tmp = f"{table_name}__wrds2pg_tmp"
+    try:
+        con.execute(f'CREATE SCHEMA IF NOT EXISTS "{schema}"')
+        _ensure_sync_table(con)
+        cols = ", ".join(f'"{name}" {duckdb_type(col_types[name])}' for name in names)
+        con.execute(f'CREATE OR REPLACE TABLE "{schema}"."{tmp}" ({cols})')
+        select = ", ".join(f'"{name}"' for name in names)
+        try:
+            for batch in batches:
+                t0 = time.perf_counter()
+                con.register("_wrds2pg_batch", batch)
+                con.execute(f'INSERT INTO "{schema}"."{tmp}" SELECT {select} '
+                            "FROM _wrds2pg_batch")
+                con.unregister("_wrds2pg_batch")
+                progress.add("duckdb_write", bytes=batch.nbytes, rows=batch.num_rows,
+                             busy=time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            con.execute("BEGIN TRANSACTION")
+            con.execute(f'DROP TABLE IF EXISTS "{schema}"."{table_name}"')
+            con.execute(f'ALTER TABLE "{schema}"."{tmp}" RENAME TO "{table_name}"')
+            con.execute(f'INSERT OR REPLACE INTO main."{SYNC_TABLE}" '
+                        "VALUES (?, ?, ?, current_timestamp::TIMESTAMP)",
+                        [schema, table_name, modified])
+            con.execute("COMMIT")
+            progress.add("duckdb_write", busy=time.perf_counter() - t0)
+        except BaseException:
+            try:
+                con.execute("ROLLBACK")
+            except Exception:
+                pass
+            con.execute(f'DROP TABLE IF EXISTS "{schema}"."{tmp}"')
+            raise
+    finally:
+        if close:
+            con.close()
+    return True
@@ -1,12 +1,15 @@
 from __future__ import annotations
 
 import gzip
+import json
 import os
-import shutil
 import time
+import uuid
 from datetime import datetime, timezone
+from pathlib import Path
 from zoneinfo import ZoneInfo
 
+from ..progress import as_progress
 from ..sas.stream import get_wrds_process_stream
 
 _WRDS_TZ = ZoneInfo("America/Chicago")
@@ -83,6 +86,35 @@ def set_modified_csv(file_name, last_modified):
     os.utime(file_name, times = (current_time, mtimestamp))    
     return True
 
+def get_col_types_file(csv_file) -> Path:
+    """Path of the column types kept next to `csv_file` (`{table}.col_types.json`)."""
+    csv_file = Path(csv_file)
+    stem = csv_file.name.removesuffix(".gz").removesuffix(".csv")
+    return csv_file.with_name(f"{stem}.col_types.json")
+
+def set_csv_col_types(csv_file, names, col_types):
+    """
+    Store the PostgreSQL types of the columns of `csv_file` next to it.
+
+    `wrds_update_csv()` records the types of the WRDS export here, so that
+    `csv_to_pg()` can recreate the table without inferring them.
+    """
+    path = get_col_types_file(csv_file)
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        tmp.write_text(json.dumps({name: col_types.get(name, "text") for name in names},
+                                  indent=1))
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+def get_csv_col_types(csv_file) -> dict[str, str] | None:
+    """Return the column types stored for `csv_file`, or None if there are none."""
+    try:
+        return json.loads(get_col_types_file(csv_file).read_text())
+    except FileNotFoundError:
+        return None
+
 def wrds_to_csv(
     table_name,
     schema,
@@ -99,6 +131,13 @@ def wrds_to_csv(
     encoding="utf-8",
     sas_schema=None,
     sas_encoding=None,
+    source="sas",
+    col_types=None,
+    fix_local=False,
+    progress=None,
+    chunk_size=1 << 20,
+    spool=None,
+    modified=None,
 ):
     if wrds_id is None:
         wrds_id = os.environ.get("WRDS_ID")
@@ -108,6 +147,8 @@ def wrds_to_csv(
     if sas_schema is None:
         sas_schema = schema
 
+    progress = as_progress(progress, table=f"{schema}.{table_name}")
+
     # get_wrds_process_stream should yield a *text* CSV stream
     with get_wrds_process_stream(
         table_name=table_name,
@@ -122,7 +163,27 @@ def wrds_to_csv(
         where=where,
         sas_encoding=sas_encoding,
         stream_encoding=encoding,
+        source=source,
+        col_types=col_types,
+        fix_local=fix_local,
+        progress=progress,
+        spool=spool,
+        modified=modified,
     ) as stream:
-        # gzip expects bytes; wrap it in TextIOWrapper to write str safely
-        with gzip.open(csv_file, mode="wt", encoding=encoding, newline="") as f:
-            shutil.copyfileobj(stream, f)
+        write_csv_gz(stream, csv_file, encoding=encoding, progress=progress,
+                     chunk_size=chunk_size)
+
+def write_csv_gz(stream, csv_file, encoding="utf-8", progress=None, chunk_size=1 << 20):
+    """Write the text stream `stream` to the gzipped file `csv_file`."""
+    progress = as_progress(progress)
+    # gzip expects bytes; wrap it in TextIOWrapper to write str safely
+    with gzip.open(csv_file, mode="wt", encoding=encoding, newline="") as f:
+        while True:
+            t0 = time.perf_counter()
+            data = stream.read(chunk_size)
+            t1 = time.perf_counter()
+            if not data:
+                break
+            f.write(data)
+            progress.add("gzip_write", bytes=len(data),
+                         busy=time.perf_counter() - t1, wait=t1 - t0)
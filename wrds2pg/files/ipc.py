@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import gzip
+import os
+import time
+import uuid
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+from ..progress import as_progress
+from .parquet import _arrow_convert_options, _arrow_schema
+
+def get_ipc_file(table_name, schema, data_dir=None, create=True):
+    """
+    Return `{data_dir}/{schema}/{table_name}.arrow`.
+
+    `data_dir` defaults to the environment value `DATA_DIR`, as for
+    Parquet files. The schema directory is created unless `create=False`.
+    """
+    if data_dir is None:
+        data_dir = os.environ.get("DATA_DIR")
+    if data_dir is None:
+        raise ValueError("You must provide `data_dir` or set the"
+                         " `DATA_DIR` environment variable.")
+
+    schema_dir = Path(data_dir).expanduser() / schema
+    if create:
+        schema_dir.mkdir(parents=True, exist_ok=True)
+    return schema_dir / f"{table_name}.arrow"
+
+def get_modified_ipc(file_name):
+    """Return the `last_modified` stamp of an Arrow IPC file, or ''."""
+    if not os.path.exists(file_name):
+        return ""
+    with pa.memory_map(str(file_name)) as source:
+        md = pa.ipc.open_file(source).schema.metadata
+    if not md or b"last_modified" not in md:
+        return ""
+    return md[b"last_modified"].decode("utf-8")
+
+class IPCWriter:
+    """
+    Write record batches to an Arrow IPC file, replacing it when closed.
+
+    Batches go to a temporary file in the same directory that replaces
+    `ipc_file` only if the `with` block exits without error. `modified`
+    is stored as schema metadata (`last_modified`), as for Parquet files.
+    `compression` is None (uncompressed: readers can memory-map the file
+    without copying), "lz4" or "zstd". If no batches are written, the file
+    holds no rows, with columns from `schema` (if given).
+    """
+
+    def __init__(self, ipc_file, modified, compression=None, progress=None, schema=None):
+        self.ipc_file = Path(ipc_file)
+        self.modified = modified
+        self.options = pa.ipc.IpcWriteOptions(compression=compression)
+        self.progress = as_progress(progress)
+        self.tmp = self.ipc_file.with_name(f".{self.ipc_file.name}.{uuid.uuid4().hex}.tmp")
+        self.writer = None
+        self.schema = schema if schema is not None else pa.schema([])
+
+    def __enter__(self):
+        return self
+
+    def _open(self, schema):
+        self.schema = schema.with_metadata({b"last_modified": self.modified.encode("utf-8")})
+        self.writer = pa.ipc.new_file(str(self.tmp), self.schema, options=self.options)
+
+    def write_batch(self, batch):
+        t0 = time.perf_counter()
+        if self.writer is None:
+            self._open(batch.schema)
+        self.writer.write_batch(batch.replace_schema_metadata(self.schema.metadata))
+        self.progress.add("ipc_write", bytes=batch.nbytes, rows=batch.num_rows,
+                          busy=time.perf_counter() - t0)
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self.writer is None and exc_type is None:
+                self._open(self.schema)  # empty table: still write a stamped file
+            if self.writer is not None:
+                self.writer.close()
+                if exc_type is None:
+                    os.replace(self.tmp, self.ipc_file)
+        finally:
+            self.tmp.unlink(missing_ok=True)
+        return False
+
+def csv_batches(f, names, col_types, block_size=16 << 20, progress=None):
+    """
+    Yield record batches of CSV read from the binary stream `f` (header
+    first), typed by `col_types` as for Parquet (see `csv_stream_to_pq()`).
+    """
+    progress = as_progress(progress)
+    reader = pacsv.open_csv(
+        f,
+        read_options=pacsv.ReadOptions(use_threads=True, block_size=block_size,
+                                       skip_rows=1, column_names=names),
+        parse_options=pacsv.ParseOptions(delimiter=","),
+        convert_options=_arrow_convert_options(names, col_types),
+    )
+    while True:
+        t0 = time.perf_counter()
+        try:
+            batch = reader.read_next_batch()
+        except StopIteration:
+            return
+        progress.add("arrow_parse", rows=batch.num_rows, busy=time.perf_counter() - t0)
+        yield batch
+
+def csv_stream_to_ipc(f, ipc_file, names, col_types, modified, compression=None,
+                      block_size=16 << 20, progress=None):
+    """
+    Convert CSV read from the binary stream `f` (header first) to Arrow IPC.
+
+    Larger CSV blocks than for Parquet give fewer, larger record batches.
+    """
+    with IPCWriter(ipc_file, modified, compression=compression, progress=progress,
+                   schema=_arrow_schema(names, col_types)) as writer:
+        for batch in csv_batches(f, names, col_types, block_size, progress):
+            writer.write_batch(batch)
+
+def csv_to_ipc_arrow_stream(csv_file, ipc_file, names, col_types, modified,
+                            compression=None, progress=None):
+    with gzip.open(csv_file, "rb") as f:
+        csv_stream_to_ipc(f, ipc_file, names, col_types, modified,
+                          compression=compression, progress=progress)
+
+def read_wrds_ipc(table_name, schema, columns=None, data_dir=None) -> pa.Table:
+    """
+    Load a table written by `wrds_update_ipc()`.
+
+    The file is memory-mapped, so for an uncompressed file the result
+    refers to the operating system's page cache rather than copies of the
+    data: loading takes milliseconds regardless of size, and pages are read
+    from disk only when used.
+
+    Examples
+    ----------
+    >>> dsf = read_wrds_ipc("dsf", "crsp", columns=["permno", "date", "ret"])
+    """
+    ipc_file = get_ipc_file(table_name, schema, data_dir, create=False)
+    if not ipc_file.exists():
+        raise FileNotFoundError(f"No Arrow IPC file for {schema}.{table_name} at {ipc_file}.")
+    source = pa.memory_map(str(ipc_file))
+    table = pa.ipc.open_file(source).read_all()
+    if columns is not None:
+        table = table.select([c.lower() for c in columns])
+    return table
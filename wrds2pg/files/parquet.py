@@ -2,12 +2,22 @@ from __future__ import annotations
 
 import os
 import gzip
+import hashlib
+import json
 import re
+import time
+from dataclasses import dataclass
 
+import numpy as np
 import pyarrow as pa
+import pyarrow.compute as pc
 import pyarrow.csv as pacsv
 import pyarrow.parquet as pq
 
+from .._utils import parse_size, rss_bytes
+from ..progress import as_progress
+from .paths import get_pq_file
+
 # PostgreSQL → Arrow type mapping
 _PG_TO_ARROW = {
     "text": pa.string(),
@@ -39,13 +49,22 @@ def get_modified_pq(file_name):
 
     return value.decode("utf-8")
 
+def _arrow_type(col_type):
+    t = (col_type or "").strip().lower()
+    t = re.sub(r"\(.*\)$", "", t).strip()   # drop (8), (255), etc.
+    return _PG_TO_ARROW.get(t)
+
+def _arrow_schema(names, col_types):
+    """Arrow schema for CSV columns typed by `col_types` (other columns as strings)."""
+    col_types = col_types or {}
+    return pa.schema([(name, _arrow_type(col_types.get(name)) or pa.string())
+                      for name in names])
+
 def _arrow_convert_options(names, col_types):
     col_types = col_types or {}
     column_types = {}
     for name in names:
-        t = (col_types.get(name) or "").strip().lower()
-        t = re.sub(r"\(.*\)$", "", t).strip()   # drop (8), (255), etc.
-        pa_t = _PG_TO_ARROW.get(t)
+        pa_t = _arrow_type(col_types.get(name))
 
         # If unknown, DON'T force a type (Arrow will infer)
         if pa_t is not None:
@@ -58,6 +77,67 @@ def _arrow_convert_options(names, col_types):
         null_values=[""],
     )
 
+# File metadata key holding the row-group digests of `delta=True` files
+_DIGESTS_KEY = "wrds2pg_row_groups"
+
+# Memory held per byte of CSV block in flight (raw text and parsed columns)
+# and per byte of buffered row group (record batches and encoded pages).
+_PARSE_FACTOR = 3
+_ENCODE_FACTOR = 2
+_MIN_BLOCK_SIZE = 256 << 10
+_MAX_BLOCK_SIZE = 64 << 20
+_MIN_ROW_GROUP_BYTES = 8 << 20
+# Held regardless of buffer sizes (decompression, writer and reader state)
+_RESERVE_BYTES = 16 << 20
+
+@dataclass
+class MemoryPlan:
+    """
+    Buffer sizes for a CSV-to-Parquet conversion under a memory budget.
+
+    `limit` is the target resident memory of the process, `block_size`
+    the bytes of CSV parsed at a time, `use_threads` whether blocks are
+    parsed in parallel on Arrow's thread pool and `row_group_bytes` the
+    Arrow memory buffered before it is written as a row group.
+    """
+
+    limit: int
+    block_size: int
+    use_threads: bool
+    row_group_bytes: int
+
+def memory_plan(memory_limit, baseline=None) -> MemoryPlan:
+    """
+    Size CSV blocks, parsing threads and row groups to fit `memory_limit`.
+
+    `memory_limit` is bytes or a string such as "2GB" or "512MiB". The
+    headroom above `baseline` (default: the current resident memory of
+    the process) less a fixed reserve is split evenly between the row group being built and
+    CSV blocks in flight, of which Arrow parses one per CPU plus one read
+    ahead. Threads are given up before blocks drop below 1 MiB.
+    """
+    limit = parse_size(memory_limit)
+    if baseline is None:
+        baseline = rss_bytes() or 0
+    available = limit - baseline - _RESERVE_BYTES
+    if available < 4 * _MIN_ROW_GROUP_BYTES:
+        needed = 4 * _MIN_ROW_GROUP_BYTES + _RESERVE_BYTES
+        raise ValueError(
+            f"memory_limit of {limit / 2**20:.0f} MiB leaves "
+            f"{(limit - baseline) / 2**20:.0f} MiB above the "
+            f"{baseline / 2**20:.0f} MiB already in use; "
+            f"at least {needed / 2**20:.0f} MiB more is needed."
+        )
+
+    row_group_bytes = available // (2 * _ENCODE_FACTOR)
+    threads = pa.cpu_count()
+    block_size = available // (2 * _PARSE_FACTOR * (threads + 1))
+    use_threads = threads > 1 and block_size >= 1 << 20
+    if not use_threads:
+        block_size = available // (2 * _PARSE_FACTOR * 2)
+    block_size = max(_MIN_BLOCK_SIZE, min(block_size, _MAX_BLOCK_SIZE))
+    return MemoryPlan(limit, block_size, use_threads, row_group_bytes)
+
 def csv_to_pq_arrow_stream(
     csv_file,
     pq_file,
@@ -66,34 +146,292 @@ def csv_to_pq_arrow_stream(
     modified,
     row_group_size=1_048_576,
     block_size=1 << 20,
+    memory_limit=None,
+    delta=False,
+    previous=None,
+    progress=None,
 ):
     with gzip.open(csv_file, "rb") as f:
-        read_opts = pacsv.ReadOptions(
-            use_threads=True,
-            block_size=block_size,
-            autogenerate_column_names=False,
-            skip_rows=1,              # <-- skip SAS header row
-            column_names=names,       # <-- force your canonical names (lowercase)
-        )
-        parse_opts = pacsv.ParseOptions(delimiter=",")
-        convert_opts = _arrow_convert_options(names, col_types)
-    
-        reader = pacsv.open_csv(
-            f,
-            read_options=read_opts,
-            parse_options=parse_opts,
-            convert_options=convert_opts,
-        )
+        csv_stream_to_pq(f, pq_file, names, col_types, modified,
+                         row_group_size=row_group_size, block_size=block_size,
+                         memory_limit=memory_limit, delta=delta, previous=previous,
+                         progress=progress)
+
+def table_digest(table) -> str:
+    """
+    Return a digest of the column names, types and values of `table`.
+
+    The digest depends only on the data, not on how it is chunked or laid
+    out in memory, so a row group read back from Parquet has the digest of
+    the rows it was written from.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(table.num_rows).encode())
+    for name, column in zip(table.column_names, table.columns):
+        array = column.combine_chunks() if isinstance(column, pa.ChunkedArray) else column
+        h.update(f"|{name}:{array.type}:{array.null_count}|".encode())
+        if array.null_count:
+            h.update(pc.is_valid(array).to_numpy(zero_copy_only=False).tobytes())
+            array = array.drop_null()
+        if pa.types.is_string(array.type) or pa.types.is_binary(array.type) \
+                or pa.types.is_large_string(array.type) or pa.types.is_large_binary(array.type):
+            width = 8 if pa.types.is_large_string(array.type) \
+                or pa.types.is_large_binary(array.type) else 4
+            _, offsets, data = array.buffers()
+            offsets = np.frombuffer(offsets, dtype=f"<i{width}")[
+                array.offset:array.offset + len(array) + 1]
+            h.update((offsets - offsets[0]).tobytes())
+            if data is not None:
+                h.update(memoryview(data)[offsets[0]:offsets[-1]])
+        elif pa.types.is_null(array.type):
+            pass
+        elif pa.types.is_primitive(array.type):
+            h.update(array.to_numpy(zero_copy_only=False).tobytes())
+        else:
+            h.update(repr(array.to_pylist()).encode())
+    return h.hexdigest()
+
+def get_row_group_digests(pq_file) -> tuple[int, list[str]] | None:
+    """
+    Return (rows per row group, digest of each row group) of a file
+    written with `delta=True`, or None.
+    """
+    if not os.path.exists(pq_file):
+        return None
+    md = pq.read_metadata(pq_file).metadata or {}
+    value = md.get(_DIGESTS_KEY.encode())
+    if value is None:
+        return None
+    info = json.loads(value)
+    return info["rows"], info["digests"]
+
+def csv_stream_to_pq(
+    f,
+    pq_file,
+    names,
+    col_types,
+    modified,
+    row_group_size=1_048_576,
+    block_size=1 << 20,
+    memory_limit=None,
+    delta=False,
+    previous=None,
+    progress=None,
+):
+    """
+    Convert CSV read from the binary stream `f` (header first) to Parquet.
+
+    With `memory_limit` (see `memory_plan()`), `block_size` and threading
+    are chosen to fit the budget and record batches are buffered up to
+    `row_group_bytes` (or `row_group_size` rows) and written as one row
+    group, after which Arrow returns freed memory to the system. If
+    resident memory still exceeds the limit, later row groups are halved.
+    The peak resident memory seen is recorded as the `peak_rss` counter
+    of `progress`.
+
+    With `delta=True`, every row group but the last has exactly
+    `row_group_size` rows, and each row group's `table_digest()` is stored
+    in the file metadata. Parquet encoding is deterministic, so a row
+    group whose rows are unchanged is written with the same bytes as
+    before and rows appended to a table change only the last row groups.
+    `previous` (from `get_row_group_digests()` for the file being
+    replaced) is compared with the new digests; the counters
+    `row_groups` and `row_groups_unchanged` of `progress` give the result.
+    `memory_limit` then sets only the block size and threading.
+    """
+    progress = as_progress(progress)
+    plan = memory_plan(memory_limit) if memory_limit is not None else None
+    if plan is not None:
+        block_size = plan.block_size
+    read_opts = pacsv.ReadOptions(
+        use_threads=True if plan is None else plan.use_threads,
+        block_size=block_size,
+        autogenerate_column_names=False,
+        skip_rows=1,              # <-- skip SAS header row
+        column_names=names,       # <-- force your canonical names (lowercase)
+    )
+    parse_opts = pacsv.ParseOptions(delimiter=",")
+    convert_opts = _arrow_convert_options(names, col_types)
+
+    reader = pacsv.open_csv(
+        f,
+        read_options=read_opts,
+        parse_options=parse_opts,
+        convert_options=convert_opts,
+    )
 
-        writer = None
-        try:
-            for batch in reader:
-                if writer is None:
-                    schema = batch.schema.with_metadata(
-                        {b"last_modified": modified.encode("utf-8")}
-                    )
-                    writer = pq.ParquetWriter(pq_file, schema=schema)
+    writer = None
+    pending, pending_bytes, pending_rows = [], 0, 0
+    row_group_bytes = plan.row_group_bytes if plan is not None else None
+    old_digests = previous[1] if previous and previous[0] == row_group_size else []
+    digests = []
+
+    def record_rss():
+        rss = rss_bytes()
+        if rss is not None:
+            progress.peak("peak_rss", rss)
+        return rss
+
+    def write_delta(final):
+        nonlocal pending, pending_bytes, pending_rows
+        t0 = time.perf_counter()
+        table = pa.Table.from_batches(pending)
+        end = table.num_rows if final else table.num_rows - table.num_rows % row_group_size
+        for start in range(0, end, row_group_size):
+            chunk = table.slice(start, min(row_group_size, end - start))
+            digest = table_digest(chunk)
+            if len(digests) < len(old_digests) and digest == old_digests[len(digests)]:
+                progress.count("row_groups_unchanged")
+            progress.count("row_groups")
+            digests.append(digest)
+            writer.write_table(chunk, row_group_size=row_group_size)
+        progress.add("parquet_write", bytes=table.slice(0, end).nbytes, rows=end,
+                     busy=time.perf_counter() - t0)
+        pending = table.slice(end).to_batches()
+        pending_rows = table.num_rows - end
+        pending_bytes = sum(b.nbytes for b in pending)
+        pa.default_memory_pool().release_unused()
+        record_rss()
+
+    def flush():
+        nonlocal pending, pending_bytes, pending_rows, row_group_bytes
+        t0 = time.perf_counter()
+        writer.write_table(pa.Table.from_batches(pending), row_group_size=row_group_size)
+        progress.add("parquet_write", bytes=pending_bytes, rows=pending_rows,
+                     busy=time.perf_counter() - t0)
+        pending, pending_bytes, pending_rows = [], 0, 0
+        pa.default_memory_pool().release_unused()
+        rss = record_rss()
+        if rss is not None and rss > plan.limit:
+            row_group_bytes = max(_MIN_ROW_GROUP_BYTES, row_group_bytes // 2)
+
+    try:
+        while True:
+            t0 = time.perf_counter()
+            try:
+                batch = reader.read_next_batch()
+            except StopIteration:
+                break
+            t1 = time.perf_counter()
+            progress.add("arrow_parse", rows=batch.num_rows, busy=t1 - t0)
+            if writer is None:
+                schema = batch.schema.with_metadata(
+                    {b"last_modified": modified.encode("utf-8")}
+                )
+                writer = pq.ParquetWriter(pq_file, schema=schema)
+            if plan is None and not delta:
                 writer.write_batch(batch, row_group_size=row_group_size)
-        finally:
-            if writer is not None:
-                writer.close()
+                progress.add("parquet_write", bytes=batch.nbytes, rows=batch.num_rows,
+                             busy=time.perf_counter() - t1)
+                record_rss()
+                continue
+            pending.append(batch)
+            pending_bytes += batch.nbytes
+            pending_rows += batch.num_rows
+            del batch
+            if delta:
+                if pending_rows >= row_group_size:
+                    write_delta(final=False)
+            elif pending_bytes >= row_group_bytes or pending_rows >= row_group_size:
+                flush()
+        if pending:
+            write_delta(final=True) if delta else flush()
+        if writer is None:
+            # empty table: still write a stamped file
+            schema = _arrow_schema(names, col_types).with_metadata(
+                {b"last_modified": modified.encode("utf-8")}
+            )
+            writer = pq.ParquetWriter(pq_file, schema=schema)
+        if delta:
+            writer.add_key_value_metadata({_DIGESTS_KEY: json.dumps(
+                {"rows": row_group_size, "digests": digests})})
+    finally:
+        if writer is not None:
+            writer.close()
+
+def _as_expression(filters):
+    """Accept a dataset expression or `pq.read_table()`-style DNF filters."""
+    if filters is None or isinstance(filters, pc.Expression):
+        return filters
+    return pq.filters_to_expression(filters)
+
+def wrds_pq_dataset(table_name, schema, data_dir=None, memory_map=True):
+    """
+    Return a `pyarrow.dataset.Dataset` over a table of the Parquet mirror.
+
+    The file is `{data_dir}/{schema}/{table_name}.parquet`, as written by
+    `wrds_update_pq()` (see `get_pq_file()`). With `memory_map=True` the
+    file is memory-mapped rather than read into buffers.
+    """
+    pq_file = get_pq_file(table_name, schema, data_dir, create=False)
+    if not pq_file.exists():
+        raise FileNotFoundError(f"No Parquet file for {schema}.{table_name} at {pq_file}.")
+    import pyarrow.dataset as ds  # loads pandas; not needed to write or stamp files
+    import pyarrow.fs as pafs
+
+    return ds.dataset(pq_file, format="parquet",
+                      filesystem=pafs.LocalFileSystem(use_mmap=memory_map))
+
+def _scanner(table_name, schema, columns, filters, data_dir, memory_map, **kwargs):
+    dataset = wrds_pq_dataset(table_name, schema, data_dir, memory_map=memory_map)
+    return dataset.scanner(columns=columns, filter=_as_expression(filters),
+                           use_threads=True, **kwargs)
+
+def read_wrds_pq(table_name, schema, columns=None, filters=None, data_dir=None,
+                 memory_map=True) -> pa.Table:
+    """
+    Read a table of the Parquet mirror into an Arrow table.
+
+    Only `columns` are decoded, and `filters` are pushed down: row groups
+    whose statistics rule out a match are skipped without being read, so
+    a selective filter on a column the table is sorted by (e.g., `permno`
+    in `crsp.dsf`) reads a similarly small part of the file.
+
+    Parameters
+    ----------
+    table_name, schema : str
+        Table as named in the mirror (`alt_table_name` if one was used).
+    columns : list[str], optional
+        Columns to read. Default is all.
+    filters : pyarrow.compute.Expression or list, optional
+        An expression (e.g., `pc.field("permno") == 10001`) or filters in
+        the DNF form used by `pyarrow.parquet.read_table()`
+        (e.g., `[("date", ">=", date(2020, 1, 1))]`).
+    data_dir : str, optional
+        Default is the environment value `DATA_DIR`.
+    memory_map : bool
+        Memory-map the file.
+
+    Examples
+    ----------
+    >>> msf = read_wrds_pq("msf", "crsp", columns=["permno", "date", "ret"],
+    ...                    filters=[("permno", "in", [10001, 14593])])
+    """
+    return _scanner(table_name, schema, columns, filters, data_dir, memory_map).to_table()
+
+def read_wrds_pq_pandas(table_name, schema, columns=None, filters=None, data_dir=None,
+                        memory_map=True, dtype_backend=None):
+    """
+    Read a table of the Parquet mirror into a pandas DataFrame.
+
+    Arguments are those of `read_wrds_pq()`. `dtype_backend="pyarrow"`
+    keeps Arrow-backed columns instead of converting to NumPy types.
+    """
+    table = read_wrds_pq(table_name, schema, columns, filters, data_dir, memory_map)
+    if dtype_backend == "pyarrow":
+        import pandas as pd
+
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    return table.to_pandas()
+
+def iter_wrds_pq(table_name, schema, columns=None, filters=None, data_dir=None,
+                 batch_size=131_072, memory_map=True):
+    """
+    Yield a table of the Parquet mirror as Arrow record batches.
+
+    Arguments are those of `read_wrds_pq()`; at most about `batch_size`
+    rows are held at a time, so tables larger than memory can be processed.
+    """
+    scanner = _scanner(table_name, schema, columns, filters, data_dir, memory_map,
+                       batch_size=batch_size)
+    yield from scanner.to_batches()
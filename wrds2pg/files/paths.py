@@ -3,7 +3,13 @@ from __future__ import annotations
 import os
 from pathlib import Path
 
-def get_pq_file(table_name, schema, data_dir=None):
+def get_pq_file(table_name, schema, data_dir=None, create=True):
+    """
+    Return `{data_dir}/{schema}/{table_name}.parquet`.
+
+    `data_dir` defaults to the environment value `DATA_DIR`. The schema
+    directory is created unless `create=False`.
+    """
     if data_dir is None:
         data_dir = os.environ.get("DATA_DIR")
     if data_dir is None:
@@ -12,6 +18,7 @@ def get_pq_file(table_name, schema, data_dir=None):
 
     base = Path(data_dir).expanduser()
     schema_dir = base / schema
-    schema_dir.mkdir(parents=True, exist_ok=True)
+    if create:
+        schema_dir.mkdir(parents=True, exist_ok=True)
 
     return (schema_dir / table_name).with_suffix(".parquet")
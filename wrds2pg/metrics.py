@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Stages that move the table's data; the first one present gives the
+# transfer size.
+_TRANSFER_STAGES = ("sftp_fetch", "ssh_read", "spool_read", "pg_read")
+# Stages whose row counts give the number of rows written.
+_ROW_STAGES = ("copy_write", "parquet_write", "ipc_write", "duckdb_write", "arrow_parse",
+               "decode", "pg_read")
+
+def run_record(summary: dict, mode: str, source: str = "sas",
+               error: BaseException | None = None) -> dict:
+    """
+    Build a flat metrics record for one table run from `Progress.summary()`.
+
+    Parameters
+    ----------
+    summary:
+        Output of `Progress.summary()` (or `Progress.finish()`).
+    mode:
+        Target of the run: "pg", "parquet", "ipc", "duckdb" or "csv".
+    source:
+        Data source of the run (e.g., "sas" or "sftp").
+    error:
+        Exception that ended the run, if any. Sets `outcome` to "error".
+
+    Returns
+    -------
+    dict with `table`, `mode`, `source`, `outcome`, `error`, `started`
+    (ISO 8601 UTC), `duration`, `freshness_seconds`, `metadata_seconds`,
+    `bytes`, `rows`, `retries`, `peak_rss` (bytes, if measured),
+    `sas_errors`, `sas_warnings`, `events` (e.g., SAS log messages and
+    step times, see `wrds2pg.sas.log.SASLog`) and `stages` (per-stage
+    `busy`, `wait`, `bytes` and `rows`).
+    """
+    counters = summary.get("counters", {})
+    stages = summary.get("stages", {})
+
+    def busy(name):
+        return stages[name]["busy"] if name in stages else None
+
+    nbytes = next((stages[s]["bytes"] for s in _TRANSFER_STAGES if s in stages), None)
+    rows = next((stages[s]["rows"] for s in _ROW_STAGES
+                 if s in stages and stages[s]["rows"]), None)
+
+    outcome = "error" if error is not None else (summary.get("outcome") or "unknown")
+    return {
+        "table": summary.get("table"),
+        "mode": mode,
+        "source": source,
+        "outcome": outcome,
+        "error": None if error is None else f"{type(error).__name__}: {error}",
+        "started": datetime.fromtimestamp(summary.get("started", 0), timezone.utc)
+                           .isoformat(timespec="milliseconds"),
+        "duration": summary.get("elapsed"),
+        "freshness_seconds": busy("freshness"),
+        "metadata_seconds": busy("sas_metadata") or busy("pg_metadata"),
+        "bytes": nbytes,
+        "rows": rows,
+        "retries": counters.get("retries", 0),
+        "peak_rss": counters.get("peak_rss"),
+        "sas_errors": counters.get("sas_errors", 0),
+        "sas_warnings": counters.get("sas_warnings", 0),
+        "events": summary.get("events", []),
+        "stages": {
+            name: {k: s[k] for k in ("busy", "wait", "bytes", "rows")}
+            for name, s in stages.items()
+        },
+    }
+
+class JSONLinesSink:
+    """
+    Append one JSON object per table run to `path`.
+
+    Each line is written with a single `write()` on a file opened in append
+    mode, so concurrent cron jobs can share one file.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def emit(self, record: dict) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+
+def _prom_escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _prom_labels(**labels) -> str:
+    return "{" + ",".join(f'{k}="{_prom_escape(v)}"' for k, v in labels.items()) + "}"
+
+class PrometheusTextfileSink:
+    """
+    Write metrics for node_exporter's textfile collector.
+
+    One file, `wrds2pg_<mode>_<schema>_<table>.prom`, is written per table
+    into `directory` (point `--collector.textfile.directory` at it). Each
+    run replaces its table's file atomically, so the collector always sees
+    the latest complete run for every table.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def _lines(self, record):
+        base = {"table": record["table"], "mode": record["mode"]}
+        labels = _prom_labels(**base)
+        started = datetime.fromisoformat(record["started"]).timestamp()
+        lines = [
+            "# HELP wrds2pg_run_timestamp_seconds Start time of the last run.",
+            "# TYPE wrds2pg_run_timestamp_seconds gauge",
+            f"wrds2pg_run_timestamp_seconds{labels} {started}",
+            "# HELP wrds2pg_run_duration_seconds Wall time of the last run.",
+            "# TYPE wrds2pg_run_duration_seconds gauge",
+            f"wrds2pg_run_duration_seconds{labels} {record['duration'] or 0}",
+            "# HELP wrds2pg_run_success Whether the last run finished without error.",
+            "# TYPE wrds2pg_run_success gauge",
+            f"wrds2pg_run_success{_prom_labels(**base, outcome=record['outcome'])} "
+            f"{int(record['outcome'] != 'error')}",
+            "# HELP wrds2pg_run_retries Transfer retries in the last run.",
+            "# TYPE wrds2pg_run_retries gauge",
+            f"wrds2pg_run_retries{labels} {record['retries']}",
+            "# HELP wrds2pg_run_bytes Bytes transferred in the last run.",
+            "# TYPE wrds2pg_run_bytes gauge",
+            f"wrds2pg_run_bytes{labels} {record['bytes'] or 0}",
+            "# HELP wrds2pg_run_rows Rows written in the last run.",
+            "# TYPE wrds2pg_run_rows gauge",
+            f"wrds2pg_run_rows{labels} {record['rows'] or 0}",
+            "# HELP wrds2pg_run_sas_errors ERROR lines in SAS logs of the last run.",
+            "# TYPE wrds2pg_run_sas_errors gauge",
+            f"wrds2pg_run_sas_errors{labels} {record.get('sas_errors', 0)}",
+            "# HELP wrds2pg_run_sas_warnings WARNING lines in SAS logs of the last run.",
+            "# TYPE wrds2pg_run_sas_warnings gauge",
+            f"wrds2pg_run_sas_warnings{labels} {record.get('sas_warnings', 0)}",
+        ]
+        for metric, key, help_text in [
+            ("wrds2pg_stage_busy_seconds", "busy", "Time spent working in each stage."),
+            ("wrds2pg_stage_wait_seconds", "wait", "Time each stage waited for input."),
+            ("wrds2pg_stage_bytes", "bytes", "Bytes handled by each stage."),
+            ("wrds2pg_stage_rows", "rows", "Rows handled by each stage."),
+        ]:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} gauge")
+            for stage, stats in record["stages"].items():
+                lines.append(f"{metric}{_prom_labels(**base, stage=stage)} {stats[key]}")
+
+        # SAS steps (from the log), summed by step name
+        steps = {}
+        for event in record.get("events", []):
+            if event.get("kind") == "step":
+                real, cpu = steps.get(event["message"], (0.0, 0.0))
+                steps[event["message"]] = (real + (event.get("real_seconds") or 0),
+                                           cpu + (event.get("cpu_seconds") or 0))
+        if steps:
+            for metric, index, help_text in [
+                ("wrds2pg_sas_step_real_seconds", 0, "Elapsed time of SAS steps."),
+                ("wrds2pg_sas_step_cpu_seconds", 1, "CPU time of SAS steps."),
+            ]:
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} gauge")
+                for step, times in steps.items():
+                    lines.append(f"{metric}{_prom_labels(**base, step=step)} {times[index]}")
+        return lines
+
+    def emit(self, record: dict) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        name = re.sub(r"[^A-Za-z0-9_]", "_", f"{record['mode']}_{record['table']}")
+        path = self.directory / f"wrds2pg_{name}.prom"
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write("\n".join(self._lines(record)) + "\n")
+            # mkstemp creates the file 0600; the collector may run as another user
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, path)
+        finally:
+            Path(tmp).unlink(missing_ok=True)
+
+class OpenTelemetrySink:
+    """
+    Record each table run as an OpenTelemetry span.
+
+    The span `wrds2pg.update` covers the run; run fields and per-stage busy
+    and wait times are set as `wrds2pg.*` attributes and run events (such
+    as SAS log errors and step times) are added as span events. Spans go
+    to whatever tracer provider the application configured.
+    """
+
+    def __init__(self, tracer=None):
+        try:
+            from opentelemetry import trace
+        except ImportError as e:
+            raise ImportError(
+                "OpenTelemetrySink requires opentelemetry-api. "
+                "Install it with `pip install opentelemetry-api`."
+            ) from e
+        self._trace = trace
+        self.tracer = tracer or trace.get_tracer("wrds2pg")
+
+    def emit(self, record: dict) -> None:
+        started = datetime.fromisoformat(record["started"]).timestamp()
+        start_ns = int(started * 1e9)
+        end_ns = start_ns + int((record["duration"] or 0) * 1e9)
+
+        attributes = {
+            f"wrds2pg.{k}": v for k, v in record.items()
+            if k not in ("stages", "events") and v is not None
+        }
+        for stage, stats in record["stages"].items():
+            for key, value in stats.items():
+                attributes[f"wrds2pg.stage.{stage}.{key}"] = value
+
+        span = self.tracer.start_span("wrds2pg.update", start_time=start_ns,
+                                      attributes=attributes)
+        for event in record.get("events", []):
+            fields = {k: v for k, v in event.items() if k not in ("time", "kind")}
+            span.add_event(f"wrds2pg.{event.get('kind', 'event')}", attributes=fields,
+                           timestamp=start_ns + int(event.get("time", 0) * 1e9))
+        if record["outcome"] == "error":
+            span.set_status(self._trace.Status(self._trace.StatusCode.ERROR,
+                                               record["error"]))
+        span.end(end_time=end_ns)
+
+def get_metrics_sinks(metrics=None) -> list:
+    """
+    Resolve the `metrics` argument of the update functions into sinks.
+
+    `metrics` may be a sink (any object with an `emit(record)` method), a
+    list of sinks, or a string. Strings are comma-separated specs: a path
+    ending in `.jsonl` or `.json` gives a `JSONLinesSink`, `otel` gives an
+    `OpenTelemetrySink`, and any other path is taken as a directory for a
+    `PrometheusTextfileSink`. Default is the environment value
+    `WRDS2PG_METRICS`, if set.
+    """
+    if metrics is None:
+        metrics = os.environ.get("WRDS2PG_METRICS")
+    if not metrics:
+        return []
+    if isinstance(metrics, str):
+        sinks = []
+        for spec in metrics.split(","):
+            spec = spec.strip()
+            if not spec:
+                continue
+            if spec.lower() in ("otel", "opentelemetry"):
+                sinks.append(OpenTelemetrySink())
+            elif spec.endswith((".jsonl", ".json")):
+                sinks.append(JSONLinesSink(spec))
+            else:
+                sinks.append(PrometheusTextfileSink(spec))
+        return sinks
+    if isinstance(metrics, (list, tuple)):
+        return [s for m in metrics for s in get_metrics_sinks(m)]
+    if not hasattr(metrics, "emit"):
+        raise ValueError(f"Unsupported metrics sink: {metrics!r}")
+    return [metrics]
+
+def emit_run(sinks, summary: dict, mode: str, source: str = "sas",
+             error: BaseException | None = None) -> dict:
+    """Build the run record and send it to every sink; return the record."""
+    record = run_record(summary, mode, source=source, error=error)
+    for sink in sinks:
+        try:
+            sink.emit(record)
+        except Exception as e:  # metrics must never break an update
+            print(f"Could not write metrics to {sink!r}: {e}")
+    return record
@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import json
+import os
+import statistics
+from dataclasses import dataclass
+from pathlib import Path
+
+from .sas.metadata import get_wrds_catalog
+
+@dataclass
+class PlanItem:
+    """
+    One table in an update plan.
+
+    `status` is "missing" (no local copy), "stale" (WRDS is newer) or
+    "current". `est_bytes` is the expected size of the CSV transfer,
+    `est_seconds` the expected wall time and `est_disk_bytes` the space
+    the new copy needs. `basis` says how estimates were made: "history"
+    (an earlier run of this table), "throughput" (average rate of earlier
+    runs of other tables) or "default" (`default_rate`).
+    """
+
+    table: str
+    target: str
+    status: str
+    wrds_modified: str
+    local_modified: str
+    nobs: int | None
+    filesize: int | None
+    est_bytes: int
+    est_seconds: float
+    est_disk_bytes: int
+    basis: str
+
+def _history_files(history):
+    if history is None:
+        history = os.environ.get("WRDS2PG_METRICS", "")
+    if isinstance(history, (str, Path)):
+        history = [h.strip() for h in str(history).split(",")]
+    return [Path(h) for h in history
+            if str(h).endswith((".jsonl", ".json")) and Path(h).exists()]
+
+def load_history(history=None, mode=None) -> dict[str, list[dict]]:
+    """
+    Read successful runs from metrics JSON-lines files (see `wrds2pg.metrics`).
+
+    Returns a dict mapping "schema.table" to its runs with `outcome`
+    "updated" and a positive transfer size, oldest first. `history` is a
+    path or list of paths; the default is the `.jsonl` entries of the
+    environment value `WRDS2PG_METRICS`.
+    """
+    runs: dict[str, list[dict]] = {}
+    for path in _history_files(history):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if (record.get("outcome") == "updated" and record.get("bytes")
+                        and record.get("duration")
+                        and (mode is None or record.get("mode") == mode)):
+                    runs.setdefault(record["table"], []).append(record)
+    return runs
+
+def _local_state(target, schema, table_name, engine, data_dir, database=None):
+    """Return (last-modified string, size in bytes) of the local copy."""
+    # imported per target: `wrds2pg --check` should not load pyarrow for PostgreSQL
+    if target == "duckdb":
+        from .duck import get_modified_duckdb
+
+        # DuckDB does not report the size of a single table
+        return get_modified_duckdb(table_name, schema, database), 0
+    if target == "pg":
+        from sqlalchemy import text
+
+        from .postgres.ddl import get_table_comment
+
+        comment = get_table_comment(table_name, schema, engine)
+        if not comment:
+            return "", 0
+        with engine.connect() as conn:
+            size = conn.execute(
+                text("SELECT pg_total_relation_size("
+                     "to_regclass(quote_ident(:schema) || '.' || quote_ident(:table)))"),
+                {"schema": schema, "table": table_name},
+            ).scalar()
+        return comment, size or 0
+
+    suffix = {"parquet": ".parquet", "ipc": ".arrow", "csv": ".csv.gz"}[target]
+    path = Path(data_dir).expanduser() / schema / f"{table_name}{suffix}"
+    if not path.exists():
+        return "", 0
+    if target == "parquet":
+        from .files.parquet import get_modified_pq as get_modified
+    elif target == "ipc":
+        from .files.ipc import get_modified_ipc as get_modified
+    else:
+        from .files.csv import get_modified_csv as get_modified
+    modified = get_modified(path)
+    return modified, path.stat().st_size
+
+def plan_update(
+    schema,
+    tables=None,
+    target="pg",
+    wrds_id=None,
+    engine=None,
+    data_dir=None,
+    sas_schema=None,
+    history=None,
+    default_rate=20e6,
+    default_overhead=10.0,
+    include_current=False,
+    database=None,
+):
+    """
+    List the tables of a WRDS library that an update would refresh.
+
+    Nothing is downloaded or changed: one SAS job reads the library catalog
+    (`get_wrds_catalog()`), which is compared with the stamps of local
+    copies in PostgreSQL, Parquet, Arrow IPC, DuckDB or CSV (as
+    `wrds_update()` and related functions would). Transfer size and
+    time are estimated from earlier runs recorded by `metrics=`.
+
+    Parameters
+    ----------
+    schema: string
+        Local schema (PostgreSQL schema or data directory subfolder).
+    tables: list of string [Optional]
+        Tables to consider. Default is every table in the library.
+    target: string
+        "pg", "parquet", "ipc", "duckdb" or "csv".
+    wrds_id: string [Optional]
+        Default is to use the environment value `WRDS_ID`.
+    engine: SQLAlchemy engine [Optional]
+        For "pg". Default is `make_engine()`.
+    data_dir: string [Optional]
+        For "parquet" and "ipc" (default `DATA_DIR`) and "csv" (default `CSV_DIR`).
+    sas_schema: string [Optional]
+        WRDS library, if different from `schema`.
+    history: string or list [Optional]
+        Metrics JSON-lines files. Default is the `.jsonl` entries of
+        `WRDS2PG_METRICS`.
+    default_rate: float
+        Bytes per second assumed when there is no history.
+    default_overhead: float
+        Seconds per table (SAS start-up, metadata) assumed without history.
+    include_current: boolean
+        Also list tables that are up to date.
+    database: string [Optional]
+        For "duckdb". Default is the environment value `DUCKDB_DATABASE`.
+
+    Returns
+    -------
+    list of `PlanItem`, largest estimated transfer first.
+
+    Examples
+    ----------
+    >>> plan = plan_update("crsp", target="parquet")
+    >>> sum(item.est_disk_bytes for item in plan) / 1e9
+    >>> pd.DataFrame([dataclasses.asdict(item) for item in plan])
+    """
+    if target not in ("pg", "parquet", "ipc", "duckdb", "csv"):
+        raise ValueError(f"Unknown target {target!r}; "
+                         "use 'pg', 'parquet', 'ipc', 'duckdb' or 'csv'.")
+    if sas_schema is None:
+        sas_schema = schema
+    if target == "pg" and engine is None:
+        from .postgres.engine import make_engine
+
+        engine = make_engine()
+    if target in ("parquet", "ipc", "csv") and data_dir is None:
+        env = "CSV_DIR" if target == "csv" else "DATA_DIR"
+        data_dir = os.environ.get(env)
+        if data_dir is None:
+            raise ValueError(f"You must provide `data_dir` or set the `{env}` environment variable.")
+
+    catalog = get_wrds_catalog(sas_schema, wrds_id=wrds_id)
+    if tables is not None:
+        wanted = {t.lower() for t in tables}
+        catalog = [entry for entry in catalog if entry.table in wanted]
+
+    runs = load_history(history, mode=target)
+    all_runs = [r for table_runs in runs.values() for r in table_runs]
+    rate = (statistics.median(r["bytes"] / r["duration"] for r in all_runs)
+            if all_runs else default_rate)
+    overheads = [(r.get("freshness_seconds") or 0) + (r.get("metadata_seconds") or 0)
+                 for r in all_runs]
+    overhead = statistics.median(overheads) if overheads else default_overhead
+
+    plan = []
+    for entry in catalog:
+        local_modified, local_size = _local_state(target, schema, entry.table,
+                                                  engine, data_dir, database)
+        if not local_modified:
+            status = "missing"
+        elif local_modified != entry.last_modified:
+            status = "stale"
+        else:
+            status = "current"
+        if status == "current" and not include_current:
+            continue
+
+        previous = runs.get(f"{schema}.{entry.table}")
+        if previous:
+            last = previous[-1]
+            est_bytes = last["bytes"]
+            if last.get("rows") and entry.nobs:
+                est_bytes = last["bytes"] / last["rows"] * entry.nobs
+            est_seconds = last["duration"] * est_bytes / last["bytes"]
+            basis = "history"
+        else:
+            est_bytes = entry.filesize or 0
+            est_seconds = overhead + est_bytes / rate
+            basis = "throughput" if all_runs else "default"
+
+        plan.append(PlanItem(
+            table=entry.table,
+            target=target,
+            status=status,
+            wrds_modified=entry.last_modified,
+            local_modified=local_modified,
+            nobs=entry.nobs,
+            filesize=entry.filesize,
+            est_bytes=int(est_bytes),
+            est_seconds=est_seconds,
+            est_disk_bytes=int(local_size or est_bytes),
+            basis=basis,
+        ))
+
+    plan.sort(key=lambda item: item.est_bytes, reverse=True)
+    return plan
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import os
+import time
+
+import psycopg
+
+from .._utils import get_now
+from ..progress import as_progress
+from ..sas.metadata import get_table_metadata_async
+from ..sas.stream import get_wrds_process_stream_async
+from .ddl import create_table_sql
+
+def connect_kwargs(engine) -> dict:
+    """Return `psycopg.connect()` arguments for the database of a SQLAlchemy `engine`."""
+    url = engine.url
+    kwargs = {"host": url.host, "port": url.port, "dbname": url.database,
+              "user": url.username, "password": url.password}
+    kwargs.update(url.query)  # e.g., sslmode, or host for a Unix socket
+    return {k: v for k, v in kwargs.items() if v is not None}
+
+async def connect_async(engine) -> psycopg.AsyncConnection:
+    """Open a `psycopg.AsyncConnection` to the database of `engine`."""
+    return await psycopg.AsyncConnection.connect(**connect_kwargs(engine))
+
+async def get_table_comment_async(table_name: str, schema: str, engine) -> str:
+    """Async version of `get_table_comment()`."""
+    async with await connect_async(engine) as conn:
+        cur = await conn.execute(
+            "SELECT obj_description(to_regclass(quote_ident(%s) || '.' || quote_ident(%s)),"
+            " 'pg_class')",
+            (schema, table_name),
+        )
+        row = await cur.fetchone()
+    return (row[0] if row else None) or ""
+
+async def _lock_schema(conn, schema):
+    # concurrent loads into a new schema would otherwise race to create it
+    await conn.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f"wrds2pg:{schema}",))
+
+async def _ensure_roles(conn, schema):
+    await _lock_schema(conn, schema)
+    for role in [schema, f"{schema}_access"]:
+        cur = await conn.execute("SELECT 1 FROM pg_roles WHERE rolname = %s", (role,))
+        if await cur.fetchone() is None:
+            await conn.execute(f'CREATE ROLE "{role}"')
+
+async def ensure_schema_async(conn, schema: str, create_roles: bool = True) -> None:
+    """Async version of `ensure_schema()` on an open connection (commits)."""
+    async with conn.transaction():
+        await _lock_schema(conn, schema)
+        cur = await conn.execute("SELECT 1 FROM pg_namespace WHERE nspname = %s", (schema,))
+        if await cur.fetchone() is not None:
+            return
+        await conn.execute(f'CREATE SCHEMA "{schema}"')
+
+        if create_roles:
+            await _ensure_roles(conn, schema)
+            await conn.execute(f'ALTER SCHEMA "{schema}" OWNER TO "{schema}"')
+            await conn.execute(f'GRANT USAGE ON SCHEMA "{schema}" TO "{schema}_access"')
+
+async def wrds_process_to_pg_async(table_name, schema, conn, p, copy_encoding="UTF8",
+                                   chunk_size=1 << 20, progress=None) -> int:
+    """
+    Async version of `wrds_process_to_pg()`: COPY CSV from the `AsyncTextStream` `p`.
+
+    The COPY runs on the open `conn` in its current transaction, which the
+    caller commits or rolls back. Returns the number of rows copied.
+    """
+    progress = as_progress(progress)
+
+    header = await p.readline()
+    if not header:
+        raise ValueError("No data received from WRDS/SAS process (empty stream).")
+
+    var_names = header.rstrip("\n\r").lower().split(",")
+    var_str = '("' + '", "'.join(var_names) + '")'
+
+    copy_cmd = f'COPY "{schema}"."{table_name}" {var_str} FROM STDIN CSV ENCODING \'{copy_encoding}\''
+
+    async with conn.cursor() as curs:
+        async with curs.copy(copy_cmd) as copy:
+            while True:
+                t0 = time.perf_counter()
+                data = await p.read(chunk_size)
+                t1 = time.perf_counter()
+                if not data:
+                    break
+                await copy.write(data)
+                progress.add("copy_write", bytes=len(data),
+                             busy=time.perf_counter() - t1, wait=t1 - t0)
+            flush_start = time.perf_counter()
+        rows = max(curs.rowcount, 0)
+        progress.add("copy_write", rows=rows, busy=time.perf_counter() - flush_start)
+    return rows
+
+async def wrds_to_pg_async(
+    table_name,
+    schema,
+    engine,
+    wrds_id=None,
+    *,
+    fpath=None,
+    fix_missing=False,
+    fix_cr=False,
+    drop=None,
+    obs=None,
+    rename=None,
+    keep=None,
+    where=None,
+    alt_table_name=None,
+    encoding="utf-8",
+    col_types=None,
+    create_roles=True,
+    sas_schema=None,
+    sas_encoding=None,
+    tz="UTC",
+    progress=None,
+    modified=None,
+):
+    """
+    Async version of `wrds_to_pg()` for asyncio programs.
+
+    SAS output is read without blocking the event loop (see
+    `SASTransport.open_async()`) and copied with psycopg's
+    `AsyncConnection`, so many transfers can run in one loop. The load is
+    a single transaction: the data are copied into a staging table, which
+    then replaces `schema.alt_table_name`, with `modified` (if given) as
+    its comment and the grants of `wrds_update()`. If the task is
+    cancelled or anything fails, the SAS job is stopped, the transaction
+    is rolled back and the existing table is left as it was.
+
+    Parameters are as for `wrds_to_pg()`; `source="sas"` only, without
+    spooling or checkpoints. `engine` (a SQLAlchemy engine) only supplies
+    the connection parameters.
+
+    Returns
+    -------
+    int
+        Number of rows loaded.
+    """
+    if wrds_id is None and fpath is None:
+        wrds_id = os.environ.get("WRDS_ID")
+    if (wrds_id is None) == (fpath is None):
+        raise ValueError(
+            "Exactly one of `wrds_id` (WRDS mode) or `fpath` (local SAS mode) must be provided."
+        )
+    if alt_table_name is None:
+        alt_table_name = table_name
+    if sas_schema is None:
+        sas_schema = schema if wrds_id is not None else "work"
+    encoding = encoding or "utf-8"
+
+    progress = as_progress(progress, table=f"{schema}.{alt_table_name}")
+
+    with progress.timed("sas_metadata"):
+        meta = await get_table_metadata_async(
+            table_name=table_name,
+            wrds_id=wrds_id,
+            fpath=fpath,
+            drop=drop,
+            keep=keep,
+            rename=rename,
+            sas_schema=sas_schema,
+            encoding=encoding,
+            col_types=col_types,
+        )
+
+    print(f"Beginning file import at {get_now()} UTC.")
+    print(f"Importing data into {schema}.{alt_table_name}.")
+
+    staging = f"{alt_table_name}__wrds2pg_load"[:63]
+    async with await connect_async(engine) as conn:
+        await ensure_schema_async(conn, schema, create_roles=create_roles)
+        async with conn.transaction():
+            await conn.execute("SET DateStyle TO 'ISO, MDY'")
+            await conn.execute(f"SET TimeZone TO '{tz}'")
+            await conn.execute(f'DROP TABLE IF EXISTS "{schema}"."{staging}"')
+            await conn.execute(create_table_sql(schema, staging, meta["names"],
+                                                meta["col_types"]))
+            async with get_wrds_process_stream_async(
+                table_name=table_name,
+                schema=sas_schema,
+                wrds_id=wrds_id,
+                fpath=fpath,
+                drop=drop,
+                keep=keep,
+                fix_cr=fix_cr,
+                fix_missing=fix_missing,
+                obs=obs,
+                rename=rename,
+                where=where,
+                sas_encoding=sas_encoding,
+                stream_encoding=encoding,
+                meta=meta,
+                progress=progress,
+            ) as stream:
+                rows = await wrds_process_to_pg_async(staging, schema, conn, stream,
+                                                      progress=progress)
+
+            await conn.execute(f'DROP TABLE IF EXISTS "{schema}"."{alt_table_name}" CASCADE')
+            await conn.execute(
+                f'ALTER TABLE "{schema}"."{staging}" RENAME TO "{alt_table_name}"')
+            if modified is not None:
+                comment = modified.replace("'", "''")
+                await conn.execute(
+                    f'COMMENT ON TABLE "{schema}"."{alt_table_name}" IS \'{comment}\'')
+            if create_roles:
+                await _ensure_roles(conn, schema)
+                await conn.execute(
+                    f'ALTER TABLE "{schema}"."{alt_table_name}" OWNER TO "{schema}"')
+                await conn.execute(
+                    f'GRANT SELECT ON "{schema}"."{alt_table_name}" TO "{schema}_access"')
+
+    print(f"Completed file import at {get_now()} UTC.\n")
+    return rows
@@ -0,0 +1,355 @@
+from __future__ import annotations
+
+import os
+import re
+import time
+import uuid
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from psycopg import pq as libpq
+
+from ..files.paths import get_pq_file
+from ..progress import as_progress
+from .source import _source_query, get_pg_modified, get_pg_table_metadata
+
+_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+_TRAILER = b"\xff\xff"
+
+# PostgreSQL epoch (2000-01-01) relative to the Unix epoch
+_PG_EPOCH_DAYS = 10_957
+_PG_EPOCH_US = _PG_EPOCH_DAYS * 86_400 * 1_000_000
+
+# Types decoded from their binary representation:
+# base type -> (big-endian numpy type, Arrow type)
+_FIXED = {
+    "boolean": ("u1", pa.bool_()),
+    "smallint": (">i2", pa.int16()),
+    "integer": (">i4", pa.int32()),
+    "bigint": (">i8", pa.int64()),
+    "real": (">f4", pa.float32()),
+    "double precision": (">f8", pa.float64()),
+    "date": (">i4", pa.date32()),
+    "time without time zone": (">i8", pa.time64("us")),
+    "timestamp without time zone": (">i8", pa.timestamp("us")),
+    "timestamp with time zone": (">i8", pa.timestamp("us", tz="UTC")),
+}
+_VARIABLE = {
+    "text": pa.string(),
+    "character varying": pa.string(),
+    "character": pa.string(),
+    "name": pa.string(),
+    "bytea": pa.binary(),
+}
+
+def _base_type(pg_type):
+    return re.sub(r"\(.*\)", "", pg_type).strip().lower()
+
+def pg_arrow_type(pg_type):
+    """Return the Arrow type used for a PostgreSQL type."""
+    base = _base_type(pg_type)
+    if base == "numeric":
+        m = re.match(r"numeric\((\d+),(\d+)\)", pg_type.replace(" ", "").lower())
+        if m and int(m.group(1)) <= 38:
+            return pa.decimal128(int(m.group(1)), int(m.group(2)))
+        return pa.float64()
+    if base in _FIXED:
+        return _FIXED[base][1]
+    return _VARIABLE.get(base, pa.string())
+
+def _column_plan(meta, columns=None):
+    """
+    Return `(exprs, names, fields, wire)` for the columns to export.
+
+    `wire` gives the type each column is sent as: a key of `_FIXED` or
+    `_VARIABLE`. Other types are sent as text (numeric as float8 or text
+    converted to decimal, others as their text representation).
+    """
+    names = meta["names"]
+    if columns is not None:
+        wanted = [c.lower() for c in columns]
+        missing = sorted(set(wanted) - set(names))
+        if missing:
+            raise ValueError(f"Unknown column(s): {', '.join(missing)}.")
+        names = wanted
+
+    exprs, fields, wire = [], [], []
+    expr_of = dict(zip(meta["names"], meta["exprs"]))
+    for name in names:
+        pg_type = meta["col_types"][name]
+        base, expr = _base_type(pg_type), expr_of[name]
+        arrow_type = pg_arrow_type(pg_type)
+        if base in _FIXED or base in _VARIABLE:
+            sent = base
+        elif arrow_type == pa.float64():
+            expr, sent = f"({expr})::float8", "double precision"
+        else:
+            expr, sent = f"({expr})::text", "text"
+        exprs.append(expr)
+        fields.append(pa.field(name, arrow_type))
+        wire.append(sent)
+    return exprs, names, fields, wire
+
+def _read_be(buf, pos, dtype):
+    """Read one big-endian value of `dtype` at each offset in `pos`."""
+    width = np.dtype(dtype).itemsize
+    pos = np.minimum(pos, len(buf) - width)  # positions of NULLs are not used
+    raw = buf[pos[:, None] + np.arange(width)]
+    return raw.reshape(-1).view(dtype)
+
+def _validity(valid):
+    if valid.all():
+        return None
+    return pa.py_buffer(np.packbits(valid, bitorder="little"))
+
+def _fixed_array(buf, pos, valid, wire, arrow_type):
+    dtype = _FIXED[wire][0]
+    values = _read_be(buf, pos, dtype)
+    if wire == "boolean":
+        return pa.array(values != 0, type=pa.bool_(), mask=~valid)
+    values = values.astype(np.dtype(dtype).newbyteorder("="))
+    if wire in ("date", "timestamp without time zone", "timestamp with time zone"):
+        # +/-infinity are stored as the extreme values; read them as NULL
+        info = np.iinfo(values.dtype)
+        valid = valid & (values != info.max) & (values != info.min)
+        values = values + (_PG_EPOCH_DAYS if wire == "date" else _PG_EPOCH_US)
+        values[~valid] = 0
+    storage = pa.array(values, mask=~valid)
+    return storage if storage.type == arrow_type else storage.cast(arrow_type)
+
+def _variable_array(buf, pos, lens, valid, wire):
+    sizes = np.where(valid, lens, 0)
+    offsets = np.zeros(len(pos) + 1, dtype=np.int64)
+    np.cumsum(sizes, out=offsets[1:])
+    index = np.repeat(pos - offsets[:-1], sizes) + np.arange(offsets[-1])
+    arrow_type = _VARIABLE[wire]
+    if offsets[-1] >= 2**31:
+        arrow_type = pa.large_binary() if arrow_type == pa.binary() else pa.large_string()
+    else:
+        offsets = offsets.astype(np.int32)
+    return pa.Array.from_buffers(
+        arrow_type, len(pos),
+        [_validity(valid), pa.py_buffer(offsets), pa.py_buffer(buf[index])],
+    )
+
+def decode_copy_binary(data, starts, fields, wire):
+    """
+    Decode rows of `COPY ... (FORMAT binary)` output into a record batch.
+
+    `data` holds whole rows (no header or trailer) and `starts` the offset
+    of each row. Each column is decoded for all rows at once with NumPy:
+    the field lengths at the current offsets give the values and the
+    offsets of the next column.
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    starts = np.asarray(starts, dtype=np.int64)
+    n = len(starts)
+    if n and (_read_be(buf, starts, ">i2") != len(fields)).any():
+        raise RuntimeError("Unexpected field count in binary COPY data.")
+
+    pos = starts + 2
+    arrays = []
+    for field, sent in zip(fields, wire):
+        lens = _read_be(buf, pos, ">i4").astype(np.int64)
+        valid = lens >= 0
+        pos = pos + 4
+        if sent in _FIXED:
+            array = _fixed_array(buf, pos, valid, sent, field.type)
+        else:
+            array = _variable_array(buf, pos, lens, valid, sent)
+            if pa.types.is_decimal(field.type):
+                # numeric(p,s) allows NaN, which decimal128 cannot hold
+                array = pc.if_else(pc.equal(array, "NaN"), None, array)
+            if array.type != field.type:
+                array = pc.cast(array, field.type)
+        arrays.append(array)
+        pos = pos + np.where(valid, lens, 0)
+
+    ends = np.append(starts[1:], len(buf))
+    if not np.array_equal(pos, ends):
+        raise RuntimeError("Binary COPY data did not decode to whole rows.")
+    return pa.RecordBatch.from_arrays(arrays, schema=pa.schema(fields))
+
+def _skip_header(data):
+    if not data.startswith(_SIGNATURE):
+        raise RuntimeError("Binary COPY data has no header.")
+    ext_len = int.from_bytes(data[15:19], "big")
+    return data[19 + ext_len:]
+
+def iter_pg_arrow(table_name, schema, engine, columns=None, where=None, obs=None,
+                  meta=None, batch_bytes=64 << 20, progress=None):
+    """
+    Yield a PostgreSQL table as Arrow record batches.
+
+    Rows are read with `COPY (SELECT ...) TO STDOUT (FORMAT binary)` and
+    decoded column by column with NumPy (`decode_copy_binary()`), without
+    creating a Python object per value. Integer, floating-point, boolean,
+    date, time, timestamp, text and bytea columns are decoded from their
+    binary form; `numeric(p,s)` becomes `decimal128(p,s)`, with `NaN` as
+    null (other numeric columns float64), and other types are read as
+    text.
+
+    Parameters
+    ----------
+    columns : list[str], optional
+        Columns to read. Default is all.
+    where : str, optional
+        SQL condition, applied on the server.
+    obs : int, optional
+        Maximum number of rows.
+    meta : dict, optional
+        Result of `get_pg_table_metadata()`, e.g., to select or rename
+        columns with SAS-style `keep`, `drop` and `rename`.
+    batch_bytes : int
+        Approximate size of the binary data decoded per batch.
+    progress : Progress, optional
+        Receives the `pg_read` and `decode` stages.
+    """
+    progress = as_progress(progress)
+    if meta is None:
+        meta = get_pg_table_metadata(table_name, schema, engine)
+    exprs, names, fields, wire = _column_plan(meta, columns)
+    query = _source_query(table_name, schema, exprs, names, where, obs)
+
+    def decode(data, starts):
+        t0 = time.perf_counter()
+        if starts and len(data) - starts[-1] == 2 and data[-2:] == _TRAILER:
+            starts.pop()
+            del data[-2:]
+        if not starts:
+            return None
+        batch = decode_copy_binary(data, starts, fields, wire)
+        progress.add("decode", rows=batch.num_rows, busy=time.perf_counter() - t0)
+        return batch
+
+    with engine.connect() as conn:
+        raw = conn.connection.dbapi_connection
+        # libpq-level COPY: psycopg's `Copy` costs more per row than decoding
+        pgconn = raw.pgconn
+        pgconn.send_query(f"COPY ({query}) TO STDOUT (FORMAT binary)".encode("utf-8"))
+        done = False
+        try:
+            result = pgconn.get_result()
+            if result.status != libpq.ExecStatus.COPY_OUT:
+                message = result.error_message.decode("utf-8", "replace").strip()
+                done = True
+                raise RuntimeError(f"COPY from {schema}.{table_name} failed: {message}")
+
+            get_copy_data = pgconn.get_copy_data
+            t0 = time.perf_counter()
+            nbytes, row = get_copy_data(0)
+            # rows are appended to one buffer: keeping an object per row
+            # would make the garbage collector dominate the run time
+            data = bytearray(_skip_header(bytes(row)) if nbytes > 0 else b"")
+            starts = [0] if data else []
+            # the server sends one row per message
+            while nbytes > 0:
+                nbytes, row = get_copy_data(0)
+                if nbytes < 0:
+                    break
+                starts.append(len(data))
+                data += row
+                if len(data) >= batch_bytes:
+                    progress.add("pg_read", bytes=len(data), busy=time.perf_counter() - t0)
+                    batch = decode(data, starts)
+                    if batch is not None:
+                        yield batch
+                    data, starts = bytearray(), []
+                    t0 = time.perf_counter()
+            progress.add("pg_read", bytes=len(data), busy=time.perf_counter() - t0)
+            done = True
+            batch = decode(data, starts)
+            if batch is not None:
+                yield batch
+        finally:
+            if not done:
+                # stopped early: cancel the COPY and discard what is in flight
+                raw.cancel_safe()
+                try:
+                    while get_copy_data(0)[0] >= 0:
+                        pass
+                except Exception:
+                    pass
+            while pgconn.get_result() is not None:
+                pass
+
+def pg_to_arrow(table_name, schema, engine, columns=None, where=None, obs=None,
+                meta=None, progress=None) -> pa.Table:
+    """
+    Read a PostgreSQL table into an Arrow table.
+
+    Arguments are those of `iter_pg_arrow()`. This is much faster and
+    uses much less memory than `pd.read_sql()`; use `.to_pandas()` on the
+    result for a DataFrame.
+
+    Examples
+    ----------
+    >>> dsf = pg_to_arrow("dsf", "crsp", make_engine(), columns=["permno", "date", "ret"],
+    ...                   where="date >= '2020-01-01'")
+    """
+    meta = meta or get_pg_table_metadata(table_name, schema, engine)
+    fields = _column_plan(meta, columns)[2]
+    batches = list(iter_pg_arrow(table_name, schema, engine, columns=columns, where=where,
+                                 obs=obs, meta=meta, progress=progress))
+    return pa.Table.from_batches(batches, schema=pa.schema(fields))
+
+def pg_to_pq(table_name, schema, engine, pq_file=None, data_dir=None, columns=None,
+             where=None, obs=None, meta=None, modified=None,
+             row_group_size=1_048_576, progress=None):
+    """
+    Write a PostgreSQL table to Parquet without going through CSV.
+
+    Batches from `iter_pg_arrow()` are written as they are decoded into a
+    temporary file that replaces `pq_file` when complete. The table's
+    comment (its WRDS last-modified stamp, as set by `wrds_update()`) is
+    stored as the Parquet `last_modified` metadata, so a Parquet mirror
+    made from the local database is seen as current by `wrds_update_pq()`.
+
+    Parameters
+    ----------
+    pq_file : str or Path, optional
+        Default is `{data_dir}/{schema}/{table_name}.parquet` (see
+        `get_pq_file()`).
+    data_dir : str, optional
+        Default is the environment value `DATA_DIR`.
+    modified : str, optional
+        Stamp to store. Default is the table's comment.
+
+    Other arguments are those of `iter_pg_arrow()`; `progress` also
+    receives the `parquet_write` stage.
+
+    Examples
+    ----------
+    >>> engine = make_engine()
+    >>> for table in ["msf", "msi", "stocknames"]:
+    ...     pg_to_pq(table, "crsp", engine, data_dir="~/pq_data")
+    """
+    progress = as_progress(progress)
+    if pq_file is None:
+        pq_file = get_pq_file(table_name, schema, data_dir)
+    if modified is None:
+        modified = get_pg_modified(table_name, schema, engine)
+    if meta is None:
+        meta = get_pg_table_metadata(table_name, schema, engine)
+    fields = _column_plan(meta, columns)[2]
+    schema_pa = pa.schema(fields, metadata={b"last_modified": modified.encode("utf-8")})
+
+    pq_file = os.fspath(pq_file)
+    tmp = os.path.join(os.path.dirname(pq_file) or ".",
+                       f".{os.path.basename(pq_file)}.{uuid.uuid4().hex}.tmp")
+    try:
+        with pq.ParquetWriter(tmp, schema=schema_pa) as writer:
+            for batch in iter_pg_arrow(table_name, schema, engine, columns=columns,
+                                       where=where, obs=obs, meta=meta, progress=progress):
+                t0 = time.perf_counter()
+                writer.write_batch(batch.replace_schema_metadata(schema_pa.metadata),
+                                   row_group_size=row_group_size)
+                progress.add("parquet_write", bytes=batch.nbytes, rows=batch.num_rows,
+                             busy=time.perf_counter() - t0)
+        os.replace(tmp, pq_file)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+    return True
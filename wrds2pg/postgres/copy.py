@@ -1,15 +1,34 @@
 from __future__ import annotations
 
 import os
+import re
+import time
 
-from sqlalchemy import inspect
+import psycopg
+import sqlalchemy.exc
 
 from .._utils import get_now
-from ..sas.stream import get_wrds_process_stream
-from ..sas.metadata import get_table_metadata
-from .ddl import process_sql, role_exists, create_role, create_table_sql
-
-def wrds_process_to_pg(table_name, schema, engine, p, tz="UTC", copy_encoding="UTF8", chunk_size=1 << 20):
+from ..progress import as_progress
+from ..sas.stream import get_wrds_process_stream, TRANSIENT_ERRORS
+from ..sas.metadata import get_modified_str, get_table_metadata
+from ..sas.normalize import count_records, record_end
+from ..spool import get_extract_spool
+from .ddl import (
+    process_sql, create_table_sql, ensure_schema, get_table_comment,
+)
+from .engine import make_wrds_engine
+from .source import get_pg_table_metadata, pg_to_pg
+
+_CHECKPOINT_PREFIX = "wrds2pg rows loaded: "
+
+# Lost SSH or database connections; a checkpointed load resumes after these.
+_RESUMABLE_ERRORS = TRANSIENT_ERRORS + (
+    psycopg.OperationalError,
+    sqlalchemy.exc.OperationalError,
+)
+
+def wrds_process_to_pg(table_name, schema, engine, p, tz="UTC", copy_encoding="UTF8", chunk_size=1 << 20,
+                       progress=None):
     """
     Stream CSV text from file-like object `p` into Postgres using COPY FROM STDIN.
 
@@ -23,7 +42,10 @@ def wrds_process_to_pg(table_name, schema, engine, p, tz="UTC", copy_encoding="U
         Encoding declared in the COPY command (usually 'UTF8').
     chunk_size:
         How many characters to read per chunk while streaming to Postgres.
+    progress:
+        Optional `Progress` (or callback) receiving the `copy_write` stage.
     """
+    progress = as_progress(progress)
 
     # The first line has the variable names ...
     header = p.readline()
@@ -44,16 +66,177 @@ def wrds_process_to_pg(table_name, schema, engine, p, tz="UTC", copy_encoding="U
 
                 with curs.copy(copy_cmd) as copy:
                     while True:
+                        t0 = time.perf_counter()
                         data = p.read(chunk_size)
+                        t1 = time.perf_counter()
                         if not data:
                             break
                         copy.write(data)
+                        progress.add("copy_write", bytes=len(data),
+                                     busy=time.perf_counter() - t1, wait=t1 - t0)
+                    flush_start = time.perf_counter()
+                progress.add("copy_write", rows=max(curs.rowcount, 0),
+                             busy=time.perf_counter() - flush_start)
         finally:
             connection_fairy.commit()
             conn.close()
 
     return True
 
+def get_checkpoint(table_name, schema, engine):
+    """Return the number of rows committed to a checkpointed staging table."""
+    comment = get_table_comment(table_name, schema, engine)
+    m = re.match(re.escape(_CHECKPOINT_PREFIX) + r"(\d+)$", comment)
+    return int(m.group(1)) if m else 0
+
+def wrds_process_to_pg_checkpointed(
+    table_name, schema, engine, p,
+    start_row=0,
+    checkpoint_rows=1_000_000,
+    tz="UTC",
+    copy_encoding="UTF8",
+    chunk_size=1 << 20,
+    progress=None,
+):
+    """
+    Stream CSV text from `p` into Postgres, committing every `checkpoint_rows` rows.
+
+    Each batch is a separate COPY and transaction. The running total of rows
+    (starting from `start_row`) is stored in the table comment in the same
+    transaction, so `get_checkpoint()` always matches the committed data.
+    Batches are cut at record boundaries, so a batch may run slightly over
+    `checkpoint_rows`.
+
+    Returns
+    -------
+    Total rows committed, including `start_row`.
+    """
+    progress = as_progress(progress)
+
+    header = p.readline()
+    if not header:
+        raise ValueError("No data received from WRDS/SAS process (empty stream).")
+
+    var_names = header.rstrip("\n\r").lower().split(",")
+    var_str = '("' + '", "'.join(var_names) + '")'
+
+    copy_cmd = f'COPY "{schema}"."{table_name}" {var_str} FROM STDIN CSV ENCODING \'{copy_encoding}\''
+    comment_cmd = f'COMMENT ON TABLE "{schema}"."{table_name}" IS \'{_CHECKPOINT_PREFIX}%d\''
+
+    loaded = start_row
+    carry = ""
+    done = False
+
+    with engine.connect() as conn:
+        connection_fairy = conn.connection
+        with connection_fairy.cursor() as curs:
+            curs.execute("SET DateStyle TO 'ISO, MDY'")
+            curs.execute(f"SET TimeZone TO '{tz}'")
+            connection_fairy.commit()
+
+            while not done:
+                batch_rows = 0
+                with curs.copy(copy_cmd) as copy:
+                    while batch_rows < checkpoint_rows:
+                        t0 = time.perf_counter()
+                        data = p.read(chunk_size)
+                        t1 = time.perf_counter()
+                        progress.add("copy_write", bytes=len(data), wait=t1 - t0)
+                        if not data:
+                            done = True
+                            if carry:
+                                # last record may lack a trailing newline
+                                copy.write(carry)
+                                batch_rows += count_records(carry + "\n")
+                                carry = ""
+                            break
+                        text = carry + data
+                        cut = record_end(text)
+                        text, carry = text[:cut], text[cut:]
+                        if text:
+                            copy.write(text)
+                            batch_rows += count_records(text)
+                        progress.add("copy_write", busy=time.perf_counter() - t1)
+                    flush_start = time.perf_counter()
+
+                curs.execute(comment_cmd % (loaded + batch_rows))
+                connection_fairy.commit()
+                loaded += batch_rows
+                progress.add("copy_write", rows=batch_rows,
+                             busy=time.perf_counter() - flush_start)
+
+    return loaded
+
+def _wrds_to_pg_checkpointed(
+    table_name, schema, engine, alt_table_name, meta, stream_kwargs,
+    obs, tz, checkpoint_rows, max_retries, retry_wait, progress,
+):
+    """Load into a staging table with checkpoints and retries, then promote it."""
+    staging = f"{alt_table_name}__wrds2pg_staging"[:63]
+
+    process_sql(f'DROP TABLE IF EXISTS "{schema}"."{staging}"', engine)
+    process_sql(create_table_sql(schema, staging, meta["names"], meta["col_types"]), engine)
+
+    attempt = 0
+    while True:
+        loaded = get_checkpoint(staging, schema, engine)
+        if obs and loaded >= obs:
+            break
+        try:
+            with get_wrds_process_stream(
+                firstobs=loaded + 1 if loaded else None,
+                **stream_kwargs,
+            ) as stream:
+                wrds_process_to_pg_checkpointed(
+                    staging, schema, engine, stream,
+                    start_row=loaded,
+                    checkpoint_rows=checkpoint_rows,
+                    tz=tz,
+                    progress=progress,
+                )
+            break
+        except _RESUMABLE_ERRORS as e:
+            attempt += 1
+            if attempt > max_retries:
+                raise
+            progress.count("retries")
+            loaded = get_checkpoint(staging, schema, engine)
+            print(f"Transfer interrupted at {get_now()} UTC ({e!r}).")
+            print(f"Resuming {schema}.{alt_table_name} after row {loaded} "
+                  f"(retry {attempt} of {max_retries}).")
+            time.sleep(retry_wait)
+
+    # --- promote the completed staging table (one transaction) ---
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f'DROP TABLE IF EXISTS "{schema}"."{alt_table_name}" CASCADE')
+        conn.exec_driver_sql(f'ALTER TABLE "{schema}"."{staging}" RENAME TO "{alt_table_name}"')
+        conn.exec_driver_sql(f'COMMENT ON TABLE "{schema}"."{alt_table_name}" IS NULL')
+    return True
+
+def _grant_table(schema, table_name, engine, create_roles):
+    # --- grants on the table (optional, but consistent with your earlier behavior) ---
+    if create_roles:
+        access_role = f"{schema}_access"
+        process_sql(f'ALTER TABLE "{schema}"."{table_name}" OWNER TO "{schema}"', engine)
+        process_sql(f'GRANT SELECT ON "{schema}"."{table_name}" TO "{access_role}"', engine)
+
+def _pg_source_to_pg(table_name, schema, engine, alt_table_name, src_schema, pg_source,
+                     drop, keep, rename, where, obs, col_types, progress):
+    """Replace a table with a binary copy of a table on another PostgreSQL server."""
+    with progress.timed("pg_metadata"):
+        meta = get_pg_table_metadata(table_name, src_schema, pg_source, drop=drop,
+                                     keep=keep, rename=rename, col_types=col_types)
+
+    print(f"Beginning file import at {get_now()} UTC.")
+    print(f"Importing data into {schema}.{alt_table_name}.")
+
+    process_sql(f'DROP TABLE IF EXISTS "{schema}"."{alt_table_name}" CASCADE', engine)
+    process_sql(create_table_sql(schema, alt_table_name, meta["names"], meta["col_types"]),
+                engine)
+    return pg_to_pg(table_name, schema, pg_source, engine, meta,
+                    alt_table_name=alt_table_name, src_schema=src_schema,
+                    where=where, obs=obs, progress=progress)
+
 def wrds_to_pg(
     table_name,
     schema,
@@ -75,6 +258,15 @@ def wrds_to_pg(
     sas_schema=None,
     sas_encoding=None,
     tz="UTC",
+    source="sas",
+    fix_local=False,
+    checkpoint_rows=None,
+    max_retries=5,
+    retry_wait=30,
+    progress=None,
+    spool=None,
+    modified=None,
+    pg_source=None,
 ):
     """
     Stream a WRDS or local SAS table directly into PostgreSQL.
@@ -141,6 +333,42 @@ def wrds_to_pg(
         Encoding of the SAS data file.
     tz : str, default "UTC"
         PostgreSQL time zone used during import.
+    source : {"sas", "sftp", "pg"}, default "sas"
+        How data are obtained in WRDS mode. "sas" runs PROC EXPORT on WRDS.
+        "sftp" downloads the raw `.sas7bdat` file and decodes it locally,
+        which avoids SAS formatting time on WRDS for very large tables
+        (`where` is not supported in this mode). "pg" copies the table
+        from a PostgreSQL server (`pg_source`) in binary format, keeping
+        its column types; `where` is then SQL.
+    fix_local : bool, default False
+        If True, `fix_cr` and `fix_missing` are applied to the CSV stream on
+        the client instead of by SAS on WRDS, which saves WRDS CPU time.
+    checkpoint_rows : int, optional
+        If set, load into a staging table in batches of about this many
+        rows, committing each batch. If the transfer fails with a connection
+        error, reconnect and resume the SAS export at the first uncommitted
+        row (via `firstobs=`), up to `max_retries` times, waiting
+        `retry_wait` seconds between attempts. The existing table is replaced
+        only once the load completes.
+    max_retries : int, default 5
+        Maximum number of resumptions when `checkpoint_rows` is set.
+    retry_wait : float, default 30
+        Seconds to wait before resuming when `checkpoint_rows` is set.
+    progress : Progress or callable, optional
+        Receives per-stage statistics (see `wrds2pg.progress.Progress`).
+        The caller is responsible for calling `progress.finish()`.
+    spool : ExtractSpool or bool, optional
+        Local store of WRDS extracts (see `wrds2pg.spool.ExtractSpool`).
+        If the same extract of the same version of the table is stored, it
+        is loaded from there instead of WRDS; otherwise the download is
+        stored. Default is a spool in `WRDS2PG_SPOOL_DIR`, if that is set.
+    modified : str, optional
+        WRDS last-modified string of the table, used as part of the spool
+        key. Looked up with `get_modified_str()` if a spool is used and
+        this is not given.
+    pg_source : sqlalchemy.Engine, optional
+        Source server for `source="pg"`. Default is `make_wrds_engine()`,
+        the WRDS PostgreSQL server. `sas_schema` is the source schema.
 
     Returns
     -------
@@ -149,7 +377,8 @@ def wrds_to_pg(
 
     Notes
     -----
-    - The target table is dropped and recreated on each run.
+    - The target table is dropped and recreated on each run (with
+      `checkpoint_rows`, it is replaced by the staging table at the end).
     - Data transfer is fully streamed; memory usage is independent of table size.
     - Table comments and modification metadata are handled by higher-level
       wrapper functions such as `wrds_update()`.
@@ -164,7 +393,10 @@ def wrds_to_pg(
     if wrds_id is None and fpath is None:
         wrds_id = os.environ.get("WRDS_ID")
 
-    if (wrds_id is None) == (fpath is None):
+    if source == "pg" and pg_source is None:
+        pg_source = make_wrds_engine(wrds_id)
+
+    if source != "pg" and (wrds_id is None) == (fpath is None):
         raise ValueError(
             "Exactly one of `wrds_id` (WRDS mode) or `fpath` (local SAS mode) must be provided."
         )
@@ -174,47 +406,40 @@ def wrds_to_pg(
 
     # SAS libref to use for the source table
     if sas_schema is None:
-        sas_schema = schema if wrds_id is not None else "work"
+        sas_schema = schema if wrds_id is not None or source == "pg" else "work"
 
     # --- ensure schema exists (and roles if desired) BEFORE creating table ---
-    insp = inspect(engine)
-    if schema not in insp.get_schema_names():
-        process_sql(f'CREATE SCHEMA "{schema}"', engine)
+    ensure_schema(schema, engine, create_roles=create_roles)
 
-        if create_roles:
-            if not role_exists(engine, schema):
-                create_role(engine, schema)
-            process_sql(f'ALTER SCHEMA "{schema}" OWNER TO "{schema}"', engine)
+    progress = as_progress(progress, table=f"{schema}.{alt_table_name}")
 
-            access_role = f"{schema}_access"
-            if not role_exists(engine, access_role):
-                create_role(engine, access_role)
-            process_sql(f'GRANT USAGE ON SCHEMA "{schema}" TO "{access_role}"', engine)
+    if source == "pg":
+        res = _pg_source_to_pg(table_name, schema, engine, alt_table_name, sas_schema,
+                               pg_source, drop, keep, rename, where, obs, col_types,
+                               progress)
+        _grant_table(schema, alt_table_name, engine, create_roles)
+        print(f"Completed file import at {get_now()} UTC.\n")
+        return res
 
-    # --- drop existing target table ---
-    process_sql(f'DROP TABLE IF EXISTS "{schema}"."{alt_table_name}" CASCADE', engine)
+    if modified is None and wrds_id is not None and get_extract_spool(spool) is not None:
+        with progress.timed("freshness"):
+            modified = get_modified_str(table_name, sas_schema, wrds_id, encoding=encoding)
 
     # --- build CREATE TABLE from SAS metadata ---
-    meta = get_table_metadata(
-        table_name=table_name,
-        wrds_id=wrds_id,
-        fpath=fpath,
-        drop=drop,
-        keep=keep,
-        rename=rename,
-        sas_schema=sas_schema,
-        encoding=encoding,
-        col_types=col_types,
-    )
-
-    create_sql = create_table_sql(schema, alt_table_name, meta["names"], meta["col_types"])
-    process_sql(create_sql, engine)
-
-    # --- import data ---
-    print(f"Beginning file import at {get_now()} UTC.")
-    print(f"Importing data into {schema}.{alt_table_name}.")
+    with progress.timed("sas_metadata"):
+        meta = get_table_metadata(
+            table_name=table_name,
+            wrds_id=wrds_id,
+            fpath=fpath,
+            drop=drop,
+            keep=keep,
+            rename=rename,
+            sas_schema=sas_schema,
+            encoding=encoding,
+            col_types=col_types,
+        )
 
-    with get_wrds_process_stream(
+    stream_kwargs = dict(
         table_name=table_name,
         schema=sas_schema,      # SAS libref for source data
         wrds_id=wrds_id,
@@ -228,20 +453,46 @@ def wrds_to_pg(
         where=where,
         sas_encoding=sas_encoding,
         stream_encoding=encoding,
-    ) as stream:
-        res = wrds_process_to_pg(
-            alt_table_name,
-            schema,
-            engine,
-            stream,
-            tz=tz,
-        )
+        source=source,
+        col_types=meta["col_types"],
+        fix_local=fix_local,
+        progress=progress,
+        spool=spool,
+        modified=modified,
+    )
 
-    # --- grants on the table (optional, but consistent with your earlier behavior) ---
-    if create_roles:
-        access_role = f"{schema}_access"
-        process_sql(f'ALTER TABLE "{schema}"."{alt_table_name}" OWNER TO "{schema}"', engine)
-        process_sql(f'GRANT SELECT ON "{schema}"."{alt_table_name}" TO "{access_role}"', engine)
+    # --- import data ---
+    print(f"Beginning file import at {get_now()} UTC.")
+    print(f"Importing data into {schema}.{alt_table_name}.")
 
+    if checkpoint_rows:
+        # existing table stays in place until the new one is complete
+        res = _wrds_to_pg_checkpointed(
+            table_name, schema, engine, alt_table_name, meta, stream_kwargs,
+            obs=obs,
+            tz=tz,
+            checkpoint_rows=checkpoint_rows,
+            max_retries=max_retries,
+            retry_wait=retry_wait,
+            progress=progress,
+        )
+    else:
+        # --- drop existing target table ---
+        process_sql(f'DROP TABLE IF EXISTS "{schema}"."{alt_table_name}" CASCADE', engine)
+
+        create_sql = create_table_sql(schema, alt_table_name, meta["names"], meta["col_types"])
+        process_sql(create_sql, engine)
+
+        with get_wrds_process_stream(**stream_kwargs) as stream:
+            res = wrds_process_to_pg(
+                alt_table_name,
+                schema,
+                engine,
+                stream,
+                tz=tz,
+                progress=progress,
+            )
+
+    _grant_table(schema, alt_table_name, engine, create_roles)
     print(f"Completed file import at {get_now()} UTC.\n")
     return res
@@ -62,3 +62,25 @@ def create_table_sql(schema: str, table_name: str, names: list[str], col_types:
 def create_role(engine: Engine, role: str) -> None:
     # role is an identifier; quote it
     process_sql(f'CREATE ROLE "{role}"', engine)
+
+
+def ensure_schema(schema: str, engine: Engine, create_roles: bool = True) -> None:
+    """
+    Create `schema` if it does not exist.
+
+    With `create_roles`, a new schema is owned by a role of the same name and
+    role `{schema}_access` is granted usage on it.
+    """
+    if schema in inspect(engine).get_schema_names():
+        return
+    process_sql(f'CREATE SCHEMA "{schema}"', engine)
+
+    if create_roles:
+        if not role_exists(engine, schema):
+            create_role(engine, schema)
+        process_sql(f'ALTER SCHEMA "{schema}" OWNER TO "{schema}"', engine)
+
+        access_role = f"{schema}_access"
+        if not role_exists(engine, access_role):
+            create_role(engine, access_role)
+        process_sql(f'GRANT USAGE ON SCHEMA "{schema}" TO "{access_role}"', engine)
@@ -38,3 +38,40 @@ def make_engine(
         )
 
     return create_engine(f"postgresql+psycopg://{host}:{port}/{dbname}")
+
+def make_wrds_engine(
+    wrds_id: str | None = None,
+    host: str | None = None,
+    dbname: str | None = None,
+    port: int | None = None,
+) -> Engine:
+    """
+    Create a SQLAlchemy Engine for the WRDS PostgreSQL server.
+
+    Parameters
+    ----------
+    wrds_id : str, optional
+        WRDS user name. Defaults to WRDS_ID.
+    host : str, optional
+        Defaults to WRDS_PGHOST or "wrds-pgdata.wharton.upenn.edu".
+    dbname : str, optional
+        Defaults to WRDS_PGDATABASE or "wrds".
+    port : int, optional
+        Defaults to WRDS_PGPORT or 9737.
+
+    Notes
+    -----
+    As with `make_engine()`, the password is not part of the URL; put it
+    in `~/.pgpass`.
+    """
+    wrds_id = wrds_id or os.environ.get("WRDS_ID")
+    host = host or os.environ.get("WRDS_PGHOST", "wrds-pgdata.wharton.upenn.edu")
+    dbname = dbname or os.environ.get("WRDS_PGDATABASE", "wrds")
+    port = port or int(os.environ.get("WRDS_PGPORT", 9737))
+
+    if not wrds_id:
+        raise ValueError("You must provide `wrds_id` or set the `WRDS_ID` environment variable.")
+
+    return create_engine(
+        f"postgresql+psycopg://{wrds_id}@{host}:{port}/{dbname}?sslmode=require"
+    )
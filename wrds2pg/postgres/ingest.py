@@ -0,0 +1,318 @@
+from __future__ import annotations
+
+import gzip
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+
+from .._utils import get_now
+from ..files.csv import get_csv_col_types, get_modified_csv
+from ..progress import as_progress
+from ..sas.normalize import record_end
+from .copy import _grant_table
+from .ddl import create_table_sql, ensure_schema, get_table_comment, process_sql
+
+def _pg_type(arrow_type) -> str:
+    """PostgreSQL type for a type inferred by Arrow's CSV reader."""
+    if pa.types.is_integer(arrow_type):
+        return "bigint"
+    if pa.types.is_floating(arrow_type):
+        return "float8"
+    if pa.types.is_date(arrow_type):
+        return "date"
+    if pa.types.is_timestamp(arrow_type):
+        return "timestamp"
+    if pa.types.is_time(arrow_type):
+        return "time"
+    if pa.types.is_boolean(arrow_type):
+        return "boolean"
+    return "text"
+
+def _read_sample(csv_file, names, sample_bytes, column_types=None):
+    with gzip.open(csv_file, "rb") as f:
+        reader = pacsv.open_csv(
+            f,
+            read_options=pacsv.ReadOptions(use_threads=False, block_size=sample_bytes,
+                                           skip_rows=1, column_names=names),
+            convert_options=pacsv.ConvertOptions(strings_can_be_null=True,
+                                                 column_types=column_types),
+        )
+        try:
+            return reader.read_next_batch()
+        except StopIteration:
+            return None
+
+def infer_csv_col_types(csv_file, names, sample_bytes=16 << 20) -> dict[str, str]:
+    """
+    Infer PostgreSQL types for the columns of a gzipped CSV file.
+
+    This is a fallback for files without stored column types (see
+    `get_csv_col_types()`). Types are those Arrow infers from the first
+    `sample_bytes` of the file: integers become `bigint` and columns with no
+    values in the sample `text`. Numeric columns with zero-padded values
+    (e.g., a `gvkey` of "001000") are kept as `text`. A column whose later
+    values do not fit its inferred type makes COPY fail; give its type in
+    `col_types` in that case.
+    """
+    batch = _read_sample(csv_file, names, sample_bytes)
+    if batch is None:
+        return {name: "text" for name in names}
+    types = {field.name: _pg_type(field.type) for field in batch.schema}
+
+    numeric = [name for name, type_ in types.items() if type_ in ("bigint", "float8")]
+    if numeric:
+        # leading zeros other than "0" or "0.x" mark codes, not numbers
+        strings = _read_sample(csv_file, names, sample_bytes,
+                               column_types={name: pa.string() for name in numeric})
+        for name in numeric:
+            padded = pc.match_substring_regex(strings.column(name), r"^[+-]?0[0-9]")
+            if pc.any(padded).as_py():
+                types[name] = "text"
+    return types
+
+def _read_header(csv_file, encoding):
+    with gzip.open(csv_file, "rb") as f:
+        header = f.readline()
+    if not header:
+        raise ValueError(f"{csv_file} is empty.")
+    return header.decode(encoding).rstrip("\n\r").lower().split(",")
+
+def _split_chunks(csv_file, q, failed, copy_jobs, chunk_size, progress):
+    """Put pieces of `csv_file` that end at record boundaries on `q`."""
+    try:
+        with gzip.open(csv_file, "rb") as f:
+            f.readline()
+            carry = b""
+            while not failed.is_set():
+                t0 = time.perf_counter()
+                data = f.read(chunk_size)
+                progress.add("gzip_read", bytes=len(data), busy=time.perf_counter() - t0)
+                if not data:
+                    if carry:
+                        q.put(carry)
+                    break
+                data = carry + data
+                cut = record_end(data)
+                carry = data[cut:]
+                if cut:
+                    q.put(data[:cut])
+    except BaseException:
+        failed.set()
+        raise
+    finally:
+        for _ in range(copy_jobs):
+            q.put(None)
+
+def _copy_chunks(copy_cmd, engine, q, failed, tz, progress):
+    """COPY pieces from `q` on one connection until a `None` arrives; return rows."""
+    done = False
+    try:
+        with engine.connect() as conn:
+            connection_fairy = conn.connection
+            with connection_fairy.cursor() as curs:
+                curs.execute("SET DateStyle TO 'ISO, MDY'")
+                curs.execute(f"SET TimeZone TO '{tz}'")
+                with curs.copy(copy_cmd) as copy:
+                    while True:
+                        t0 = time.perf_counter()
+                        data = q.get()
+                        t1 = time.perf_counter()
+                        done = data is None
+                        if done or failed.is_set():
+                            break
+                        copy.write(data)
+                        progress.add("copy_write", bytes=len(data),
+                                     busy=time.perf_counter() - t1, wait=t1 - t0)
+                    flush_start = time.perf_counter()
+                rows = max(curs.rowcount, 0)
+                progress.add("copy_write", rows=rows, busy=time.perf_counter() - flush_start)
+            connection_fairy.commit()
+        return rows
+    except BaseException:
+        failed.set()
+        raise
+    finally:
+        # keep the queue moving so the reader can always finish
+        while not done:
+            done = q.get() is None
+
+def csv_file_to_pg(csv_file, table_name, schema, engine, col_types=None, copy_jobs=4,
+                   encoding="utf-8", tz="UTC", create_roles=True, modified=None,
+                   chunk_size=8 << 20, progress=None):
+    """
+    Load one gzipped CSV file (as written by `wrds_update_csv()`) into PostgreSQL.
+
+    The file is decompressed on one thread and cut at record boundaries
+    into pieces that `copy_jobs` connections COPY concurrently into a
+    staging table. When all have committed, the staging table replaces
+    `schema.table_name` and the table comment is set to `modified`
+    (default: the file's last-modified value) in one transaction. Row
+    order is kept only with `copy_jobs=1`.
+
+    Parameters
+    ----------
+    col_types : dict, optional
+        PostgreSQL types of the columns. Other columns get the types stored
+        with the file by `wrds_update_csv()` (see `get_csv_col_types()`);
+        only if there are none are they inferred from the data (see
+        `infer_csv_col_types()`).
+
+    Returns
+    -------
+    Number of rows loaded.
+    """
+    progress = as_progress(progress, table=f"{schema}.{table_name}")
+    if modified is None:
+        modified = get_modified_csv(csv_file)
+
+    names = _read_header(csv_file, encoding)
+    stored = get_csv_col_types(csv_file) or {}
+    types = {name: stored[name] for name in names if name in stored}
+    if len(types) < len(names):
+        with progress.timed("infer_types"):
+            inferred = infer_csv_col_types(csv_file, names)
+        types = {name: types.get(name, inferred[name]) for name in names}
+    types.update({k.lower(): v for k, v in (col_types or {}).items() if k.lower() in types})
+
+    staging = f"{table_name}__wrds2pg_load"[:63]
+    ensure_schema(schema, engine, create_roles=create_roles)
+    process_sql(f'DROP TABLE IF EXISTS "{schema}"."{staging}"', engine)
+    process_sql(create_table_sql(schema, staging, names, types), engine)
+
+    var_str = '("' + '", "'.join(names) + '")'
+    copy_cmd = (f'COPY "{schema}"."{staging}" {var_str} FROM STDIN CSV '
+                f"ENCODING '{encoding.replace('-', '').upper()}'")
+    q = queue.Queue(maxsize=2 * copy_jobs)
+    failed = threading.Event()
+    try:
+        with ThreadPoolExecutor(max_workers=copy_jobs) as pool:
+            workers = [pool.submit(_copy_chunks, copy_cmd, engine, q, failed, tz, progress)
+                       for _ in range(copy_jobs)]
+            _split_chunks(csv_file, q, failed, copy_jobs, chunk_size, progress)
+            rows = sum(worker.result() for worker in workers)
+
+        comment = modified.replace("'", "''")
+        with engine.begin() as conn:
+            conn.exec_driver_sql(f'DROP TABLE IF EXISTS "{schema}"."{table_name}" CASCADE')
+            conn.exec_driver_sql(f'ALTER TABLE "{schema}"."{staging}" RENAME TO "{table_name}"')
+            conn.exec_driver_sql(f'COMMENT ON TABLE "{schema}"."{table_name}" IS \'{comment}\'')
+    except BaseException:
+        process_sql(f'DROP TABLE IF EXISTS "{schema}"."{staging}"', engine)
+        raise
+    _grant_table(schema, table_name, engine, create_roles)
+    return rows
+
+def csv_to_pg(
+    schema=None,
+    tables=None,
+    engine=None,
+    csv_dir=None,
+    jobs=2,
+    copy_jobs=4,
+    col_types=None,
+    force=False,
+    encoding="utf-8",
+    tz="UTC",
+    create_roles=True,
+    progress=None,
+):
+    """
+    Load a tree of gzipped CSV files, as kept by `wrds_update_csv()`, into PostgreSQL.
+
+    Each `{csv_dir}/{schema}/{table}.csv.gz` becomes `schema.table`, with
+    the file's last-modified value (see `get_modified_csv()`) as the table
+    comment, so a database rebuilt this way is seen as current by
+    `wrds_update()`. No connection to WRDS is needed.
+
+    `jobs` files are loaded at a time, each decompressed on its own thread
+    and split at record boundaries across `copy_jobs` COPY connections
+    (see `csv_file_to_pg()`). The engine's connection pool must allow
+    `jobs * copy_jobs` connections (SQLAlchemy's default allows 15).
+
+    Parameters
+    ----------
+    schema : str or list of str, optional
+        Schemas (subdirectories of `csv_dir`) to load. Default is all.
+    tables : list of str, optional
+        Tables to load. Default is every `.csv.gz` file in each schema.
+    engine : sqlalchemy.Engine, optional
+        Default is `make_engine()`.
+    csv_dir : str, optional
+        Default is the environment value `CSV_DIR`.
+    col_types : dict, optional
+        PostgreSQL types by column name, applied to any table with that
+        column. Other columns get the types stored with each file by
+        `wrds_update_csv()`, or, for files without them, types inferred
+        from the data (see `infer_csv_col_types()`).
+    force : bool
+        Reload tables whose comment already matches the file.
+    progress : Progress or callable, optional
+        Receives `gzip_read` and `copy_write` statistics for all tables.
+
+    Returns
+    -------
+    dict mapping "schema.table" to "updated" or "up_to_date".
+    If any table fails, the others are still loaded and `RuntimeError`
+    is raised at the end.
+
+    Examples
+    ----------
+    >>> csv_to_pg("crsp", csv_dir="~/csv_data", col_types={"permno": "integer"})
+    >>> csv_to_pg(jobs=4, copy_jobs=3)   # every schema in CSV_DIR
+    """
+    if csv_dir is None:
+        csv_dir = os.environ.get("CSV_DIR")
+    if csv_dir is None:
+        raise ValueError("You must provide `csv_dir` or set the `CSV_DIR` environment variable.")
+    if engine is None:
+        from .engine import make_engine
+
+        engine = make_engine()
+    csv_dir = Path(csv_dir).expanduser()
+    if schema is None:
+        schemas = sorted(p.name for p in csv_dir.iterdir() if p.is_dir())
+    else:
+        schemas = [schema] if isinstance(schema, str) else list(schema)
+
+    files = []
+    for s in schemas:
+        if tables is None:
+            files += [(s, p.name[:-len(".csv.gz")], p)
+                      for p in sorted((csv_dir / s).glob("*.csv.gz"))]
+        else:
+            files += [(s, t, csv_dir / s / f"{t}.csv.gz") for t in tables]
+    progress = as_progress(progress)
+
+    def load(schema, table_name, csv_file):
+        modified = get_modified_csv(csv_file)
+        if modified == get_table_comment(table_name, schema, engine) and not force:
+            print(f"{schema}.{table_name} already up to date.")
+            return "up_to_date"
+        print(f"Loading {csv_file} into {schema}.{table_name} at {get_now()} UTC.")
+        rows = csv_file_to_pg(csv_file, table_name, schema, engine, col_types=col_types,
+                              copy_jobs=copy_jobs, encoding=encoding, tz=tz,
+                              create_roles=create_roles, modified=modified,
+                              progress=progress)
+        print(f"Completed {schema}.{table_name} ({rows} rows) at {get_now()} UTC.")
+        return "updated"
+
+    results, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+        futures = {f"{s}.{t}": pool.submit(load, s, t, p) for s, t, p in files}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                errors[name] = e
+                print(f"Failed to load {name}: {e!r}")
+    if errors:
+        raise RuntimeError("Could not load " + ", ".join(
+            f"{name} ({type(e).__name__}: {e})" for name, e in errors.items()))
+    return results
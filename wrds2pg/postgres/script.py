@@ -0,0 +1,533 @@
+from __future__ import annotations
+
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from .ddl import process_sql
+
+def _scan(sql):
+    """
+    Yield `(kind, text)` tokens of a SQL script: "code", "string" (quoted
+    literals and dollar-quoted bodies), "ident" (double-quoted
+    identifiers), "comment" and ";".
+    """
+    i, n = 0, len(sql)
+    start = 0
+
+    def code():
+        return ("code", sql[start:i])
+
+    while i < n:
+        c = sql[i]
+        end = None
+        kind = None
+        if c == "-" and sql.startswith("--", i):
+            kind, end = "comment", sql.find("\n", i)
+            end = n if end < 0 else end + 1
+        elif c == "/" and sql.startswith("/*", i):
+            # block comments nest in PostgreSQL
+            kind, depth, j = "comment", 1, i + 2
+            while j < n and depth:
+                if sql.startswith("/*", j):
+                    depth, j = depth + 1, j + 2
+                elif sql.startswith("*/", j):
+                    depth, j = depth - 1, j + 2
+                else:
+                    j += 1
+            end = j
+        elif c == "'":
+            # E'...' strings allow backslash escapes
+            escapes = i > 0 and sql[i - 1] in "eE" and (i < 2 or not (sql[i - 2].isalnum() or sql[i - 2] == "_"))
+            kind, j = "string", i + 1
+            while j < n:
+                if escapes and sql[j] == "\\":
+                    j += 2
+                elif sql[j] == "'":
+                    if sql.startswith("''", j):
+                        j += 2
+                    else:
+                        break
+                else:
+                    j += 1
+            end = min(j + 1, n)
+        elif c == '"':
+            kind, j = "ident", i + 1
+            while j < n:
+                if sql.startswith('""', j):
+                    j += 2
+                elif sql[j] == '"':
+                    break
+                else:
+                    j += 1
+            end = min(j + 1, n)
+        elif c == "$":
+            m = re.match(r"\$([A-Za-z_][A-Za-z0-9_]*)?\$", sql[i:])
+            if m and not (i > 0 and (sql[i - 1].isalnum() or sql[i - 1] == "_")):
+                tag = m.group(0)
+                close = sql.find(tag, i + len(tag))
+                kind, end = "string", n if close < 0 else close + len(tag)
+        elif c == ";":
+            kind, end = ";", i + 1
+
+        if kind is None:
+            i += 1
+            continue
+        if i > start:
+            yield code()
+        yield kind, sql[i:end]
+        i = start = end
+    if i > start:
+        yield code()
+
+def split_sql(sql: str) -> list[str]:
+    """
+    Split a SQL script into statements.
+
+    Semicolons inside string literals (including `E'...'`), quoted
+    identifiers, comments and dollar-quoted bodies (`$$ ... $$`,
+    `$fn$ ... $fn$`) do not end a statement. Comment-only fragments are
+    dropped; comments inside a statement are kept.
+    """
+    statements, parts = [], []
+    for kind, token in [*_scan(sql), (";", ";")]:
+        if kind == ";":
+            statement = "".join(parts).strip()
+            if any(k != "comment" and t.strip() for k, t in _scan(statement)):
+                statements.append(statement)
+            parts = []
+        else:
+            parts.append(token)
+    return statements
+
+_IDENT = r'(?:"(?:[^"]|"")+"|[A-Za-z_][A-Za-z0-9_$]*)'
+_NAME = rf"{_IDENT}(?:\s*\.\s*{_IDENT}){{0,2}}"
+
+# Keywords that cannot be an alias after a table name in FROM
+_CLAUSE_WORDS = {
+    "where", "group", "order", "limit", "offset", "having", "window", "union",
+    "intersect", "except", "join", "inner", "left", "right", "full", "cross",
+    "natural", "on", "using", "returning", "for", "fetch", "into", "values",
+    "set", "with", "lateral", "tablesample", "as", "only", "select", "from",
+}
+
+# Leading keywords of statements whose effects `_objects()` understands
+_KNOWN = re.compile(
+    r"(create\s+(or\s+replace\s+)?((global|local)\s+)?((temp|temporary|unlogged)\s+)?"
+    r"(table|view|materialized\s+view|recursive\s+view)"
+    r"|create\s+(unique\s+)?index"
+    r"|alter\s+(table|index|view|materialized\s+view)"
+    r"|drop\s+(table|view|materialized\s+view|index)"
+    r"|insert|update|delete|truncate|select|with|values|comment\s+on"
+    r"|analyze|analyse|vacuum|refresh\s+materialized\s+view|cluster"
+    r"|(grant|revoke)\s+(?!.*\ball\s+(tables|sequences|functions)\s+in\s+schema\b))\b",
+    re.IGNORECASE | re.DOTALL,
+)
+
+# Built-in functions that only compute values; a SELECT calling anything else
+# (e.g., `setval()` or an extension's `create_hypertable()`) may have side
+# effects and runs as a barrier.
+_READ_ONLY_CALLS = frozenset("""
+    abs age array_agg array_length array_to_string avg bool_and bool_or btrim
+    cardinality cast ceil ceiling char_length coalesce concat concat_ws corr
+    count covar_pop covar_samp cume_dist date_part date_trunc dense_rank every
+    exp extract first_value floor format generate_series greatest initcap
+    jsonb_agg jsonb_build_object json_agg json_build_object lag last_value
+    lead least left length ln log lower lpad ltrim make_date max md5 min mod
+    mode nth_value ntile nullif overlay percent_rank percentile_cont
+    percentile_disc position power rank regexp_match regexp_matches
+    regexp_replace regr_intercept regr_r2 regr_slope repeat replace reverse
+    right round row_number rpad rtrim sign split_part sqrt stddev stddev_pop
+    stddev_samp string_agg strpos substr substring sum to_char to_date
+    to_number to_timestamp translate trim trunc unnest upper var_pop var_samp
+    variance
+""".split())
+
+# Keywords that may be followed by a parenthesis without being a call
+_SYNTAX_WORDS = _CLAUSE_WORDS | {
+    "in", "exists", "any", "all", "some", "over", "filter", "group", "row",
+    "array", "and", "or", "not", "when", "then", "else", "case", "is", "like",
+    "ilike", "between", "distinct", "by", "rows", "range", "groups", "cube",
+    "rollup", "grouping", "sets", "recursive", "materialized", "table",
+}
+
+def _normalize(name):
+    parts = re.findall(_IDENT, name)
+    return ".".join(p[1:-1].replace('""', '"') if p.startswith('"') else p.lower()
+                    for p in parts)
+
+def _code_only(sql):
+    """`sql` with comments removed and literals blanked, for pattern matching."""
+    out = []
+    for kind, token in _scan(sql):
+        if kind == "comment":
+            out.append(" ")
+        elif kind == "string":
+            out.append("''")
+        else:
+            out.append(token)
+    return "".join(out)
+
+def _names_after(pattern, code):
+    """Names matched by the final group of `pattern` (`_NAME` is appended)."""
+    return [_normalize(m.group("name"))
+            for m in re.finditer(pattern + rf"(?P<name>{_NAME})", code,
+                                 re.IGNORECASE | re.DOTALL)]
+
+def _from_names(code):
+    """Tables read in FROM, JOIN and USING lists (not function calls)."""
+    names = []
+    for m in re.finditer(r"\b(from|join|using)\s+", code, re.IGNORECASE):
+        pos, first = m.end(), True
+        while True:
+            item = re.compile(rf"(only\s+)?(?P<name>{_NAME})\s*", re.IGNORECASE).match(code, pos)
+            if not item or item.group("name").lower() in _CLAUSE_WORDS:
+                break
+            pos = item.end()
+            if code.startswith("(", pos):
+                break  # function call or USING (columns)
+            names.append(_normalize(item.group("name")))
+            if m.group(1).lower() != "from" and first:
+                break
+            first = False
+            # skip an alias, then continue only at a comma
+            alias = re.compile(rf"(as\s+)?(?P<alias>{_IDENT})\s*(\([^)]*\)\s*)?",
+                               re.IGNORECASE).match(code, pos)
+            if alias and alias.group("alias").lower() not in _CLAUSE_WORDS:
+                pos = alias.end()
+            if not code.startswith(",", pos):
+                break
+            pos = re.compile(r",\s*").match(code, pos).end()
+    return names
+
+def _top_level(code):
+    """`code` with everything inside parentheses blanked."""
+    out, depth = [], 0
+    for c in code:
+        if c == "(":
+            depth += 1
+        out.append(c if depth == 0 else " ")
+        if c == ")" and depth:
+            depth -= 1
+    return "".join(out)
+
+def _calls(code):
+    """Names of functions called in `code` (not keywords taking parentheses)."""
+    code = re.sub(rf"::\s*{_NAME}(\s*\([^()]*\))?", " ", code)  # casts: ::numeric(10, 2)
+    # column lists of CTEs: WITH t (a, b) AS (...)
+    code = re.sub(rf"({_IDENT})\s*\([^()]*\)(\s*as\s*((not\s+)?materialized\s*)?\()",
+                  r"\1\2", code, flags=re.IGNORECASE)
+    names = []
+    for m in re.finditer(rf"(?P<name>{_NAME})\s*\(", code):
+        before = re.search(r"(\w+)\s*$", code[max(m.start() - 20, 0):m.start()])
+        if before and before.group(1).lower() in ("as", "into"):
+            continue  # alias column list or INSERT INTO t (columns)
+        name = _normalize(m.group("name"))
+        if name not in _SYNTAX_WORDS:
+            names.append(name)
+    return names
+
+def _select_into(code):
+    """
+    Tables created by `SELECT ... INTO` at the top level of `code`, or None
+    if an INTO there cannot be parsed.
+    """
+    top = _top_level(code)
+    names = []
+    for m in re.finditer(r"\b(insert\s+)?into\b", top, re.IGNORECASE):
+        if m.group(1):
+            continue
+        target = re.compile(
+            rf"into\s+((temp|temporary|unlogged)\s+)?(table\s+)?(?P<name>{_NAME})",
+            re.IGNORECASE).match(top, m.start())
+        if not target or target.group("name").lower() in _CLAUSE_WORDS:
+            return None
+        names.append(_normalize(target.group("name")))
+    return names
+
+def _objects(sql):
+    """
+    Return `(reads, writes)` sets of relation names for a statement, or
+    None if its effects cannot be inferred (it then runs as a barrier).
+    """
+    code = _code_only(sql).strip()
+    if not _KNOWN.match(code):
+        return None
+
+    exists = r"(if\s+(not\s+)?exists\s+)?"
+    writes = set()
+    if re.match(r"(select|with|values)\b", code, re.IGNORECASE):
+        # a query is known only if it is read-only apart from SELECT ... INTO
+        # and data-modifying statements in WITH
+        into = _select_into(code)
+        if into is None:
+            return None
+        writes.update(into)
+        for name in _calls(code):
+            schema, _, func = name.rpartition(".")
+            if schema not in ("", "pg_catalog") or func not in _READ_ONLY_CALLS:
+                return None
+    writes.update(_names_after(
+        r"^create\s+(or\s+replace\s+)?((global|local)\s+)?((temp|temporary|unlogged)\s+)?"
+        rf"(table|view|materialized\s+view|recursive\s+view)\s+{exists}", code))
+    writes.update(_names_after(rf"^alter\s+(table|index|view|materialized\s+view)\s+{exists}(only\s+)?", code))
+    writes.update(_names_after(r"^alter\s+(table|index|view|materialized\s+view)\s.*?\brename\s+to\s+", code))
+    writes.update(_names_after(r"\binsert\s+into\s+", code))
+    writes.update(_names_after(r"(^|\bas\s*\(\s*)update\s+(only\s+)?", code))
+    writes.update(_names_after(r"\bdelete\s+from\s+(only\s+)?", code))
+    writes.update(_names_after(r"^(refresh\s+materialized\s+view\s+(concurrently\s+)?|cluster\s+(verbose\s+)?)", code))
+    writes.update(_names_after(r"^(analy[sz]e|vacuum)\s+(\([^)]*\)\s*)?((full|freeze|verbose|analy[sz]e)\s+)*", code))
+    writes.update(_names_after(
+        r"^comment\s+on\s+(table|view|materialized\s+view|index)\s+", code))
+    writes.update(name.rsplit(".", 1)[0]
+                  for name in _names_after(r"^comment\s+on\s+column\s+", code))
+    for pattern in (rf"^drop\s+(table|view|materialized\s+view|index)\s+{exists}",
+                    r"^truncate\s+(table\s+)?(only\s+)?",
+                    r"^(grant|revoke)\s.*?\bon\s+(table\s+)?"):
+        m = re.match(pattern + rf"(?P<names>{_NAME}(\s*,\s*{_NAME})*)", code,
+                     re.IGNORECASE | re.DOTALL)
+        if m:
+            writes.update(_normalize(n) for n in re.split(r"\s*,\s*", m.group("names")))
+
+    reads = set(_from_names(code))
+    # an index reads its table: indexes on one table can be built concurrently
+    reads.update(_names_after(r"^create\s+(unique\s+)?index\s.*?\bon\s+(only\s+)?", code))
+    # a named index lives in its table's schema
+    index = re.match(rf"create\s+(unique\s+)?index\s+(concurrently\s+)?{exists}"
+                     rf"(?!on\b)(?P<name>{_IDENT})\s+on\s+(only\s+)?(?P<table>{_NAME})",
+                     code, re.IGNORECASE)
+    if index:
+        table = _normalize(index.group("table"))
+        schema = table.rsplit(".", 1)[0] + "." if "." in table else ""
+        writes.add(schema + _normalize(index.group("name")))
+    reads.update(_names_after(r"\breferences\s+", code))
+    if re.match(r"create\s[^(]*?\btable\b", code, re.IGNORECASE | re.DOTALL):
+        reads.update(_names_after(r"[(,]\s*like\s+", code))
+    return reads, writes
+
+def _same(a, b):
+    """Whether two normalized names may refer to one relation (search_path)."""
+    if a == b:
+        return True
+    return ("." not in a or "." not in b) and a.rsplit(".", 1)[-1] == b.rsplit(".", 1)[-1]
+
+def _overlap(xs, ys):
+    return any(_same(x, y) for x in xs for y in ys)
+
+@dataclass
+class SQLStatement:
+    """
+    One statement of a SQL script and the statements it waits for.
+
+    `depends` holds indexes of other statements in the script. `reads` and
+    `writes` are the relations the statement was found to use; both are
+    None for a statement whose effects could not be inferred.
+    """
+
+    index: int
+    sql: str
+    name: str
+    depends: set[int] = field(default_factory=set)
+    reads: set[str] | None = None
+    writes: set[str] | None = None
+
+@dataclass
+class StatementResult:
+    """Outcome of one statement: status is "ok", "error" or "skipped"."""
+
+    index: int
+    name: str
+    sql: str
+    status: str
+    seconds: float = 0.0
+    error: str | None = None
+
+def _annotations(sql):
+    """`-- name:` and `-- depends:` comments of a statement."""
+    name, depends = None, []
+    for kind, token in _scan(sql):
+        if kind != "comment":
+            continue
+        m = re.match(r"--\s*name\s*:\s*(\S+)", token.strip(), re.IGNORECASE)
+        if m:
+            name = m.group(1)
+        m = re.match(r"--\s*depends\s*:\s*(.+)", token.strip(), re.IGNORECASE)
+        if m:
+            depends += [d for d in re.split(r"[\s,]+", m.group(1)) if d]
+    return name, depends
+
+def parse_sql_script(sql: str, infer: bool = True) -> list[SQLStatement]:
+    """
+    Split a SQL script into statements and work out which wait for which.
+
+    A statement depends on every earlier statement that writes a relation
+    it reads or writes, or that reads a relation it writes. Relations are
+    found in `CREATE`, `ALTER`, `DROP`, `INSERT`, `UPDATE`, `DELETE`,
+    `TRUNCATE`, `COMMENT`, `GRANT`, `ANALYZE`, `SELECT ... INTO` and similar
+    statements and in `FROM`, `JOIN`, `REFERENCES` and `LIKE` clauses; an
+    unqualified name matches the same name in any schema. Other statements
+    (`DO` blocks, function definitions, `SET` ...) are barriers: they wait
+    for everything before them and everything after waits for them. So are
+    queries that call functions other than common built-ins (e.g.,
+    `SELECT setval(...)`), as their effects are unknown.
+
+    Dependencies can also be given in comments before a statement, by
+    statement name or by a relation that other statements write:
+
+    ```sql
+    -- name: link
+    CREATE TABLE crsp.ccm_link AS SELECT ...;
+
+    -- depends: link
+    CREATE INDEX ON crsp.ccm_link (gvkey);
+    ```
+
+    A statement's name is its `-- name:` comment, else the start of its
+    text. With `infer=False` only the explicit
+    dependencies are used.
+    """
+    statements = []
+    for i, stmt_sql in enumerate(split_sql(sql)):
+        name, _ = _annotations(stmt_sql)
+        objects = _objects(stmt_sql)
+        reads, writes = objects if objects else (None, None)
+        if name is None:
+            name = " ".join("".join(t if k != "comment" else " "
+                                    for k, t in _scan(stmt_sql)).split())
+            name = name if len(name) <= 60 else name[:57] + "..."
+        statements.append(SQLStatement(i, stmt_sql, name, reads=reads, writes=writes))
+
+    for stmt in statements:
+        for dep in _annotations(stmt.sql)[1]:
+            # a statement name, or a relation that statements write
+            matches = [s.index for s in statements
+                       if s.index != stmt.index
+                       and (s.name.lower() == dep.lower()
+                            or _overlap([_normalize(dep)], s.writes or ()))]
+            if not matches:
+                raise ValueError(f"{stmt.name}: unknown dependency {dep!r}.")
+            stmt.depends.update(matches)
+
+    if infer:
+        barrier = None
+        for j, stmt in enumerate(statements):
+            if stmt.writes is None:
+                stmt.depends.update(range(j))
+                barrier = j
+                continue
+            if barrier is not None:
+                stmt.depends.add(barrier)
+            for before in statements[barrier + 1 if barrier is not None else 0:j]:
+                if (_overlap(stmt.reads | stmt.writes, before.writes)
+                        or _overlap(stmt.writes, before.reads)):
+                    stmt.depends.add(before.index)
+    _check_acyclic(statements)
+    return statements
+
+def _check_acyclic(statements):
+    done, remaining = set(), {s.index: s.depends for s in statements}
+    while remaining:
+        ready = [i for i, deps in remaining.items() if deps <= done]
+        if not ready:
+            names = ", ".join(statements[i].name for i in sorted(remaining))
+            raise ValueError(f"Dependency cycle among statements: {names}.")
+        done.update(ready)
+        for i in ready:
+            del remaining[i]
+
+def _autocommit(sql):
+    """Statements PostgreSQL will not run inside a transaction block."""
+    code = _code_only(sql).strip()
+    return re.match(r"(vacuum|create\s+(unique\s+)?index\s+concurrently"
+                    r"|drop\s+index\s+concurrently|reindex\s.*\bconcurrently"
+                    r"|create\s+database|drop\s+database)\b",
+                    code, re.IGNORECASE | re.DOTALL) is not None
+
+def _execute(stmt, engine):
+    start = time.perf_counter()
+    if _autocommit(stmt.sql):
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text(stmt.sql))
+    else:
+        process_sql(stmt.sql, engine)
+    return time.perf_counter() - start
+
+def run_sql_script(sql, engine: Engine, jobs: int = 4, infer: bool = True,
+                   raise_errors: bool = True, verbose: bool = False) -> list[StatementResult]:
+    """
+    Run a SQL script, running independent statements concurrently.
+
+    Statements and their dependencies come from `parse_sql_script()`. Each
+    statement runs in its own transaction on a connection from `engine`'s
+    pool, at most `jobs` at a time, as soon as the statements it depends on
+    have succeeded. If a statement fails, statements that depend on it are
+    skipped and the others still run. Session settings (`SET ...`) do not
+    carry over between statements.
+
+    Parameters
+    ----------
+    sql : str or list[SQLStatement]
+        SQL text or parsed statements.
+    engine : SQLAlchemy engine
+        Its pool should allow `jobs` connections (the default pool allows 15).
+    jobs : int
+        Maximum statements running at once. `jobs=1` runs the statements in
+        file order.
+    raise_errors : bool
+        Raise RuntimeError after the run if any statement failed.
+    verbose : bool
+        Print each statement's outcome and time as it finishes.
+
+    Returns
+    -------
+    list[StatementResult], in script order.
+
+    Examples
+    ----------
+    >>> results = run_sql_script(open("ccm.sql").read(), engine, jobs=8)
+    >>> sorted(results, key=lambda r: -r.seconds)[:3]
+    """
+    statements = parse_sql_script(sql, infer=infer) if isinstance(sql, str) else list(sql)
+    results = {}
+    pending = {s.index: s for s in statements}
+
+    def finish(stmt, status, seconds=0.0, error=None):
+        results[stmt.index] = StatementResult(stmt.index, stmt.name, stmt.sql, status,
+                                              seconds, error)
+        if verbose:
+            detail = f" ({error})" if error else ""
+            print(f"{status:<7} {seconds:8.2f}s  {stmt.name}{detail}")
+
+    with ThreadPoolExecutor(max_workers=max(jobs, 1),
+                            thread_name_prefix="wrds2pg-sql") as pool:
+        running = {}
+        while pending or running:
+            for i in sorted(pending):
+                stmt = pending[i]
+                deps = [results.get(d) for d in stmt.depends]
+                if any(r is not None and r.status != "ok" for r in deps):
+                    finish(pending.pop(i), "skipped", error="dependency failed")
+                elif all(deps) and len(running) < max(jobs, 1):
+                    running[pool.submit(_execute, pending.pop(i), engine)] = stmt
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stmt = running.pop(future)
+                try:
+                    finish(stmt, "ok", future.result())
+                except Exception as e:
+                    finish(stmt, "error", error=f"{type(e).__name__}: {e}".splitlines()[0])
+
+    ordered = [results[s.index] for s in statements]
+    failed = [r for r in ordered if r.status == "error"]
+    if failed and raise_errors:
+        raise RuntimeError(
+            f"{len(failed)} statement(s) failed: "
+            + "; ".join(f"{r.name}: {r.error}" for r in failed)
+        )
+    return ordered
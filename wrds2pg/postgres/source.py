@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import time
+
+from sqlalchemy import text
+
+from ..progress import as_progress
+from .ddl import get_table_comment
+
+def get_pg_modified(table_name, schema, engine):
+    """Return the last-modified comment of a source table, or '' if none."""
+    comment = get_table_comment(table_name, schema, engine)
+    return comment if comment.startswith("Last modified: ") else ""
+
+def _matches(name, spec):
+    """Whether `name` is in a SAS-style variable list (`prefix:` wildcards)."""
+    for item in spec.lower().split():
+        if item.endswith(":") and name.startswith(item[:-1]):
+            return True
+        if name == item:
+            return True
+    return False
+
+def get_pg_table_metadata(table_name, schema, engine, drop=None, keep=None,
+                          rename=None, col_types=None):
+    """
+    Return column names and types of a PostgreSQL table or view.
+
+    `drop`, `keep` and `rename` use SAS syntax, as for the SAS source
+    (e.g., `drop="match: closest:"`, `rename="fee=mngt_fee"`). Types are the
+    source's own (`format_type()`), so values can be copied in binary
+    format; `col_types` overrides are applied with a cast on the source.
+
+    Returns
+    -------
+    dict with `names` (target names), `col_types` (target name -> type) and
+    `exprs` (source expressions for the target columns).
+    """
+    sql = text(
+        """
+        SELECT a.attname, format_type(a.atttypid, a.atttypmod)
+        FROM pg_attribute AS a
+        WHERE a.attrelid = to_regclass(quote_ident(:schema) || '.' || quote_ident(:table))
+          AND a.attnum > 0 AND NOT a.attisdropped
+        ORDER BY a.attnum
+        """
+    )
+    with engine.connect() as conn:
+        rows = conn.execute(sql, {"schema": schema, "table": table_name}).all()
+    if not rows:
+        raise RuntimeError(f"No metadata returned for {schema}.{table_name}.")
+
+    renames = dict(pair.lower().split("=", 1) for pair in (rename or "").split())
+    col_types = {k.lower(): v for k, v in (col_types or {}).items()}
+
+    names, types, exprs = [], {}, []
+    for src_name, src_type in rows:
+        if keep and not _matches(src_name, keep):
+            continue
+        if drop and _matches(src_name, drop):
+            continue
+        name = renames.get(src_name, src_name).lower()
+        pg_type = col_types.get(name, src_type)
+        expr = f'"{src_name}"'
+        if pg_type.lower() != src_type.lower():
+            expr = f"{expr}::{pg_type}"
+        names.append(name)
+        types[name] = pg_type
+        exprs.append(expr)
+
+    return {"names": names, "col_types": types, "exprs": exprs}
+
+def _source_query(table_name, schema, exprs, names, where=None, obs=None):
+    select = ", ".join(f'{expr} AS "{name}"' for expr, name in zip(exprs, names))
+    query = f'SELECT {select} FROM "{schema}"."{table_name}"'
+    if where:
+        query += f" WHERE {where}"
+    if obs:
+        query += f" LIMIT {int(obs)}"
+    return query
+
+def pg_to_pg(table_name, schema, src_engine, engine, meta, alt_table_name=None,
+             src_schema=None, where=None, obs=None, progress=None):
+    """
+    Copy rows of a table on `src_engine` into an existing table on `engine`.
+
+    Data move as `COPY ... TO STDOUT (FORMAT binary)` on the source piped
+    into `COPY ... FROM STDIN (FORMAT binary)` on the target, so values are
+    neither formatted as text nor parsed. The target table must have the
+    types in `meta` (see `get_pg_table_metadata()`). `where` is SQL.
+
+    `progress` receives the `pg_read` and `copy_write` stages.
+    """
+    progress = as_progress(progress)
+    if alt_table_name is None:
+        alt_table_name = table_name
+    if src_schema is None:
+        src_schema = schema
+
+    query = _source_query(table_name, src_schema, meta["exprs"], meta["names"], where, obs)
+    cols = ", ".join(f'"{name}"' for name in meta["names"])
+    copy_out = f"COPY ({query}) TO STDOUT (FORMAT binary)"
+    copy_in = f'COPY "{schema}"."{alt_table_name}" ({cols}) FROM STDIN (FORMAT binary)'
+
+    with src_engine.connect() as src_conn, engine.connect() as conn:
+        src, dst = src_conn.connection, conn.connection
+        try:
+            with src.cursor() as src_curs, dst.cursor() as curs:
+                with src_curs.copy(copy_out) as out, curs.copy(copy_in) as copy:
+                    t0 = time.perf_counter()
+                    for data in out:
+                        t1 = time.perf_counter()
+                        progress.add("pg_read", bytes=len(data), busy=t1 - t0)
+                        copy.write(data)
+                        t0 = time.perf_counter()
+                        progress.add("copy_write", bytes=len(data), busy=t0 - t1)
+                    flush_start = time.perf_counter()
+                progress.add("copy_write", rows=max(curs.rowcount, 0),
+                             busy=time.perf_counter() - flush_start)
+            dst.commit()
+        finally:
+            src.rollback()
+    return True
@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+import io
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable
+
+@dataclass
+class StageStats:
+    """
+    Counters for one pipeline stage.
+
+    `busy` is time spent doing the stage's own work; `wait` is time spent
+    blocked waiting for the stage's input. Both are in seconds.
+    """
+
+    name: str
+    bytes: int = 0
+    rows: int = 0
+    busy: float = 0.0
+    wait: float = 0.0
+    calls: int = 0
+
+    @property
+    def throughput(self) -> float:
+        """Average bytes per second of busy time."""
+        return self.bytes / self.busy if self.busy else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "bytes": self.bytes,
+            "rows": self.rows,
+            "busy": self.busy,
+            "wait": self.wait,
+            "throughput": self.throughput,
+        }
+
+@dataclass
+class ProgressEvent:
+    """
+    Snapshot passed to progress callbacks.
+
+    `stages` maps stage name to a dict with `bytes`, `rows`, `busy`, `wait`,
+    `throughput` (average over busy time) and `rate` (bytes per second since
+    the previous event). `done` is True for the final event of a run.
+    """
+
+    table: str | None
+    elapsed: float
+    stages: dict[str, dict]
+    done: bool = False
+
+class Progress:
+    """
+    Collects per-stage statistics for one transfer and reports them.
+
+    Pass an instance (or just a callback) as `progress=` to `wrds_update()`,
+    `wrds_update_pq()`, `wrds_update_csv()` and related functions. Stages
+    used by this package are:
+
+    - `freshness`: PROC CONTENTS job to get the last-modified stamp
+    - `sas_metadata`: SAS job that returns column names and types
+    - `sas_export`: wall time of the data export, from launch to exit
+    - `sftp_fetch`: download of the raw `.sas7bdat` file (`source="sftp"`)
+    - `ssh_read`: reading SAS output (includes network and SAS time)
+    - `decode`: local normalization or `.sas7bdat` decoding
+    - `copy_write`: COPY into PostgreSQL
+    - `gzip_read`: decompressing local CSV files (`csv_to_pg()`)
+    - `gzip_write`: compressing CSV output
+    - `arrow_parse`: parsing CSV into Arrow record batches
+    - `parquet_write`: encoding and writing Parquet
+    - `ipc_write`: writing Arrow IPC
+    - `duckdb_write`: inserting Arrow record batches into DuckDB
+
+    Parameters
+    ----------
+    callback:
+        Called with a `ProgressEvent` at most every `interval` seconds while
+        data flow, and once more when `finish()` is called.
+    interval:
+        Minimum seconds between periodic events.
+    table:
+        Label for events, e.g., "crsp.dsf". Set by the update functions.
+
+    Examples
+    ----------
+    >>> progress = Progress(print, interval=10)
+    >>> wrds_update("dsf", "crsp", progress=progress)
+    >>> progress.summary()
+    """
+
+    def __init__(self, callback: Callable[[ProgressEvent], None] | None = None,
+                 interval: float = 5.0, table: str | None = None):
+        self.callback = callback
+        self.interval = interval
+        self.table = table
+        self.stages: dict[str, StageStats] = {}
+        self.counters: dict[str, int] = {}
+        self.events: list[dict] = []
+        self.outcome: str | None = None
+        self.started = time.time()
+        self.start = time.perf_counter()
+        self.end: float | None = None
+        self._lock = threading.Lock()
+        self._last_emit = self.start
+        self._last_bytes: dict[str, int] = {}
+
+    def stage(self, name: str) -> StageStats:
+        with self._lock:
+            if name not in self.stages:
+                self.stages[name] = StageStats(name)
+            return self.stages[name]
+
+    def add(self, name: str, bytes: int = 0, rows: int = 0,
+            busy: float = 0.0, wait: float = 0.0) -> None:
+        """Add to the counters of stage `name` and emit an event if due."""
+        stats = self.stage(name)
+        with self._lock:
+            stats.bytes += bytes
+            stats.rows += rows
+            stats.busy += busy
+            stats.wait += wait
+            stats.calls += 1
+        if self.callback is not None:
+            now = time.perf_counter()
+            if now - self._last_emit >= self.interval:
+                self._emit(now, done=False)
+
+    def count(self, name: str, n: int = 1) -> None:
+        """Increment the event counter `name` (e.g., "retries")."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def log_event(self, event: dict) -> None:
+        """Record an event of the run (e.g., a SAS log ERROR or step time)."""
+        with self._lock:
+            self.events.append({"time": time.perf_counter() - self.start, **event})
+
+    def peak(self, name: str, value: int) -> None:
+        """Raise the counter `name` to `value` if higher (e.g., "peak_rss")."""
+        with self._lock:
+            if value > self.counters.get(name, 0):
+                self.counters[name] = value
+
+    @contextmanager
+    def timed(self, name: str, bytes: int = 0, rows: int = 0):
+        """Count the time spent in a `with` block as busy time of `name`."""
+        start = time.perf_counter()
+        try:
+            yield self.stage(name)
+        finally:
+            self.add(name, bytes=bytes, rows=rows, busy=time.perf_counter() - start)
+
+    def snapshot(self, now: float | None = None) -> dict[str, dict]:
+        now = time.perf_counter() if now is None else now
+        span = now - self._last_emit
+        with self._lock:
+            out = {}
+            for name, stats in self.stages.items():
+                d = stats.as_dict()
+                delta = stats.bytes - self._last_bytes.get(name, 0)
+                d["rate"] = delta / span if span > 0 else 0.0
+                out[name] = d
+        return out
+
+    def _emit(self, now, done):
+        stages = self.snapshot(now)
+        with self._lock:
+            self._last_emit = now
+            self._last_bytes = {n: s.bytes for n, s in self.stages.items()}
+        self.callback(ProgressEvent(self.table, now - self.start, stages, done))
+
+    def finish(self, outcome: str | None = None) -> dict:
+        """
+        Mark the run complete, send the final event and return `summary()`.
+
+        `outcome` describes how the run ended, e.g., "updated" or
+        "up_to_date".
+        """
+        self.end = time.perf_counter()
+        if outcome is not None:
+            self.outcome = outcome
+        if self.callback is not None:
+            self._emit(self.end, done=True)
+        return self.summary()
+
+    def summary(self) -> dict:
+        """
+        Return the timing breakdown for the run.
+
+        A dict with `table`, `started` (epoch seconds), total `elapsed`
+        seconds, `outcome`, `counters`, `events` (see `log_event()`) and
+        `stages`, mapping each stage name to `bytes`, `rows`, `busy`, `wait`
+        and `throughput`.
+        """
+        end = self.end if self.end is not None else time.perf_counter()
+        with self._lock:
+            stages = {n: s.as_dict() for n, s in self.stages.items()}
+            counters = dict(self.counters)
+            events = list(self.events)
+        return {"table": self.table, "started": self.started,
+                "elapsed": end - self.start, "outcome": self.outcome,
+                "counters": counters, "events": events, "stages": stages}
+
+def as_progress(progress, table=None) -> Progress:
+    """Return `progress` as a `Progress` (wrapping a bare callback or None)."""
+    if isinstance(progress, Progress):
+        if progress.table is None:
+            progress.table = table
+        return progress
+    return Progress(callback=progress, table=table)
+
+class InstrumentedStream(io.TextIOBase):
+    """
+    Text stream wrapper that records reads as a stage of a `Progress`.
+
+    Time spent in `read()`/`readline()` is busy time of `stage`. If `inner`
+    is another `InstrumentedStream` that this stream reads from (directly or
+    indirectly), time spent in it is subtracted, so nested stages are
+    reported exclusively.
+    """
+
+    def __init__(self, stream, progress: Progress, stage: str,
+                 inner: "InstrumentedStream | None" = None):
+        self._stream = stream
+        self._progress = progress
+        self._stage = stage
+        self._inner = inner
+        self.total = 0.0
+        self.first_byte: float | None = None
+
+    def readable(self):
+        return True
+
+    def _timed(self, method, *args):
+        inner_before = self._inner.total if self._inner is not None else 0.0
+        start = time.perf_counter()
+        data = method(*args)
+        elapsed = time.perf_counter() - start
+        self.total += elapsed
+        if self.first_byte is None and data:
+            self.first_byte = time.perf_counter() - self._progress.start
+        inner = (self._inner.total - inner_before) if self._inner is not None else 0.0
+        self._progress.add(self._stage, bytes=len(data), busy=elapsed - inner)
+        return data
+
+    def read(self, size=-1):
+        return self._timed(self._stream.read, size)
+
+    def readline(self, size=-1):
+        return self._timed(self._stream.readline, size)
@@ -6,12 +6,30 @@ def get_wrds_sas(table_name, schema, wrds_id=None, fpath=None,
                      drop=None, keep=None, fix_cr = False, 
                      col_types=None,
                      fix_missing = False, obs=None, where=None,
-                     rename=None, encoding=None, sas_encoding=None):
-    
-    make_table_data = get_table_sql(table_name=table_name, schema=schema, 
-                                    wrds_id=wrds_id, fpath=fpath,
-                                    col_types=col_types,
-                                    drop=drop, rename=rename, keep=keep)
+                     rename=None, encoding=None, sas_encoding=None,
+                     view=True, firstobs=None, table_data=None):
+    """Return SAS code that exports a table as CSV to stdout.
+
+    When options require a DATA step (`fix_missing`, `drop`, `keep`, `obs`,
+    `where`, `col_types`), the step is compiled as a DATA step view by
+    default, with formats set inline, so PROC EXPORT streams rows as they are
+    read. Set `view=False` to materialize a copy in WORK first (the previous
+    behaviour), e.g., to compare time to first byte.
+
+    `firstobs` skips observations before that (1-based) number, as the SAS
+    data set option does; `obs` still refers to the last observation.
+
+    `table_data` is the output of `get_table_sql()` or `get_table_metadata()`
+    for the same options, if already known; otherwise SAS is run to get it.
+    """
+
+    if table_data is not None:
+        make_table_data = table_data
+    else:
+        make_table_data = get_table_sql(table_name=table_name, schema=schema,
+                                        wrds_id=wrds_id, fpath=fpath,
+                                        col_types=col_types,
+                                        drop=drop, rename=rename, keep=keep)
 
     col_types = make_table_data["col_types"]
     
@@ -42,7 +60,12 @@ def get_wrds_sas(table_name, schema, wrds_id=None, fpath=None,
     else:
         sas_encoding_str="(encoding='" + sas_encoding + "')"
 
-    if fix_missing or drop or obs or keep or col_types or where:
+    if firstobs:
+        firstobs_str = " firstobs=" + str(firstobs)
+    else:
+        firstobs_str = ""
+
+    if fix_missing or drop or obs or keep or col_types or where or firstobs:
         
         if obs:
             obs_str = " obs=" + str(obs)
@@ -64,9 +87,9 @@ def get_wrds_sas(table_name, schema, wrds_id=None, fpath=None,
         else:
             where_str = ""
         
-        if obs or drop or rename or keep:
+        if obs or drop or rename or keep or firstobs:
             sas_table = table_name + "(" + drop_str + keep_str + \
-                                           obs_str + rename_str + ")"
+                                           firstobs_str + obs_str + rename_str + ")"
         else:
             sas_table = table_name
 
@@ -97,17 +120,22 @@ def get_wrds_sas(table_name, schema, wrds_id=None, fpath=None,
                 k for k, v in col_types.items()
                 if v not in ["date", "time", "timestamp", "bigint"]
             ]
-            unformat_str = " ".join([f"attrib {var} format=;" for var in unformat])
-            
-            # ---- dates / times / timestamps ----
             dates = [k for k, v in col_types.items() if v == "date"]
-            dates_str = " ".join([f"attrib {var} format=YYMMDD10.;" for var in dates])
-            
             times = [k for k, v in col_types.items() if v == "time"]
-            times_str = " ".join([f"attrib {var} format=TIME8.;" for var in times])
-            
             timestamps = [k for k, v in col_types.items() if v == "timestamp"]
-            timestamps_str = " ".join([f"attrib {var} format=E8601DT19.;" for var in timestamps])
+
+            if view:
+                # ---- FORMAT statements inside the DATA step view ----
+                unformat_str = f"format {' '.join(unformat)};" if unformat else ""
+                dates_str = f"format {' '.join(dates)} YYMMDD10.;" if dates else ""
+                times_str = f"format {' '.join(times)} TIME8.;" if times else ""
+                timestamps_str = (f"format {' '.join(timestamps)} E8601DT19.;"
+                                  if timestamps else "")
+            else:
+                unformat_str = " ".join([f"attrib {var} format=;" for var in unformat])
+                dates_str = " ".join([f"attrib {var} format=YYMMDD10.;" for var in dates])
+                times_str = " ".join([f"attrib {var} format=TIME8.;" for var in times])
+                timestamps_str = " ".join([f"attrib {var} format=E8601DT19.;" for var in timestamps])
         else:
             unformat_str = ""
             dates_str = ""
@@ -125,8 +153,30 @@ def get_wrds_sas(table_name, schema, wrds_id=None, fpath=None,
         else:
             fix_missing_str = ""
         
-        sas_code = f"""
-            options nosource nonotes;
+        if view:
+            # A view is computed row by row as PROC EXPORT reads it, so the
+            # export starts immediately and nothing is written to WORK.
+            sas_code = f"""
+            options nosource notes;
+            {libname_stmt}
+            * Fix missing values;
+            data {new_table} / view={new_table};
+                set {schema}.{sas_table}{sas_encoding_str};
+                {bigints_str}
+                {fix_cr_code}
+                {fix_missing_str}
+                {where_str}
+                {unformat_str}
+                {dates_str}
+                {times_str}
+                {timestamps_str}
+            run;
+
+            proc export data={new_table} outfile=stdout dbms=csv;
+            run;"""
+        else:
+            sas_code = f"""
+            options nosource notes;
             {libname_stmt}
             * Fix missing values;
             data {new_table};
@@ -151,7 +201,7 @@ def get_wrds_sas(table_name, schema, wrds_id=None, fpath=None,
     else:
 
         sas_code = f"""
-            options nosource nonotes;
+            options nosource notes;
             {libname_stmt}
 
             proc export data={schema}.{table_name}({rename_str} 
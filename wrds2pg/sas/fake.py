@@ -0,0 +1,348 @@
+from __future__ import annotations
+
+import random
+import re
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+
+from .._utils import IterStream
+from .transport import SASConnectionError, SASTransport
+
+# PostgreSQL type -> (SAS type, length, format, formatl, formatd), chosen so
+# that `code_row_dict()` infers the PostgreSQL type back.
+_SAS_ATTRIBUTES = {
+    "integer": (1, 8, "", 8, 0),
+    "float8": (1, 8, "", 0, 0),
+    "text": (2, 32, "", 0, 0),
+    "date": (1, 8, "YYMMDDN", 8, 0),
+    "timestamp": (1, 8, "DATETIME", 19, 0),
+    "time": (1, 8, "TIME", 8, 0),
+}
+
+DEFAULT_TYPES = ("integer", "float8", "text", "date", "float8", "timestamp")
+
+_WORDS = ["APPLE", "MICROSOFT CORP", "Smith, Barney & Co", 'The "Big" Fund',
+          "NASDAQ SMALL CAP", "NYSE", "BERKSHIRE HATHAWAY", "e.l.f. Beauty"]
+
+# Rows are built from a fixed block of pre-rendered row tails, so generating
+# data costs little more than copying strings.
+_BLOCK_ROWS = 1021
+_CHUNK_ROWS = 4096
+
+@dataclass
+class FakeTable:
+    """
+    A synthetic SAS table served by `FakeWRDSTransport`.
+
+    Parameters
+    ----------
+    rows : int
+        Number of observations.
+    columns : list of (name, type)
+        Column names and PostgreSQL types (keys of `_SAS_ATTRIBUTES`). The
+        first column should be an integer key; it is set to the observation
+        number, so loads that resume with `firstobs` can be checked.
+    modified : str
+        Last-modified stamp reported by PROC CONTENTS ("%m/%d/%Y %H:%M:%S").
+    missing : float
+        Share of values that are missing.
+    special_missing : float
+        Share of numeric values written as SAS special missing values
+        (e.g., `A`) unless the SAS code fixes them (`fix_missing`).
+    seed : int
+        Seed for generated values.
+    """
+
+    rows: int
+    columns: list[tuple[str, str]]
+    modified: str = "01/02/2024 03:04:05"
+    missing: float = 0.02
+    special_missing: float = 0.0
+    seed: int = 0
+    _blocks: dict = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    @classmethod
+    def synthetic(cls, rows, width=10, types=DEFAULT_TYPES, **kwargs) -> "FakeTable":
+        """Make a table with an `id` column and `width - 1` columns `c1`, ... of cycling `types`."""
+        columns = [("id", "integer")] + [
+            (f"c{i}", types[(i - 1) % len(types)]) for i in range(1, width)
+        ]
+        return cls(rows=rows, columns=columns, **kwargs)
+
+    def _value(self, rng, col_type, special):
+        if rng.random() < self.missing:
+            return ""
+        if col_type != "text" and special and rng.random() < self.special_missing:
+            return rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ_")
+        if col_type == "integer":
+            return str(rng.randint(1, 99999))
+        if col_type == "float8":
+            return repr(round(rng.uniform(-100, 100), 6))
+        if col_type == "text":
+            word = rng.choice(_WORDS)
+            if "," in word or '"' in word:
+                word = '"' + word.replace('"', '""') + '"'
+            return word
+        if col_type == "date":
+            return (date(1990, 1, 1) + timedelta(days=rng.randint(0, 12000))).isoformat()
+        if col_type == "timestamp":
+            value = datetime(1990, 1, 1) + timedelta(seconds=rng.randint(0, 10**9))
+            return value.isoformat(timespec="seconds")
+        if col_type == "time":
+            return str(timedelta(seconds=rng.randint(0, 86399))).zfill(8)
+        raise ValueError(f"Unsupported column type {col_type!r}.")
+
+    def block(self, indexes, special):
+        """Pre-rendered tails (all columns but the first) for `indexes`."""
+        key = (tuple(indexes), special)
+        if key not in self._blocks:
+            rng = random.Random(self.seed)
+            self._blocks[key] = [
+                "".join("," + self._value(rng, self.columns[k][1], special)
+                        for k in indexes)
+                for _ in range(_BLOCK_ROWS)
+            ]
+        return self._blocks[key]
+
+def _dataset_options(code, match):
+    """Return the text inside the parentheses after `match` (dataset options)."""
+    pos = match.end()
+    while pos < len(code) and code[pos].isspace():
+        pos += 1
+    if pos >= len(code) or code[pos] != "(":
+        return ""
+    depth = 0
+    for end in range(pos, len(code)):
+        depth += {"(": 1, ")": -1}.get(code[end], 0)
+        if depth == 0:
+            return code[pos + 1:end]
+    return code[pos + 1:]
+
+def _parse_options(opts):
+    rename = {}
+    m = re.search(r"rename\s*=\s*\(([^)]*)\)", opts, re.I)
+    if m:
+        rename = {old.lower(): new for old, new in
+                  re.findall(r"(\w+)\s*=\s*(\w+)", m.group(1))}
+        opts = opts[:m.start()] + opts[m.end():]
+    opts = re.sub(r"encoding\s*=\s*(['\"]).*?\1", "", opts, flags=re.I)
+
+    def value(key):
+        m = re.search(rf"\b{key}\s*=\s*(.*?)(?=\s+\w+\s*=|$)", opts.strip(), re.I | re.S)
+        return m.group(1).strip() if m else None
+
+    return {
+        "drop": value("drop"),
+        "keep": value("keep"),
+        "firstobs": int(value("firstobs") or 1),
+        "obs": int(value("obs")) if value("obs") else None,
+        "rename": rename,
+    }
+
+def _matches(name, patterns):
+    for pattern in patterns.lower().split():
+        if pattern.endswith(":") and name.startswith(pattern[:-1]):
+            return True
+        if name == pattern:
+            return True
+    return False
+
+def _select(columns, opts):
+    """Indexes and output names of `columns` after drop/keep/rename."""
+    indexes = [k for k, (name, _) in enumerate(columns)
+               if not (opts["drop"] and _matches(name.lower(), opts["drop"]))
+               and not (opts["keep"] and not _matches(name.lower(), opts["keep"]))]
+    names = [opts["rename"].get(columns[k][0].lower(), columns[k][0]) for k in indexes]
+    return indexes, names
+
+class FakeWRDSTransport(SASTransport):
+    """
+    A stand-in for SAS on WRDS that serves synthetic tables.
+
+    It answers the SAS jobs this package generates: PROC CONTENTS listings
+    (`get_modified_str()`), the PROC CONTENTS/PROC EXPORT metadata job
+    (`make_sas_code()`), library catalogs and modification stamps from
+    `dictionary.tables` (`get_wrds_catalog()`, `wrds2pg.cache`) and CSV
+    exports from `get_wrds_sas()`, honouring `drop`, `keep`, `rename`,
+    `obs`, `firstobs` and `fix_missing`. WHERE clauses are ignored. Other
+    SAS code raises `RuntimeError`. A short SAS log with the step's time
+    goes to the job's `SASLog`.
+
+    Install it with `use_transport()` to run the update functions, or the
+    benchmark suite, without a WRDS account.
+
+    Parameters
+    ----------
+    tables : dict, optional
+        Maps "schema.table" (lower case) to `FakeTable`. If omitted, every
+        table exists and is `FakeTable.synthetic(rows, width, types)`.
+    rows, width, types :
+        Shape of the default table.
+    startup : float
+        Seconds before each SAS job produces output (WRDS's `qsas` start-up
+        and queueing is typically a few seconds).
+    rate : float, optional
+        Maximum characters per second for exports (e.g., `50e6`), to mimic
+        the WRDS link. Default is unlimited.
+    fail_after : int, optional
+        Drop the connection (raise `SASConnectionError`) once, after this
+        many characters of an export, to exercise retries.
+
+    Examples
+    ----------
+    >>> with use_transport(FakeWRDSTransport(rows=1_000_000, width=20, rate=40e6)):
+    ...     wrds_update("synthetic", "bench", wrds_id="fake", force=True)
+    """
+
+    def __init__(self, tables=None, rows=100_000, width=10, types=DEFAULT_TYPES,
+                 startup=0.0, rate=None, fail_after=None):
+        self.tables = ({k.lower(): v for k, v in tables.items()}
+                       if tables is not None else None)
+        self.default = FakeTable.synthetic(rows, width=width, types=types)
+        self.startup = startup
+        self.rate = rate
+        self.fail_after = fail_after
+        self.jobs: list[str] = []
+
+    def get_table(self, schema, table_name) -> FakeTable | None:
+        if self.tables is None:
+            return self.default
+        return self.tables.get(f"{schema}.{table_name}".lower())
+
+    @contextmanager
+    def open(self, sas_code, encoding="utf-8", log=None):
+        if self.startup:
+            time.sleep(self.startup)
+        start = time.perf_counter()
+        yield IterStream(self._respond(sas_code))
+        if log is not None:
+            # as in SAS, step notes are written only under `options notes`
+            notes = re.findall(r"\b(no)?notes\b", sas_code, re.I)
+            if not (notes and notes[-1]):
+                step = ("PROCEDURE EXPORT" if re.search(r"proc\s+export", sas_code, re.I)
+                        else "PROCEDURE CONTENTS" if re.search(r"proc\s+contents", sas_code, re.I)
+                        else "PROCEDURE SQL")
+                seconds = time.perf_counter() - start
+                log.feed_text(
+                    f"NOTE: {step} used (Total process time):\n"
+                    f"      real time           {seconds:.2f} seconds\n"
+                    f"      user cpu time       {seconds:.2f} seconds\n"
+                    f"      system cpu time     0.00 seconds\n"
+                    f"      memory              1024.00k\n\n"
+                )
+            log.close()
+
+    def _respond(self, code):
+        m = re.search(r"proc\s+contents\s+data\s*=\s*(\w+)\.(\w+)", code, re.I)
+        if m and re.search(r"out\s*=\s*_meta", code, re.I):
+            self.jobs.append("metadata")
+            yield self._metadata(m.group(1), m.group(2), _dataset_options(code, m))
+            return
+        if m:
+            self.jobs.append("contents")
+            yield self._contents(m.group(1), m.group(2))
+            return
+        m = re.search(r'dictionary\.tables.*?libname\s*=\s*"(\w+)"', code, re.I | re.S)
+        if m and re.search(r"create\s+table\s+_catalog", code, re.I):
+            self.jobs.append("catalog")
+            yield self._catalog(m.group(1))
+            return
+        if m:
+            self.jobs.append("stamps")
+            yield self._stamps(code)
+            return
+        m = (re.search(r"\bset\s+(\w+)\.(\w+)", code, re.I)
+             or re.search(r"proc\s+export\s+data\s*=\s*(\w+)\.(\w+)", code, re.I))
+        if m and re.search(r"proc\s+export", code, re.I):
+            self.jobs.append("export")
+            fix_missing = re.search(r"do\s+over\s+allvars", code, re.I) is not None
+            yield from self._export(m.group(1), m.group(2),
+                                    _dataset_options(code, m), fix_missing)
+            return
+        raise RuntimeError("FakeWRDSTransport does not understand this SAS code:\n" + code)
+
+    def _metadata(self, schema, table_name, opts):
+        table = self.get_table(schema, table_name)
+        if table is None:
+            return ""
+        indexes, names = _select(table.columns, _parse_options(opts))
+        lines = ["NAME,TYPE,LENGTH,FORMAT,FORMATL,FORMATD"]
+        for k, name in zip(indexes, names):
+            sas_type, length, fmt, formatl, formatd = _SAS_ATTRIBUTES[table.columns[k][1]]
+            lines.append(f"{name},{sas_type},{length},{fmt},{formatl},{formatd}")
+        return "\n".join(lines) + "\n"
+
+    def _contents(self, schema, table_name):
+        table = self.get_table(schema, table_name)
+        if table is None:
+            return ""
+        name = f"{schema}.{table_name}".upper()
+        return (
+            "The CONTENTS Procedure\n\n"
+            f"Data Set Name        {name:<40} Observations          {table.rows}\n"
+            f"Member Type          {'DATA':<40} Variables             {len(table.columns)}\n"
+            f"Engine               {'V9':<40} Indexes               0\n"
+            f"Created              {table.modified:<40} Observation Length    "
+            f"{8 * len(table.columns)}\n"
+            f"Last Modified        {table.modified:<40} Deleted Observations  0\n"
+            f"Protection           {'':<40} Compressed            NO\n"
+        )
+
+    def _stamps(self, code):
+        lines = ["libname,memname,modate"]
+        pairs = re.findall(r'libname\s*=\s*"(\w+)"\s+and\s+memname\s*=\s*"(\w+)"', code, re.I)
+        for lib, mem in pairs:
+            table = self.get_table(lib, mem)
+            if table is not None:
+                modate = datetime.strptime(table.modified, "%m/%d/%Y %H:%M:%S")
+                lines.append(f"{lib.upper()},{mem.upper()},"
+                             f"{modate.strftime('%d%b%Y:%H:%M:%S').upper()}")
+        return "\n".join(lines) + "\n"
+
+    def _catalog(self, lib):
+        lines = ["memname,memtype,nobs,nvar,filesize,modate,crdate"]
+        for key in sorted(self.tables or {}):
+            schema, name = key.split(".", 1)
+            if schema != lib.lower():
+                continue
+            table = self.tables[key]
+            modate = datetime.strptime(table.modified, "%m/%d/%Y %H:%M:%S").isoformat()
+            filesize = 8 * table.rows * len(table.columns) + 65536
+            lines.append(f"{name.upper()},DATA,{table.rows},{len(table.columns)},"
+                         f"{filesize},{modate},{modate}")
+        return "\n".join(lines) + "\n"
+
+    def _export(self, schema, table_name, opts, fix_missing):
+        table = self.get_table(schema, table_name)
+        if table is None:
+            raise RuntimeError(f"Remote SAS exited with code 1.\n"
+                               f"ERROR: File {schema}.{table_name}.DATA does not exist.")
+        opts = _parse_options(opts)
+        indexes, names = _select(table.columns, opts)
+        keyed = bool(indexes) and indexes[0] == 0
+        tails = table.block(indexes[1:] if keyed else indexes,
+                            special=not fix_missing)
+
+        last = table.rows if opts["obs"] is None else min(opts["obs"], table.rows)
+        start = time.perf_counter()
+        sent = 0
+        fail_after = self.fail_after
+
+        yield ",".join(names) + "\n"
+        for lo in range(opts["firstobs"] - 1, last, _CHUNK_ROWS):
+            hi = min(lo + _CHUNK_ROWS, last)
+            if keyed:
+                chunk = "".join(f"{i + 1}{tails[i % _BLOCK_ROWS]}\n" for i in range(lo, hi))
+            else:
+                chunk = "".join(f"{tails[i % _BLOCK_ROWS][1:]}\n" for i in range(lo, hi))
+            sent += len(chunk)
+            if fail_after is not None and sent > fail_after:
+                self.fail_after = None
+                raise SASConnectionError("Connection to WRDS closed before SAS finished.")
+            if self.rate:
+                delay = sent / self.rate - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            yield chunk
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import re
+import threading
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Callable, TextIO
+
+_MESSAGE = re.compile(r"^(ERROR|WARNING)(?: [\d-]+)?:\s*(.*)$")
+_STEP = re.compile(r"^NOTE: (.+?) used(?: \(Total process time\))?:\s*$")
+_TIME = re.compile(r"^\s+(real time|user cpu time|system cpu time|cpu time)\s+(\S+)")
+_MEMORY = re.compile(r"^\s+memory\s+([\d.]+)k\s*$")
+
+def _seconds(value: str) -> float | None:
+    """Parse SAS step times: "0.01", "1:02.03" or "1:02:03.04" (seconds optional)."""
+    try:
+        parts = [float(p) for p in value.split(":")]
+    except ValueError:
+        return None
+    total = 0.0
+    for part in parts:
+        total = total * 60 + part
+    return total
+
+@dataclass
+class SASLogEvent:
+    """
+    An event parsed from a SAS log.
+
+    `kind` is "error", "warning" or "step". For messages, `message` is the
+    text (continuation lines joined); for steps it is the step name (e.g.,
+    "PROCEDURE EXPORT" or "DATA statement") and `real_seconds`,
+    `cpu_seconds` (user plus system time with `options fullstimer`) and
+    `memory_kb` give its resource use. `line` is the log line number.
+    """
+
+    kind: str
+    message: str
+    line: int
+    real_seconds: float | None = None
+    cpu_seconds: float | None = None
+    memory_kb: float | None = None
+
+    def as_dict(self) -> dict:
+        return {k: v for k, v in asdict(self).items() if v is not None}
+
+class SASError(RuntimeError):
+    """A SAS job failed; `events` holds what its log reported."""
+
+    def __init__(self, message: str, events: list[SASLogEvent] | None = None):
+        super().__init__(message)
+        self.events = events or []
+
+class SASLog:
+    """
+    Parse a SAS log into `SASLogEvent`s as it is written.
+
+    Transports call `start()` with the SAS process's log stream (stderr
+    with `-stdio`), which a background thread drains so that a long log
+    can never fill the pipe and stall the job. Each event is passed to
+    `callback` and, if `progress` is given, recorded there: errors and
+    warnings as the counters `sas_errors` and `sas_warnings`, and every
+    event with `Progress.log_event()`, so they appear in the run's
+    metrics. With `abort_on_error`, the first ERROR calls the `abort`
+    function given to `start()` (e.g., closing the SSH channel) rather
+    than waiting for SAS to finish.
+
+    Parameters
+    ----------
+    progress : Progress, optional
+        Receives the events.
+    abort_on_error : bool
+        Stop the job at the first ERROR.
+    callback : callable, optional
+        Called with each `SASLogEvent`.
+    tail_lines : int
+        Number of log lines kept for error messages.
+    """
+
+    def __init__(self, progress=None, abort_on_error: bool = False,
+                 callback: Callable[[SASLogEvent], None] | None = None,
+                 tail_lines: int = 200):
+        self.progress = progress
+        self.abort_on_error = abort_on_error
+        self.callback = callback
+        self.events: list[SASLogEvent] = []
+        self.aborted = False
+        self._tail: deque[str] = deque(maxlen=tail_lines)
+        self._lineno = 0
+        self._pending: SASLogEvent | None = None
+        self._abort: Callable[[], None] | None = None
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def errors(self) -> list[SASLogEvent]:
+        return [e for e in self.events if e.kind == "error"]
+
+    @property
+    def warnings(self) -> list[SASLogEvent]:
+        return [e for e in self.events if e.kind == "warning"]
+
+    @property
+    def steps(self) -> list[SASLogEvent]:
+        return [e for e in self.events if e.kind == "step"]
+
+    def tail(self) -> str:
+        """Return the last lines of the log."""
+        with self._lock:
+            return "".join(self._tail)
+
+    def feed(self, line: str) -> None:
+        """Parse one line of the log."""
+        with self._lock:
+            self._lineno += 1
+            self._tail.append(line if line.endswith("\n") else line + "\n")
+            text = line.rstrip("\r\n")
+            pending = self._pending
+
+            if pending is not None and pending.kind == "step":
+                m = _TIME.match(text)
+                if m:
+                    seconds = _seconds(m.group(2))
+                    if m.group(1) == "real time":
+                        pending.real_seconds = seconds
+                    elif seconds is not None:
+                        pending.cpu_seconds = (pending.cpu_seconds or 0.0) + seconds
+                    return
+                m = _MEMORY.match(text)
+                if m:
+                    pending.memory_kb = float(m.group(1))
+                    return
+                if text.startswith((" ", "\t")) and text.strip():
+                    return  # other fullstimer lines (OS Memory, Timestamp ...)
+            elif pending is not None and text.startswith((" ", "\t")) and text.strip():
+                pending.message += " " + text.strip()
+                return
+
+            ready = [pending] if pending is not None else []
+            self._pending = None
+            m = _MESSAGE.match(text)
+            if m:
+                self._pending = SASLogEvent(m.group(1).lower(), m.group(2).strip(),
+                                            self._lineno)
+            else:
+                m = _STEP.match(text)
+                if m:
+                    self._pending = SASLogEvent("step", m.group(1), self._lineno)
+        for event in ready:
+            self._emit(event)
+
+    def feed_text(self, text: str) -> None:
+        """Parse several lines of the log."""
+        for line in text.splitlines(keepends=True):
+            self.feed(line)
+
+    def close(self) -> None:
+        """Emit the event in progress at the end of the log."""
+        with self._lock:
+            pending, self._pending = self._pending, None
+        if pending is not None:
+            self._emit(pending)
+
+    def _emit(self, event: SASLogEvent) -> None:
+        self.events.append(event)
+        if self.progress is not None:
+            if event.kind != "step":
+                self.progress.count(f"sas_{event.kind}s")
+            self.progress.log_event({"source": "sas_log", **event.as_dict()})
+        if self.callback is not None:
+            self.callback(event)
+        if event.kind == "error" and self.abort_on_error and not self.aborted:
+            self.aborted = True
+            if self._abort is not None:
+                self._abort()
+
+    def attach(self, abort: Callable[[], None] | None) -> None:
+        """Set the function that stops the job, for logs fed with `feed()`."""
+        self._abort = abort
+
+    def start(self, stream: TextIO, abort: Callable[[], None] | None = None) -> None:
+        """Drain `stream` on a background thread until it ends."""
+        self._abort = abort
+        self._thread = threading.Thread(target=self._drain, args=(stream,),
+                                        name="wrds2pg-sas-log", daemon=True)
+        self._thread.start()
+
+    def _drain(self, stream):
+        try:
+            for line in stream:
+                self.feed(line)
+        except (OSError, ValueError, UnicodeDecodeError):
+            pass  # stream closed under us, or undecodable log output
+        finally:
+            self.close()
+
+    def join(self, timeout: float | None = 10.0) -> None:
+        """Wait for the log stream to end (after the SAS process exits)."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def error(self, message: str) -> SASError:
+        """Return a `SASError` with `message`, the log's ERRORs (or its tail)."""
+        errors = self.errors
+        details = ("\n".join(f"ERROR: {e.message}" for e in errors) if errors
+                   else self.tail())
+        return SASError(f"{message}\n{details}".rstrip(), list(self.events))
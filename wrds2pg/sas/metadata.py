@@ -4,6 +4,8 @@ import csv
 import io
 import os
 import re
+from dataclasses import dataclass
+from datetime import datetime
 
 def make_sas_code(
     table_name,
@@ -47,8 +49,8 @@ def make_sas_code(
     """
     return sas_code.strip() + "\n"
 
-def proc_contents(table_name, sas_schema=None, wrds_id=None, fpath=None, encoding="utf-8"):
-    from .stream import get_process_stream  # local import to avoid circular import
+def _proc_contents_code(table_name, sas_schema=None, wrds_id=None, fpath=None):
+    """Return the PROC CONTENTS job for a table and the WRDS ID to run it with."""
     if wrds_id is None and fpath is None:
         wrds_id = os.environ.get("WRDS_ID")
 
@@ -66,7 +68,11 @@ def proc_contents(table_name, sas_schema=None, wrds_id=None, fpath=None, encodin
     if wrds_id is None and sas_schema is None:
         sas_schema = "work"
 
-    sas_code = f"PROC CONTENTS data={sas_schema}.{table_name}; RUN;"
+    return f"PROC CONTENTS data={sas_schema}.{table_name}; RUN;", wrds_id
+
+def proc_contents(table_name, sas_schema=None, wrds_id=None, fpath=None, encoding="utf-8"):
+    from .stream import get_process_stream  # local import to avoid circular import
+    sas_code, wrds_id = _proc_contents_code(table_name, sas_schema, wrds_id, fpath)
 
     with get_process_stream(
         sas_code,
@@ -76,13 +82,22 @@ def proc_contents(table_name, sas_schema=None, wrds_id=None, fpath=None, encodin
     ) as stream:
         return stream.readlines()
 
-def get_modified_str(table_name, sas_schema, wrds_id=None, encoding="utf-8"):
-    contents = proc_contents(
-        table_name=table_name,
-        sas_schema=sas_schema,
+async def proc_contents_async(table_name, sas_schema=None, wrds_id=None, fpath=None,
+                              encoding="utf-8"):
+    """Async version of `proc_contents()`."""
+    from .stream import get_process_stream_async
+    sas_code, wrds_id = _proc_contents_code(table_name, sas_schema, wrds_id, fpath)
+
+    async with get_process_stream_async(
+        sas_code,
         wrds_id=wrds_id,
+        fpath=fpath,
         encoding=encoding,
-    )
+    ) as stream:
+        return await stream.readlines()
+
+def _parse_modified(contents, table_name, sas_schema):
+    """Return the last-modified string from PROC CONTENTS output, or None."""
     if not contents:
         print(f"Table {sas_schema}.{table_name} not found.")
         return None
@@ -112,6 +127,30 @@ def get_modified_str(table_name, sas_schema, wrds_id=None, encoding="utf-8"):
 
     return modified.strip()
 
+def get_modified_str(table_name, sas_schema, wrds_id=None, encoding="utf-8"):
+    contents = proc_contents(
+        table_name=table_name,
+        sas_schema=sas_schema,
+        wrds_id=wrds_id,
+        encoding=encoding,
+    )
+    return _parse_modified(contents, table_name, sas_schema)
+
+async def get_modified_str_async(table_name, sas_schema, wrds_id=None, encoding="utf-8"):
+    """
+    Async version of `get_modified_str()`.
+
+    Many freshness checks can run at once in one event loop, e.g., with
+    `asyncio.gather()`; each is a separate SAS job on WRDS.
+    """
+    contents = await proc_contents_async(
+        table_name=table_name,
+        sas_schema=sas_schema,
+        wrds_id=wrds_id,
+        encoding=encoding,
+    )
+    return _parse_modified(contents, table_name, sas_schema)
+
 def get_table_sql(
     table_name,
     schema,                    # target Postgres schema
@@ -233,6 +272,47 @@ def get_table_metadata(
     ) as stream:
         text = stream.read()
 
+    return _parse_metadata(text, table_name, sas_schema, col_types)
+
+async def get_table_metadata_async(
+    table_name,
+    wrds_id=None,
+    fpath=None,
+    drop=None,
+    keep=None,
+    rename=None,
+    sas_schema=None,
+    encoding="utf-8",
+    col_types=None,
+):
+    """Async version of `get_table_metadata()`."""
+    if sas_schema is None:
+        sas_schema = "work"
+
+    sas_code = make_sas_code(
+        table_name=table_name,
+        schema=sas_schema,
+        fpath=fpath,
+        drop=drop,
+        keep=keep,
+        rename=rename,
+        sas_schema=sas_schema,
+    )
+
+    from .stream import get_process_stream_async
+
+    async with get_process_stream_async(
+        sas_code,
+        wrds_id=wrds_id,
+        fpath=fpath,
+        encoding=encoding,
+    ) as stream:
+        text = await stream.read()
+
+    return _parse_metadata(text, table_name, sas_schema, col_types)
+
+def _parse_metadata(text, table_name, sas_schema, col_types=None):
+    """Return names and PostgreSQL types from the output of `make_sas_code()`."""
     reader = csv.DictReader(io.StringIO(text))
     rows = [{k.strip().lower(): v for k, v in row.items()} for row in reader]
 
@@ -290,7 +370,63 @@ def code_row_dict(row):
 
     return "text"
 
-def get_wrds_tables(schema, wrds_id=None, encoding="utf-8"):
+@dataclass
+class CatalogEntry:
+    """
+    One member of a SAS library, from `dictionary.tables`.
+
+    `last_modified` is `modate` formatted like `get_modified_str()`, for
+    comparison with the stamps stored with local copies.
+    """
+
+    schema: str
+    table: str
+    memtype: str
+    nobs: int | None
+    nvar: int | None
+    filesize: int | None
+    modate: datetime | None
+    crdate: datetime | None
+
+    @property
+    def last_modified(self) -> str:
+        if self.modate is None:
+            return ""
+        return self.modate.strftime("Last modified: %m/%d/%Y %H:%M:%S")
+
+def _catalog_value(value, kind):
+    value = (value or "").strip()
+    if not value or value == ".":
+        return None
+    if kind is int:
+        return int(float(value))
+    return datetime.fromisoformat(value)
+
+def get_wrds_catalog(schema, wrds_id=None, encoding="utf-8"):
+    """
+    Return the members of a WRDS SAS library with their sizes and dates.
+
+    One SAS job exports `memname`, `memtype`, `nobs`, `nvar`, `filesize`,
+    `modate` and `crdate` from `dictionary.tables` as CSV.
+
+    Parameters
+    ----------
+    schema: string
+        SAS library name (e.g., "crsp").
+
+    wrds_id: string [Optional]
+        The WRDS ID to be used to access WRDS SAS.
+        Default is to use the environment value `WRDS_ID`.
+
+    Returns
+    -------
+    list of `CatalogEntry`, ordered by table name. Table names are in lower
+    case; `nobs` is None for views.
+
+    Examples
+    ----------
+    >>> big = [e for e in get_wrds_catalog("crsp") if e.filesize > 10e9]
+    """
     if wrds_id is None:
         wrds_id = os.environ.get("WRDS_ID")
     if wrds_id is None:
@@ -300,29 +436,39 @@ def get_wrds_tables(schema, wrds_id=None, encoding="utf-8"):
 
     sas_code = f"""
         proc sql;
-            SELECT memname
-            FROM dictionary.tables
-            WHERE libname = "{lib}"
-            ORDER BY memname;
+            create table _catalog as
+            select memname, memtype, nobs, nvar, filesize,
+                   modate format=E8601DT19., crdate format=E8601DT19.
+            from dictionary.tables
+            where libname = "{lib}"
+            order by memname;
         quit;
+
+        proc export data=_catalog outfile=stdout dbms=csv replace;
+        run;
     """
 
     with get_process_stream(sas_code, wrds_id=wrds_id, encoding=encoding) as stream:
         text = stream.read()
 
-    # Parse memnames from listing output. This is robust enough for PROC SQL output.
-    # It looks for "words" in the memname column; filters out headers/blank lines.
-    names = []
-    for line in text.splitlines():
-        line = line.strip()
-        if not line:
-            continue
-        if line in {"MEMNAME"}:
+    entries = []
+    for row in csv.DictReader(io.StringIO(text)):
+        row = {k.strip().lower(): v for k, v in row.items()}
+        if not (row.get("memname") or "").strip():
             continue
-        if "The SAS System" in line or "Monday" in line or "Tuesday" in line:
-            continue
-        # memname is usually a single token
-        if re.fullmatch(r"[A-Z0-9_]+", line):
-            names.append(line)
+        entries.append(CatalogEntry(
+            schema=schema.lower(),
+            table=row["memname"].strip().lower(),
+            memtype=(row.get("memtype") or "").strip().upper(),
+            nobs=_catalog_value(row.get("nobs"), int),
+            nvar=_catalog_value(row.get("nvar"), int),
+            filesize=_catalog_value(row.get("filesize"), int),
+            modate=_catalog_value(row.get("modate"), datetime),
+            crdate=_catalog_value(row.get("crdate"), datetime),
+        ))
+    return entries
 
-    return names
+def get_wrds_tables(schema, wrds_id=None, encoding="utf-8"):
+    """Return the member names (upper case) of a WRDS SAS library."""
+    return [entry.table.upper()
+            for entry in get_wrds_catalog(schema, wrds_id=wrds_id, encoding=encoding)]
@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import re
+from typing import TextIO
+
+from .._utils import IterStream
+
+# A CSV field as written by PROC EXPORT: quoted (with "" escapes) or bare.
+_FIELD = r'(?:"(?:[^"]|"")*"|[^,"\n]*)'
+_QUOTED = re.compile(r'"[^"]*"')
+
+# SAS prints special missing values as the bare letter (A-Z or _); the
+# `.A` form is also accepted.
+_MISSING = r"\.?[A-Z_]"
+# Maps special-missing letters to "L" and LF to ",", so a candidate field
+# shows up as ",L," or ",.L," in the translated text (a fast substring test).
+_CLASSES = str.maketrans({**{c: "L" for c in "ABCDEFGHIJKLMNOPQRSTUVWXYZ_"}, "\n": ","})
+_DOTTED = re.compile(r"(?:^|(?<=[,\n]))\.[A-Z_](?=[,\n]|$)")
+# A record that may hold a special missing value, and the values themselves.
+_CANDIDATE = re.compile(rf"(?:^|,){_MISSING}(?=,|$)")
+_MISSING_VALUES = frozenset(
+    f"{dot}{c}" for c in "ABCDEFGHIJKLMNOPQRSTUVWXYZ_" for dot in ("", ".")
+)
+_FIELDS = re.compile(rf"(?:^|,)({_FIELD})")
+
+def record_end(text: str | bytes) -> int:
+    """
+    Return the offset just past the last complete CSV record in `text`.
+
+    A record ends at a newline that is outside double quotes. Quote parity is
+    computed with `str.count()` over whole spans, so the cost is a few bulk
+    scans regardless of where the quotes are. `text` may also be bytes.
+    """
+    newline, quote = ("\n", '"') if isinstance(text, str) else (b"\n", b'"')
+    end = text.rfind(newline)
+    if quote not in text:
+        return end + 1
+
+    quotes = text.count(quote, 0, end)
+    while end >= 0 and quotes % 2:
+        prev = text.rfind(newline, 0, end)
+        quotes -= text.count(quote, prev + 1, end)
+        end = prev
+    return end + 1
+
+def count_records(text: str) -> int:
+    """Count newline-terminated CSV records in `text` (newlines outside quotes)."""
+    if '"' not in text:
+        return text.count("\n")
+    return "".join(text.split('"')[0::2]).count("\n")
+
+def _fix_cr(text, n_delims, final):
+    """
+    Strip CR everywhere and LF inside fields; return (fixed, incomplete tail).
+
+    LFs inside quoted fields are removed directly. LFs in unquoted fields are
+    detected by comparing delimiter and newline counts for the whole buffer;
+    only if they disagree are lines re-joined until each has `n_delims`
+    delimiters.
+    """
+    text = text.replace("\r", "")
+
+    if '"' in text:
+        parts = text.split('"')
+        inside = parts[1::2]
+        if "\n" in "".join(inside):
+            parts[1::2] = [p.replace("\n", "") for p in inside]
+            text = '"'.join(parts)
+        unquoted = "".join(parts[0::2])
+    else:
+        unquoted = text
+
+    n_records = unquoted.count("\n") + (0 if unquoted.endswith("\n") else 1)
+    if unquoted.count(",") == n_delims * n_records:
+        return text, ""
+
+    # Slow path: some record was split by a bare LF.
+    lines = text.split("\n")
+    if text.endswith("\n"):
+        lines.pop()
+
+    out = []
+    pending, count = None, 0
+    for line in lines:
+        c = _QUOTED.sub("", line).count(",") if '"' in line else line.count(",")
+        if pending is None:
+            pending, count = line, c
+        else:
+            pending, count = pending + line, count + c
+        if count >= n_delims:
+            out.append(pending)
+            pending = None
+
+    fixed = "".join(line + "\n" for line in out)
+    if pending is None:
+        return fixed, ""
+    if final:
+        return fixed + pending + "\n", ""
+    return fixed, pending + "\n"
+
+def _fix_record(record, columns):
+    """Blank special missing values in fields `columns` of one CSV record."""
+    if '"' in record:
+        fields = _FIELDS.findall(record)
+        if ",".join(fields) != record:  # not well-formed CSV: leave as is
+            return record
+    else:
+        fields = record.split(",")
+    n = len(fields)
+    for k in columns:
+        if k < n and fields[k] in _MISSING_VALUES:
+            fields[k] = ""
+    return ",".join(fields)
+
+def _fix_missing(text, columns):
+    """
+    Blank special missing values in `text` (complete records only).
+
+    `columns` holds the indices of non-character columns, or is None if
+    column types are unknown. Each record holding a candidate value is split
+    into fields once, so the cost does not grow with the number of columns
+    checked.
+    """
+    probe = "," + text.translate(_CLASSES) + ","
+    if ",L," not in probe and ",.L," not in probe:
+        return text
+
+    if columns is not None:
+        if not columns:
+            return text
+        lines = text.split("\n")
+        if '"' not in text:
+            return "\n".join(_fix_record(line, columns) if _CANDIDATE.search(line) else line
+                             for line in lines)
+        # Quoted fields may span lines: join lines until quotes balance.
+        out, pending = [], None
+        for line in lines:
+            if pending is not None:
+                line = pending + "\n" + line
+            if line.count('"') % 2:
+                pending = line
+                continue
+            pending = None
+            out.append(_fix_record(line, columns) if _CANDIDATE.search(line) else line)
+        if pending is not None:
+            out.append(pending)
+        return "\n".join(out)
+
+    # Column types unknown: only blank the unambiguous `.A` form, and only
+    # outside quoted fields.
+    if '"' not in text:
+        return _DOTTED.sub("", text)
+    parts = text.split('"')
+    parts[0::2] = [_DOTTED.sub("", p) if "." in p else p for p in parts[0::2]]
+    return '"'.join(parts)
+
+def _normalized_chunks(stream, fix_cr, fix_missing, col_types, chunk_size):
+    header = stream.readline()
+    if not header:
+        return
+    header = header.replace("\r", "")
+    yield header
+
+    names = header.rstrip("\n").lower().split(",")
+    n_delims = len(names) - 1
+
+    columns = None
+    if col_types:
+        # Special missing values can only occur in non-character columns.
+        columns = [
+            k for k, name in enumerate(names)
+            if (col_types.get(name) or "text").strip().lower() != "text"
+        ]
+
+    carry = ""
+    while True:
+        data = stream.read(chunk_size)
+        final = not data
+        text = carry + data
+        carry = ""
+        if final and not text:
+            break
+        if not final:
+            cut = record_end(text)
+            text, carry = text[:cut], text[cut:]
+            if not text:
+                continue
+
+        if fix_cr:
+            text, tail = _fix_cr(text, n_delims, final)
+            carry = tail + carry
+        if fix_missing:
+            text = _fix_missing(text, columns)
+
+        if text:
+            yield text
+        if final:
+            break
+
+def normalize_stream(
+    stream: TextIO,
+    fix_cr: bool = True,
+    fix_missing: bool = True,
+    col_types: dict[str, str] | None = None,
+    chunk_size: int = 1 << 22,
+) -> TextIO:
+    """
+    Wrap a SAS CSV text stream, fixing embedded CR/LF and special missing values.
+
+    This does on the client what `fix_cr` and `fix_missing` otherwise ask SAS
+    to do on WRDS for every row. Text is processed in buffers of about
+    `chunk_size` characters, cut at record boundaries outside quotes, using
+    whole-buffer string and regex operations.
+
+    Parameters
+    ----------
+    stream:
+        Text stream whose first line is the CSV header.
+    fix_cr:
+        Remove CR characters, and LF characters inside fields (quoted or not).
+    fix_missing:
+        Replace special missing values (`A`-`Z`, `_`, or `.A` etc.) with empty
+        fields.
+    col_types:
+        Column types keyed by lower-case name. If given, special missing
+        values are only blanked in non-`text` columns; otherwise only the
+        unambiguous `.A` form is blanked.
+
+    Returns
+    -------
+    A read-only text stream supporting `read()` and `readline()`.
+    """
+    return IterStream(
+        _normalized_chunks(stream, fix_cr, fix_missing, col_types, chunk_size)
+    )
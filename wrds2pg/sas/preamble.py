@@ -6,7 +6,7 @@ ods html close;
 ods pdf close;
 ods results off;
 
-options nodate nonumber nocenter;
+options nodate nonumber nocenter fullstimer;
 """
 
 def with_stdout_preamble(sas_code: str) -> str:
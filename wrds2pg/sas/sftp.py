@@ -0,0 +1,388 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, TextIO
+
+import paramiko
+
+from .._utils import IterStream
+from ..progress import as_progress
+from .metadata import get_table_metadata
+from .ssh import SSHConfig
+
+# SAS stores dates as days and datetimes/times as seconds since 1960-01-01.
+_SAS_EPOCH = "1960-01-01"
+
+def get_sas_file_path(table_name, sas_schema, wrds_id=None, encoding="utf-8"):
+    """Return the path of the `.sas7bdat` file backing `sas_schema.table_name` on WRDS."""
+    from .stream import get_process_stream  # local import to avoid circular import
+
+    if wrds_id is None:
+        wrds_id = os.environ.get("WRDS_ID")
+    if wrds_id is None:
+        raise ValueError("You must provide `wrds_id` or set the `WRDS_ID` environment variable.")
+
+    sas_code = f"""
+        proc sql;
+            create table _path as
+            select path, lowcase(memname) as memname
+            from dictionary.members
+            where libname = "{sas_schema.upper()}"
+                and memname = "{table_name.upper()}"
+                and memtype = "DATA";
+        quit;
+
+        proc export data=_path outfile=stdout dbms=csv replace;
+        run;
+    """
+
+    with get_process_stream(sas_code, wrds_id=wrds_id, encoding=encoding) as stream:
+        text = stream.read()
+
+    rows = list(csv.DictReader(io.StringIO(text)))
+    if not rows:
+        raise RuntimeError(f"No SAS data file found for {sas_schema}.{table_name}.")
+    row = {k.strip().lower(): v.strip() for k, v in rows[0].items()}
+    return f"{row['path']}/{row['memname']}.sas7bdat"
+
+def _fetch_range(config, wrds_id, remote_path, part_file, start, end,
+                 max_retries, retry_wait, progress=None):
+    """Download bytes [start, end) of `remote_path`, appending to `part_file`."""
+    attempt = 0
+    while True:
+        done = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+        if start + done >= end:
+            return
+        client = None
+        try:
+            client = config.connect(wrds_id)
+            with client.open_sftp() as sftp, \
+                    sftp.open(remote_path, "rb") as remote, \
+                    open(part_file, "ab") as local:
+                remote.seek(start + done)
+                remote.prefetch(file_size=end)
+                remaining = end - start - done
+                while remaining > 0:
+                    data = remote.read(min(remaining, 1 << 20))
+                    if not data:
+                        raise EOFError(f"Unexpected end of {remote_path}.")
+                    local.write(data)
+                    remaining -= len(data)
+            return
+        except (OSError, EOFError, paramiko.SSHException) as e:
+            error = e
+        finally:
+            if client is not None:
+                client.close()
+
+        attempt += 1
+        if attempt > max_retries:
+            raise RuntimeError(
+                f"Giving up on {remote_path} after {max_retries} retries."
+            ) from error
+        if progress is not None:
+            progress.count("retries")
+        print(f"SFTP transfer interrupted ({error}); resuming.")
+        time.sleep(retry_wait)
+
+def fetch_sas_file(
+    remote_path,
+    local_path,
+    wrds_id=None,
+    ssh_config=None,
+    n_workers=4,
+    max_retries=5,
+    retry_wait=5,
+    progress=None,
+):
+    """
+    Download a file from WRDS over SFTP using concurrent range requests.
+
+    The file is split into `n_workers` byte ranges, each fetched on its own
+    SSH connection into a part file next to `local_path`. If a connection
+    drops, that range reconnects and resumes from the bytes already on disk.
+    Parts left by an interrupted call are reused by a later call for the same
+    remote file (same size and modification time).
+
+    Returns
+    -------
+    Path of the completed local file.
+    """
+    if wrds_id is None:
+        wrds_id = os.environ.get("WRDS_ID")
+    if wrds_id is None:
+        raise ValueError("You must provide `wrds_id` or set the `WRDS_ID` environment variable.")
+    if ssh_config is None:
+        ssh_config = SSHConfig.from_env()
+
+    local_path = Path(local_path)
+    local_path.parent.mkdir(parents=True, exist_ok=True)
+
+    client = ssh_config.connect(wrds_id)
+    try:
+        with client.open_sftp() as sftp:
+            st = sftp.stat(remote_path)
+    finally:
+        client.close()
+
+    n_workers = max(1, min(n_workers, st.st_size // (1 << 20) or 1))
+    step = -(-st.st_size // n_workers)
+    ranges = [(i * step, min((i + 1) * step, st.st_size)) for i in range(n_workers)]
+
+    # Throw away parts from a different version of the remote file.
+    state_file = local_path.with_name(local_path.name + ".parts.json")
+    state = {"size": st.st_size, "mtime": st.st_mtime, "ranges": ranges}
+    if state_file.exists() and json.loads(state_file.read_text()) != state:
+        for part in local_path.parent.glob(local_path.name + ".part*"):
+            part.unlink()
+    state_file.write_text(json.dumps(state))
+
+    parts = [local_path.with_name(f"{local_path.name}.part{i}") for i in range(n_workers)]
+
+    with ThreadPoolExecutor(max_workers=n_workers) as pool:
+        futures = [
+            pool.submit(_fetch_range, ssh_config, wrds_id, remote_path,
+                        str(part), start, end, max_retries, retry_wait, progress)
+            for part, (start, end) in zip(parts, ranges)
+        ]
+        for future in futures:
+            future.result()
+
+    with open(local_path, "wb") as out:
+        for part in parts:
+            with open(part, "rb") as f:
+                shutil.copyfileobj(f, out, 1 << 24)
+    for part in parts:
+        part.unlink()
+    state_file.unlink()
+
+    return local_path
+
+def _parse_rename(rename):
+    """Map old -> new (lower case) for a SAS `rename=` snippet like "a=b c=d"."""
+    if not rename:
+        return {}
+    return {old.lower(): new.lower()
+            for old, new in re.findall(r"(\w+)\s*=\s*(\w+)", rename)}
+
+def _read_pyreadstat(path, row_offset, row_limit, usecols, encoding):
+    import pyreadstat
+
+    df, _ = pyreadstat.read_sas7bdat(
+        path,
+        row_offset=row_offset,
+        row_limit=row_limit,
+        usecols=usecols,
+        encoding=encoding,
+        disable_datetime_conversion=True,
+    )
+    return df
+
+def read_sas7bdat_chunks(path, columns=None, chunksize=100_000, n_workers=None,
+                         obs=None, encoding=None, skip=0):
+    """
+    Yield DataFrames of `chunksize` rows decoded from a local `.sas7bdat` file.
+
+    If `pyreadstat` is installed, chunks are decoded in parallel across a
+    process pool of `n_workers` (default: CPU count). Otherwise chunks are
+    decoded sequentially with `pandas.read_sas()`. Chunks are yielded in
+    file order. Column names are returned as stored in the file.
+
+    The first `skip` rows are left out; `obs` counts rows from the start of
+    the file, like the SAS `obs=` option.
+    """
+    try:
+        import pyreadstat
+    except ImportError:
+        pyreadstat = None
+
+    if pyreadstat is None:
+        import pandas as pd
+
+        reader = pd.read_sas(path, format="sas7bdat", chunksize=chunksize,
+                             encoding=encoding or "infer")
+        with reader:
+            seen = 0
+            for df in reader:
+                start = seen
+                seen += len(df)
+                if seen <= skip:
+                    continue
+                if columns is not None:
+                    lookup = {c.lower(): c for c in df.columns}
+                    df = df[[lookup[c.lower()] for c in columns]]
+                stop = len(df) if obs is None else min(len(df), obs - start)
+                df = df.iloc[max(skip - start, 0):stop]
+                if len(df):
+                    yield df
+                if obs is not None and seen >= obs:
+                    return
+        return
+
+    _, meta = pyreadstat.read_sas7bdat(path, metadataonly=True, encoding=encoding)
+    n_rows = meta.number_rows
+    if obs is not None:
+        n_rows = min(n_rows, obs)
+    if columns is not None:
+        lookup = {c.lower(): c for c in meta.column_names}
+        columns = [lookup[c.lower()] for c in columns]
+
+    offsets = range(skip, n_rows, chunksize)
+    n_workers = n_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        # Keep a bounded number of chunks in flight so memory stays flat.
+        pending = []
+        for offset in offsets:
+            limit = min(chunksize, n_rows - offset)
+            pending.append(pool.submit(_read_pyreadstat, str(path), offset,
+                                       limit, columns, encoding))
+            if len(pending) >= 2 * n_workers:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+def _format_column(values, pg_type):
+    """Format one column the way the SAS CSV export would for `pg_type`."""
+    import pandas as pd
+
+    base = re.sub(r"\(.*\)$", "", (pg_type or "").strip().lower())
+    is_datetime = pd.api.types.is_datetime64_any_dtype(values)
+
+    if base == "date":
+        if not is_datetime:
+            values = pd.Timestamp(_SAS_EPOCH) + pd.to_timedelta(values, unit="D")
+        return values.dt.strftime("%Y-%m-%d")
+    if base == "timestamp":
+        if not is_datetime:
+            values = pd.Timestamp(_SAS_EPOCH) + pd.to_timedelta(values, unit="s")
+        return values.dt.strftime("%Y-%m-%dT%H:%M:%S")
+    if base == "time":
+        if is_datetime:
+            return values.dt.strftime("%H:%M:%S")
+        seconds = values.round().astype("Int64")
+        return (
+            (seconds // 3600).astype("string").str.zfill(2) + ":"
+            + (seconds % 3600 // 60).astype("string").str.zfill(2) + ":"
+            + (seconds % 60).astype("string").str.zfill(2)
+        )
+    if base in {"integer", "bigint", "smallint"}:
+        return values.round().astype("Int64")
+    return values
+
+def _chunks_to_csv(chunks, names, col_types, fix_cr=False):
+    """Yield CSV text (header first) for DataFrame `chunks`."""
+    import pandas as pd
+
+    header = True
+    for df in chunks:
+        df = df.copy()
+        df.columns = names
+        for name in names:
+            col = df[name]
+            if fix_cr and (col.dtype == object or pd.api.types.is_string_dtype(col)):
+                col = col.str.replace(r"[\r\n]", "", regex=True)
+            df[name] = _format_column(col, col_types.get(name))
+        text = df.to_csv(index=False, header=header, lineterminator="\n")
+        if len(names) == 1:
+            # pandas writes "" for an empty single-column row; SAS writes nothing.
+            text = re.sub(r'(?m)^""$', "", text)
+        yield text
+        header = False
+
+@contextmanager
+def get_sftp_process_stream(
+    table_name,
+    schema,
+    wrds_id=None,
+    drop=None,
+    keep=None,
+    fix_cr=False,
+    obs=None,
+    rename=None,
+    where=None,
+    col_types=None,
+    encoding="utf-8",
+    sas_encoding=None,
+    ssh_config=None,
+    firstobs=None,
+    progress=None,
+    download_dir=None,
+    n_workers=4,
+    chunksize=100_000,
+) -> Iterator[TextIO]:
+    """
+    Yield a CSV text stream for a WRDS table fetched as a raw `.sas7bdat` file.
+
+    This is the `source="sftp"` counterpart of `get_wrds_process_stream()`:
+    the SAS data file is downloaded over SFTP (see `fetch_sas_file()`) and
+    decoded locally (see `read_sas7bdat_chunks()`), so no SAS CPU time is
+    spent formatting text on WRDS. Column names and types come from
+    `get_table_metadata()` and values are formatted to match the SAS export.
+
+    `drop`, `keep`, `rename`, `obs` and `firstobs` are applied locally.
+    Special missing values become plain missing values, so `fix_missing` is
+    implied, and `fix_cr` strips CR/LF from character columns. SAS `where`
+    clauses cannot be evaluated locally and raise `ValueError`.
+
+    If `download_dir` is given, the file is kept there, and an interrupted
+    download resumes on the next call. Otherwise a temporary directory is
+    used and removed afterwards.
+
+    `progress` receives the `sas_metadata` and `sftp_fetch` stages.
+    """
+    progress = as_progress(progress)
+
+    if where:
+        raise ValueError("`where` is not supported with `source='sftp'`.")
+
+    if wrds_id is None:
+        wrds_id = os.environ.get("WRDS_ID")
+    if wrds_id is None:
+        raise ValueError("You must provide `wrds_id` or set the `WRDS_ID` environment variable.")
+
+    with progress.timed("sas_metadata"):
+        meta = get_table_metadata(
+            table_name=table_name,
+            wrds_id=wrds_id,
+            drop=drop,
+            keep=keep,
+            rename=rename,
+            sas_schema=schema,
+            encoding=encoding,
+            col_types=col_types,
+        )
+        remote_path = get_sas_file_path(table_name, schema, wrds_id=wrds_id,
+                                        encoding=encoding)
+    names = meta["names"]
+    inverse = {new: old for old, new in _parse_rename(rename).items()}
+    source_cols = [inverse.get(n, n) for n in names]
+
+    tmp_dir = None
+    if download_dir is None:
+        tmp_dir = download_dir = tempfile.mkdtemp(prefix="wrds2pg_")
+    local_path = Path(download_dir) / schema / Path(remote_path).name
+
+    try:
+        with progress.timed("sftp_fetch"):
+            fetch_sas_file(remote_path, local_path, wrds_id=wrds_id,
+                           ssh_config=ssh_config, n_workers=n_workers,
+                           progress=progress)
+        progress.add("sftp_fetch", bytes=os.path.getsize(local_path))
+        chunks = read_sas7bdat_chunks(local_path, columns=source_cols,
+                                      chunksize=chunksize, obs=obs,
+                                      encoding=sas_encoding,
+                                      skip=(firstobs or 1) - 1)
+        yield IterStream(_chunks_to_csv(chunks, names, meta["col_types"], fix_cr=fix_cr))
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
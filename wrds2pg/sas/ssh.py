@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import os
+import warnings
+from dataclasses import dataclass, field
+
+import paramiko
+
+WRDS_SSH_HOST = "wrds-cloud-sshkey.wharton.upenn.edu"
+
+# Short names accepted in `SSHConfig.ciphers`, mapped to their SSH wire names.
+_CIPHER_ALIASES = {
+    "aes128-gcm": "aes128-gcm@openssh.com",
+    "aes256-gcm": "aes256-gcm@openssh.com",
+    "chacha20": "chacha20-poly1305@openssh.com",
+    "chacha20-poly1305": "chacha20-poly1305@openssh.com",
+}
+
+@dataclass
+class SSHConfig:
+    """
+    Connection settings for the SSH link to WRDS.
+
+    Parameters
+    ----------
+    host : str
+        SSH host. Defaults to the WRDS public-key endpoint.
+    port : int
+        SSH port.
+    window_size : int
+        Channel window size in bytes. The window bounds how much data WRDS
+        can send before waiting for an acknowledgement, so on high-latency
+        links it should be at least the bandwidth-delay product.
+    max_packet_size : int
+        Maximum SSH packet size in bytes that we advertise for channels.
+    ciphers : tuple of str
+        Preferred ciphers, most preferred first (e.g., "aes128-gcm",
+        "aes128-ctr"). Ciphers that paramiko cannot speak are skipped with a
+        warning; paramiko's remaining defaults are kept as fallbacks so
+        negotiation cannot fail because of this setting.
+    keepalive : int
+        Seconds between keepalive packets (0 disables keepalives).
+    rekey_bytes : int, optional
+        Bytes transferred before the session is re-keyed.
+        Default is paramiko's limit (512 MiB).
+    rekey_packets : int, optional
+        Packets transferred before the session is re-keyed.
+    compress : bool
+        Whether to request SSH compression. CSV compresses well, but zlib
+        on a single channel is usually slower than the link.
+    timeout : float, optional
+        TCP connect timeout in seconds.
+    """
+
+    host: str = WRDS_SSH_HOST
+    port: int = 22
+    window_size: int = 16 * 1024 * 1024
+    max_packet_size: int = 32768
+    ciphers: tuple[str, ...] = field(
+        default_factory=lambda: ("aes128-gcm@openssh.com", "aes128-ctr")
+    )
+    keepalive: int = 60
+    rekey_bytes: int | None = None
+    rekey_packets: int | None = None
+    compress: bool = False
+    timeout: float | None = None
+
+    @classmethod
+    def from_env(cls) -> "SSHConfig":
+        """
+        Build a config from `WRDS_SSH_*` environment variables.
+
+        Recognized variables are `WRDS_SSH_HOST`, `WRDS_SSH_PORT`,
+        `WRDS_SSH_WINDOW_SIZE`, `WRDS_SSH_MAX_PACKET_SIZE`,
+        `WRDS_SSH_CIPHERS` (comma-separated), `WRDS_SSH_KEEPALIVE`,
+        `WRDS_SSH_REKEY_BYTES`, `WRDS_SSH_REKEY_PACKETS` and
+        `WRDS_SSH_COMPRESS`. Unset variables keep the defaults.
+        """
+        config = cls()
+        env = os.environ
+
+        if env.get("WRDS_SSH_HOST"):
+            config.host = env["WRDS_SSH_HOST"]
+        for name in ["port", "window_size", "max_packet_size", "keepalive",
+                     "rekey_bytes", "rekey_packets"]:
+            value = env.get(f"WRDS_SSH_{name.upper()}")
+            if value:
+                setattr(config, name, int(value))
+        if env.get("WRDS_SSH_CIPHERS"):
+            config.ciphers = tuple(
+                c.strip() for c in env["WRDS_SSH_CIPHERS"].split(",") if c.strip()
+            )
+        if env.get("WRDS_SSH_COMPRESS"):
+            config.compress = env["WRDS_SSH_COMPRESS"].lower() in {"1", "true", "yes"}
+        return config
+
+    def cipher_preference(self, supported) -> tuple[str, ...]:
+        """Return the cipher list to offer, given ciphers paramiko supports."""
+        supported = list(supported)
+        preferred = []
+        for name in self.ciphers:
+            name = _CIPHER_ALIASES.get(name, name)
+            if name not in supported:
+                warnings.warn(f"SSH cipher {name!r} is not supported by paramiko; skipping.")
+            elif name not in preferred:
+                preferred.append(name)
+        return tuple(preferred + [c for c in supported if c not in preferred])
+
+    def make_transport(self, sock, **kwargs) -> paramiko.Transport:
+        """
+        Create an unstarted `paramiko.Transport` on `sock` with these settings.
+
+        Usable as the `transport_factory` argument of `SSHClient.connect()`.
+        """
+        transport = paramiko.Transport(
+            sock,
+            default_window_size=self.window_size,
+            default_max_packet_size=self.max_packet_size,
+            **kwargs,
+        )
+        opts = transport.get_security_options()
+        opts.ciphers = self.cipher_preference(opts.ciphers)
+
+        if self.rekey_bytes is not None:
+            transport.packetizer.REKEY_BYTES = self.rekey_bytes
+        if self.rekey_packets is not None:
+            transport.packetizer.REKEY_PACKETS = self.rekey_packets
+        return transport
+
+    def connect(self, username: str) -> paramiko.SSHClient:
+        """Open an authenticated `SSHClient` for `username`."""
+        client = paramiko.SSHClient()
+        client.load_system_host_keys()
+        client.set_missing_host_key_policy(paramiko.WarningPolicy())
+        client.connect(
+            self.host,
+            port=self.port,
+            username=username,
+            compress=self.compress,
+            timeout=self.timeout,
+            transport_factory=self.make_transport,
+        )
+        if self.keepalive:
+            client.get_transport().set_keepalive(self.keepalive)
+        return client
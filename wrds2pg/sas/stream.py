@@ -1,14 +1,23 @@
 from __future__ import annotations
 
-import io
-import subprocess
-from contextlib import contextmanager
-from typing import Iterator, TextIO
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator, TextIO
 
 import paramiko
 
 from .codegen import get_wrds_sas
+from .log import SASLog
+from .metadata import get_table_metadata
+from .normalize import normalize_stream
 from .preamble import with_stdout_preamble
+from ..progress import InstrumentedStream, as_progress
+from ..spool import get_extract_spool
+from .ssh import SSHConfig
+from .transport import AsyncTextStream, SASConnectionError, get_transport
+
+# Errors after which a transfer can be retried on a fresh connection.
+TRANSIENT_ERRORS = (OSError, EOFError, paramiko.SSHException, SASConnectionError)
 
 @contextmanager
 def get_process_stream(
@@ -16,82 +25,243 @@ def get_process_stream(
     wrds_id: str | None = None,
     fpath: str | None = None,
     encoding: str = "utf-8",
+    ssh_config: SSHConfig | None = None,
+    log: SASLog | None = None,
 ) -> Iterator[TextIO]:
     """
     Yield a text stream containing SAS stdout (typically CSV / listing).
 
+    The SAS log is drained while the job runs and parsed by `log` (a
+    `SASLog`; by default one that only keeps errors for the exception
+    raised if SAS fails).
+
+    In WRDS mode, `ssh_config` controls the SSH connection (host, window and
+    packet sizes, ciphers, keepalive, rekey limits). The default is
+    `SSHConfig.from_env()`. The job runs through the transport returned by
+    `get_transport()`, so `use_transport()` can redirect it.
+
     Intended usage:
         with get_process_stream(sas_code, wrds_id=..., fpath=...) as stream:
             ...
     """
     sas_code = with_stdout_preamble(sas_code)
+    transport = get_transport(wrds_id=wrds_id, fpath=fpath, ssh_config=ssh_config)
+    with transport.open(sas_code, encoding=encoding, log=log) as stream:
+        yield stream
 
-    if fpath is not None:
-        proc = subprocess.Popen(
-            ["sas", "-stdio", "-noterminal"],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            encoding=encoding,
-        )
-        try:
-            assert proc.stdin is not None
-            proc.stdin.write(sas_code)
-            proc.stdin.close()
-
-            assert proc.stdout is not None
-            yield proc.stdout
-
-            rc = proc.wait()
-            if rc != 0:
-                err = proc.stderr.read() if proc.stderr else ""
-                raise RuntimeError(f"SAS exited with code {rc}.\n{err}")
-        finally:
-            if proc.stdout:
-                proc.stdout.close()
-            if proc.stderr:
-                proc.stderr.close()
-            if proc.poll() is None:
-                proc.terminate()
-
-    elif wrds_id is not None:
-        client = paramiko.SSHClient()
-        client.load_system_host_keys()
-        client.set_missing_host_key_policy(paramiko.WarningPolicy())
-        client.connect(
-            "wrds-cloud-sshkey.wharton.upenn.edu",
-            username=wrds_id,
-            compress=False,
-        )
-        try:
-            stdin, stdout, stderr = client.exec_command("qsas -stdio -noterminal")
+@asynccontextmanager
+async def get_process_stream_async(
+    sas_code: str,
+    wrds_id: str | None = None,
+    fpath: str | None = None,
+    encoding: str = "utf-8",
+    ssh_config: SSHConfig | None = None,
+    log: SASLog | None = None,
+) -> AsyncIterator[AsyncTextStream]:
+    """
+    Async version of `get_process_stream()`, yielding an `AsyncTextStream`.
 
-            stdin.write(sas_code)
-            stdin.close()
+    The job runs through the transport's `open_async()`: over SSH, output
+    is read by the event loop without blocking it. Cancelling the task
+    using the stream stops the SAS job.
 
-            text_stdout = io.TextIOWrapper(stdout, encoding=encoding)
-            text_stderr = io.TextIOWrapper(stderr, encoding=encoding)
-            try:
-                yield text_stdout
-            finally:
-                # make sure the remote command finished and surface errors if any
-                exit_status = stdout.channel.recv_exit_status()
-                if exit_status > 4:
-                    text_stdout.close()
-                    text_stderr.close()
-                    raise RuntimeError(f"Remote SAS exited with code {exit_status}.\n{err}")
+    Intended usage:
+        async with get_process_stream_async(sas_code, wrds_id=...) as stream:
+            async for line in stream:
+                ...
+    """
+    sas_code = with_stdout_preamble(sas_code)
+    transport = get_transport(wrds_id=wrds_id, fpath=fpath, ssh_config=ssh_config)
+    async with transport.open_async(sas_code, encoding=encoding or "utf-8",
+                                    log=log) as stream:
+        yield stream
 
-                text_stdout.close()
-                text_stderr.close()
-        finally:
-            client.close()
+@contextmanager
+def get_wrds_process_stream(
+    table_name,
+    schema,
+    wrds_id=None,
+    fpath=None,
+    drop=None,
+    keep=None,
+    fix_cr=False,
+    fix_missing=False,
+    obs=None,
+    rename=None,
+    where=None,
+    encoding=None,
+    sas_encoding=None,
+    stream_encoding="utf-8",
+    ssh_config=None,
+    source="sas",
+    col_types=None,
+    fix_local=False,
+    firstobs=None,
+    progress=None,
+    spool=None,
+    modified=None,
+):
+    """
+    Context manager yielding the CSV export of a SAS table as a text stream.
 
-    else:
-        raise ValueError("Either `wrds_id` or `fpath` must be provided.")
+    With `source="sas"` (the default), SAS formats the table as CSV on WRDS
+    (or locally when `fpath` is given). With `source="sftp"`, the raw
+    `.sas7bdat` file is downloaded and decoded locally instead; see
+    `sftp.get_sftp_process_stream()`.
 
+    With `fix_local=True`, `fix_cr` and `fix_missing` are applied to the
+    stream on the client (see `normalize.normalize_stream()`) rather than by
+    SAS on WRDS. `col_types` lets that filter restrict special missing values
+    to non-character columns.
 
-def get_wrds_process_stream(
+    `firstobs` starts the export at that (1-based) observation; the CSV
+    header is still emitted. It is used to resume interrupted transfers.
+
+    `spool` (see `wrds2pg.spool.get_extract_spool()`) keeps a compressed
+    copy of complete WRDS exports keyed by the table, these options and
+    `modified` (the table's WRDS last-modified string); a later call with
+    the same key replays the copy without contacting WRDS. The spool is
+    used only in WRDS mode, when `modified` is given and `firstobs` is not.
+
+    `progress` (a `Progress` or callback) receives the `sas_metadata`,
+    `sas_export`, `ssh_read` and `decode` stages, or `spool_read` when an
+    extract is replayed. ERRORs, WARNINGs and step times from the SAS log
+    of the export are recorded as its events (see `SASLog`), and the
+    first ERROR stops the transfer with `SASError`.
+    """
+    progress = as_progress(progress)
+    export_kwargs = dict(
+        table_name=table_name, schema=schema, wrds_id=wrds_id, fpath=fpath,
+        drop=drop, keep=keep, fix_cr=fix_cr, fix_missing=fix_missing, obs=obs,
+        rename=rename, where=where, encoding=encoding, sas_encoding=sas_encoding,
+        stream_encoding=stream_encoding, ssh_config=ssh_config, source=source,
+        col_types=col_types, fix_local=fix_local, firstobs=firstobs,
+        progress=progress,
+    )
+
+    spool = get_extract_spool(spool) if modified and fpath is None and firstobs is None else None
+    if spool is None:
+        with _export_stream(**export_kwargs) as stream:
+            yield stream
+        return
+
+    key = spool.key(
+        schema, table_name, modified,
+        drop=drop, keep=keep, fix_cr=fix_cr, fix_missing=fix_missing, obs=obs,
+        rename=rename, where=where, encoding=encoding, sas_encoding=sas_encoding,
+        source=source, fix_local=fix_local,
+        # col_types only shape the CSV when it is built or filtered locally
+        col_types=col_types if source == "sftp" or fix_local else None,
+    )
+    replay = spool.open(key)
+    if replay is not None:
+        with replay:
+            yield InstrumentedStream(replay, progress, "spool_read")
+        return
+
+    # the export closes inside the recording, so its errors discard the extract
+    with spool.recording(key) as record, _export_stream(**export_kwargs) as stream:
+        yield record(stream)
+
+@contextmanager
+def _export_stream(
+    table_name,
+    schema,
+    wrds_id=None,
+    fpath=None,
+    drop=None,
+    keep=None,
+    fix_cr=False,
+    fix_missing=False,
+    obs=None,
+    rename=None,
+    where=None,
+    encoding=None,
+    sas_encoding=None,
+    stream_encoding="utf-8",
+    ssh_config=None,
+    source="sas",
+    col_types=None,
+    fix_local=False,
+    firstobs=None,
+    progress=None,
+):
+    """Yield the CSV export of a SAS table (see `get_wrds_process_stream()`)."""
+    progress = as_progress(progress)
+
+    if source == "sftp":
+        if fpath is not None:
+            raise ValueError("`source='sftp'` is only available in WRDS mode.")
+        from .sftp import get_sftp_process_stream
+
+        with progress.timed("sas_export"), get_sftp_process_stream(
+            table_name=table_name,
+            schema=schema,
+            wrds_id=wrds_id,
+            drop=drop,
+            keep=keep,
+            fix_cr=fix_cr,
+            obs=obs,
+            firstobs=firstobs,
+            rename=rename,
+            where=where,
+            col_types=col_types,
+            encoding=stream_encoding,
+            sas_encoding=sas_encoding,
+            ssh_config=ssh_config,
+            progress=progress,
+        ) as stream:
+            yield InstrumentedStream(stream, progress, "decode")
+        return
+
+    if source != "sas":
+        raise ValueError(f"Unknown source {source!r}; use 'sas' or 'sftp'.")
+
+    normalize = fix_local and (fix_cr or fix_missing)
+
+    with progress.timed("sas_metadata"):
+        if normalize and fix_missing and col_types is None:
+            # without column types only the `.A` form could be blanked
+            col_types = get_table_metadata(
+                table_name=table_name, wrds_id=wrds_id, fpath=fpath, drop=drop,
+                keep=keep, rename=rename, sas_schema=schema,
+                encoding=encoding or "utf-8",
+            )["col_types"]
+        sas_code = get_wrds_sas(
+            table_name=table_name,
+            schema=schema,
+            wrds_id=wrds_id,
+            fpath=fpath,
+            drop=drop,
+            keep=keep,
+            fix_cr=fix_cr and not normalize,
+            fix_missing=fix_missing and not normalize,
+            obs=obs,
+            firstobs=firstobs,
+            rename=rename,
+            where=where,
+            encoding=encoding,
+            sas_encoding=sas_encoding,
+        )
+
+    with progress.timed("sas_export"), get_process_stream(
+        sas_code=sas_code,
+        wrds_id=wrds_id,
+        fpath=fpath,
+        encoding=stream_encoding,
+        ssh_config=ssh_config,
+        log=SASLog(progress=progress, abort_on_error=True),
+    ) as stream:
+        raw = InstrumentedStream(stream, progress, "ssh_read")
+        if normalize:
+            stream = normalize_stream(raw, fix_cr=fix_cr, fix_missing=fix_missing,
+                                      col_types=col_types)
+            yield InstrumentedStream(stream, progress, "decode", inner=raw)
+        else:
+            yield raw
+
+@asynccontextmanager
+async def get_wrds_process_stream_async(
     table_name,
     schema,
     wrds_id=None,
@@ -106,7 +276,31 @@ def get_wrds_process_stream(
     encoding=None,
     sas_encoding=None,
     stream_encoding="utf-8",
+    ssh_config=None,
+    col_types=None,
+    meta=None,
+    progress=None,
 ):
+    """
+    Async version of `get_wrds_process_stream()` for `source="sas"`.
+
+    `meta` is the output of `get_table_metadata()` for the same options,
+    if already known; it saves a SAS job. `progress` receives the
+    `sas_metadata`, `sas_export` and `ssh_read` stages and the SAS log
+    events, and the first ERROR in the log stops the transfer with
+    `SASError`. Spooling, `fix_local` and the SFTP source are available
+    only in the blocking version.
+    """
+    from .metadata import get_table_metadata_async
+
+    progress = as_progress(progress)
+    if meta is None:
+        with progress.timed("sas_metadata"):
+            meta = await get_table_metadata_async(
+                table_name=table_name, wrds_id=wrds_id, fpath=fpath, drop=drop,
+                keep=keep, rename=rename, sas_schema=schema, encoding=stream_encoding,
+                col_types=col_types,
+            )
     sas_code = get_wrds_sas(
         table_name=table_name,
         schema=schema,
@@ -121,11 +315,22 @@ def get_wrds_process_stream(
         where=where,
         encoding=encoding,
         sas_encoding=sas_encoding,
+        table_data=meta,
     )
 
-    return get_process_stream(
-        sas_code=sas_code,
-        wrds_id=wrds_id,
-        fpath=fpath,
-        encoding=stream_encoding,
-    )
+    with progress.timed("sas_export"):
+        async with get_process_stream_async(
+            sas_code=sas_code,
+            wrds_id=wrds_id,
+            fpath=fpath,
+            encoding=stream_encoding,
+            ssh_config=ssh_config,
+            log=SASLog(progress=progress, abort_on_error=True),
+        ) as stream:
+            async def recv():
+                start = time.perf_counter()
+                chunk = await stream.recv()
+                progress.add("ssh_read", bytes=len(chunk), busy=time.perf_counter() - start)
+                return chunk
+
+            yield AsyncTextStream(recv)
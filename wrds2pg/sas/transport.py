@@ -0,0 +1,523 @@
+from __future__ import annotations
+
+import asyncio
+import codecs
+import concurrent.futures
+import io
+import os
+import socket
+import subprocess
+import threading
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Awaitable, Callable, Iterator, TextIO
+
+from .log import SASLog
+from .ssh import SSHConfig
+
+class SASConnectionError(RuntimeError):
+    """The SSH connection to WRDS ended before SAS reported an exit status."""
+
+class AsyncTextStream:
+    """
+    Text stream of SAS stdout for asyncio code, yielded by `SASTransport.open_async()`.
+
+    `recv` is a coroutine function returning the next chunk of text, or ""
+    at the end of the stream. Iterating over the stream yields lines.
+    """
+
+    def __init__(self, recv: Callable[[], Awaitable[str]]):
+        self._recv = recv
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    async def recv(self) -> str:
+        """Return the next chunk of text as received ("" at the end)."""
+        if self._pos < len(self._buffer):
+            chunk = self._buffer[self._pos:] if self._pos else self._buffer
+            self._buffer, self._pos = "", 0
+            return chunk
+        if self._eof:
+            return ""
+        chunk = await self._recv()
+        self._eof = not chunk
+        return chunk
+
+    async def read(self, size: int = -1) -> str:
+        """Return up to `size` characters ("" at the end), or the rest of the stream."""
+        if size is None or size < 0:
+            parts = []
+            while chunk := await self.recv():
+                parts.append(chunk)
+            return "".join(parts)
+        if self._pos < len(self._buffer):
+            end = min(self._pos + size, len(self._buffer))
+            data, self._pos = self._buffer[self._pos:end], end
+            return data
+        chunk = await self.recv()
+        if len(chunk) > size:
+            self._buffer, self._pos = chunk, size
+        return chunk[:size]
+
+    async def readline(self) -> str:
+        parts = []
+        while True:
+            if self._pos >= len(self._buffer):
+                chunk = await self.recv()
+                if not chunk:
+                    break
+                self._buffer, self._pos = chunk, 0
+            i = self._buffer.find("\n", self._pos)
+            if i >= 0:
+                parts.append(self._buffer[self._pos:i + 1])
+                self._pos = i + 1
+                break
+            parts.append(self._buffer[self._pos:])
+            self._buffer, self._pos = "", 0
+        return "".join(parts)
+
+    async def readlines(self) -> list[str]:
+        return [line async for line in self]
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        line = await self.readline()
+        if not line:
+            raise StopAsyncIteration
+        return line
+
+class _LogFeeder:
+    """Decode bytes of a SAS log and pass them to a `SASLog` a line at a time."""
+
+    def __init__(self, log: SASLog, encoding: str):
+        self.log = log
+        self.decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        self.partial = ""
+
+    def feed(self, data: bytes) -> None:
+        *lines, self.partial = (self.partial + self.decoder.decode(data)).split("\n")
+        for line in lines:
+            self.log.feed(line + "\n")
+
+    def close(self) -> None:
+        rest = self.partial + self.decoder.decode(b"", final=True)
+        self.partial = ""
+        if rest:
+            self.log.feed(rest)
+        self.log.close()
+
+async def _run_blocking(func, *args, cleanup=None):
+    """
+    Run `func(*args)` on a worker thread and return its result.
+
+    If the caller is cancelled first, `cleanup` is called with the result
+    once it arrives (e.g., to close a connection nobody will use).
+    """
+    future = asyncio.get_running_loop().run_in_executor(None, func, *args)
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        if cleanup is not None:
+            future.add_done_callback(
+                lambda f: None if f.cancelled() or f.exception() else cleanup(f.result()))
+        raise
+
+class _Stopped(Exception):
+    """The async consumer of a threaded SAS job has gone away."""
+
+class SASTransport(ABC):
+    """
+    Runs a SAS program and streams its standard output.
+
+    Subclasses implement `open()`, a context manager that yields a text
+    stream of SAS stdout and raises when leaving the `with` block if SAS
+    failed. The SAS log goes to `log` (a `SASLog`), if given, while the
+    job runs. `get_process_stream()` (and so every function in this package
+    that runs SAS) goes through a transport chosen by `get_transport()`.
+
+    `open_async()` is the same for asyncio code (`get_process_stream_async()`).
+    """
+
+    @abstractmethod
+    def open(self, sas_code: str, encoding: str = "utf-8",
+             log: SASLog | None = None) -> Iterator[TextIO]:
+        """Context manager yielding SAS stdout as a text stream."""
+
+    @asynccontextmanager
+    async def open_async(self, sas_code: str, encoding: str = "utf-8",
+                         log: SASLog | None = None, chunk_size: int = 1 << 20,
+                         max_chunks: int = 4) -> AsyncIterator[AsyncTextStream]:
+        """
+        Async version of `open()`, yielding an `AsyncTextStream`.
+
+        This default runs `open()` on a thread that passes chunks of
+        `chunk_size` characters to the event loop through a queue of at most
+        `max_chunks` chunks, so SAS output is read no faster than it is
+        consumed. The end of the stream is seen only after `open()` exits
+        cleanly. If the `async with` block is left early (an error, or the
+        task is cancelled), the thread stops at its next chunk and leaves
+        `open()` with an error, which stops the SAS job as in blocking code.
+        """
+        loop = asyncio.get_running_loop()
+        q: asyncio.Queue = asyncio.Queue(maxsize=max_chunks)
+        stop = threading.Event()
+        done = loop.create_future()
+
+        def put(item):
+            future = asyncio.run_coroutine_threadsafe(q.put(item), loop)
+            while True:
+                try:
+                    return future.result(timeout=0.5)
+                except concurrent.futures.TimeoutError:
+                    if stop.is_set():
+                        future.cancel()
+                        raise _Stopped() from None
+
+        def run():
+            error = None
+            try:
+                with self.open(sas_code, encoding=encoding, log=log) as stream:
+                    while chunk := stream.read(chunk_size):
+                        put(chunk)
+                        if stop.is_set():
+                            raise _Stopped()
+                put(None)
+            except _Stopped:
+                pass
+            except BaseException as e:
+                error = e
+                try:
+                    put(e)
+                except _Stopped:
+                    pass
+            finally:
+                loop.call_soon_threadsafe(lambda: done.done() or done.set_result(error))
+
+        async def recv():
+            item = await q.get()
+            if isinstance(item, BaseException):
+                raise item
+            return item or ""
+
+        thread = threading.Thread(target=run, name="wrds2pg-sas-async", daemon=True)
+        thread.start()
+        try:
+            yield AsyncTextStream(recv)
+        finally:
+            stop.set()
+            while not q.empty():
+                q.get_nowait()
+            await asyncio.shield(done)
+
+class SSHTransport(SASTransport):
+    """
+    Run SAS on WRDS over SSH.
+
+    Parameters
+    ----------
+    wrds_id : str
+        WRDS user name.
+    ssh_config : SSHConfig, optional
+        Connection settings. Default is `SSHConfig.from_env()`.
+    command : str, optional
+        Remote command that reads a SAS program on stdin. Default is the
+        environment value `WRDS_SAS_COMMAND` or "qsas -stdio -noterminal".
+    """
+
+    def __init__(self, wrds_id: str, ssh_config: SSHConfig | None = None,
+                 command: str | None = None):
+        self.wrds_id = wrds_id
+        self.ssh_config = ssh_config if ssh_config is not None else SSHConfig.from_env()
+        self.command = command or os.environ.get("WRDS_SAS_COMMAND",
+                                                  "qsas -stdio -noterminal")
+
+    @contextmanager
+    def open(self, sas_code, encoding="utf-8", log=None):
+        if log is None:
+            log = SASLog()
+        client = self.ssh_config.connect(self.wrds_id)
+        try:
+            stdin, stdout, stderr = client.exec_command(self.command)
+
+            stdin.write(sas_code)
+            stdin.close()
+
+            text_stdout = io.TextIOWrapper(stdout, encoding=encoding)
+            text_stderr = io.TextIOWrapper(stderr, encoding=encoding, errors="replace")
+            # stderr shares the channel's flow-control window with stdout,
+            # so it is drained as the job runs
+            log.start(text_stderr, abort=stdout.channel.close)
+            try:
+                try:
+                    yield text_stdout
+                except BaseException as e:
+                    # The consumer failed: don't wait for SAS to finish an
+                    # export that nobody is reading.
+                    stdout.channel.close()
+                    if log.aborted:
+                        log.join()
+                        raise log.error("SAS job stopped at an error.") from e
+                    raise
+
+                # make sure the remote command finished and surface errors if any
+                exit_status = stdout.channel.recv_exit_status()
+                log.join()
+                if log.aborted:
+                    raise log.error("SAS job stopped at an error.")
+                if exit_status < 0:
+                    raise SASConnectionError(
+                        "Connection to WRDS closed before SAS finished."
+                    )
+                if exit_status > 4:
+                    raise log.error(f"Remote SAS exited with code {exit_status}.")
+            finally:
+                log.join(timeout=1.0)
+                text_stdout.close()
+                text_stderr.close()
+        finally:
+            client.close()
+
+    def _start(self, client, sas_code, encoding):
+        channel = client.get_transport().open_session()
+        channel.exec_command(self.command)
+        channel.sendall(sas_code.encode(encoding))
+        channel.shutdown_write()
+        return channel
+
+    @asynccontextmanager
+    async def open_async(self, sas_code, encoding="utf-8", log=None, chunk_size=1 << 20):
+        """
+        Run SAS on WRDS without blocking the event loop.
+
+        Connecting is done on a worker thread (paramiko has no async
+        handshake). Output is then read as it arrives: the event loop
+        watches the channel's poll descriptor and takes whatever stdout and
+        log data are buffered, so no thread waits on the channel and the
+        SSH window is refilled only as the consumer reads. Leaving the
+        `async with` block early, including by cancellation, closes the
+        channel, which ends `qsas` on WRDS.
+        """
+        if log is None:
+            log = SASLog()
+        loop = asyncio.get_running_loop()
+        client = await _run_blocking(self.ssh_config.connect, self.wrds_id,
+                                     cleanup=lambda c: c.close())
+        channel = None
+        try:
+            channel = await _run_blocking(self._start, client, sas_code, encoding,
+                                          cleanup=lambda c: c.close())
+            channel.setblocking(False)
+            fd = channel.fileno()
+            decoder = codecs.getincrementaldecoder(encoding)()
+            log_feeder = _LogFeeder(log, encoding)
+            log.attach(channel.close)
+
+            def drain_log():
+                while channel.recv_stderr_ready():
+                    log_feeder.feed(channel.recv_stderr(chunk_size))
+
+            async def readable():
+                ready = loop.create_future()
+                loop.add_reader(fd, lambda: ready.done() or ready.set_result(None))
+                try:
+                    await ready
+                finally:
+                    loop.remove_reader(fd)
+
+            async def recv():
+                while True:
+                    # the log shares the channel's window, so drain it first
+                    drain_log()
+                    if channel.recv_ready() or channel.eof_received or channel.closed:
+                        try:
+                            data = channel.recv(chunk_size)
+                        except socket.timeout:
+                            continue
+                        text = decoder.decode(data, final=not data)
+                        if text or not data:
+                            return text
+                    else:
+                        await readable()
+
+            try:
+                yield AsyncTextStream(recv)
+            except BaseException as e:
+                channel.close()
+                if log.aborted:
+                    raise log.error("SAS job stopped at an error.") from e
+                raise
+
+            exit_status = await _run_blocking(channel.recv_exit_status)
+            drain_log()
+            log_feeder.close()
+            if log.aborted:
+                raise log.error("SAS job stopped at an error.")
+            if exit_status < 0:
+                raise SASConnectionError("Connection to WRDS closed before SAS finished.")
+            if exit_status > 4:
+                raise log.error(f"Remote SAS exited with code {exit_status}.")
+        finally:
+            if channel is not None:
+                channel.close()
+            await asyncio.shield(_run_blocking(client.close))
+
+class LocalSASTransport(SASTransport):
+    """
+    Run SAS installed on this machine.
+
+    Parameters
+    ----------
+    command : list of str, optional
+        Command that reads a SAS program on stdin.
+        Default is `["sas", "-stdio", "-noterminal"]`.
+    """
+
+    def __init__(self, command: list[str] | None = None):
+        self.command = command or ["sas", "-stdio", "-noterminal"]
+
+    @contextmanager
+    def open(self, sas_code, encoding="utf-8", log=None):
+        if log is None:
+            log = SASLog()
+        proc = subprocess.Popen(
+            self.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding=encoding,
+        )
+        try:
+            assert proc.stderr is not None
+            log.start(proc.stderr, abort=proc.terminate)
+
+            assert proc.stdin is not None
+            proc.stdin.write(sas_code)
+            proc.stdin.close()
+
+            assert proc.stdout is not None
+            try:
+                yield proc.stdout
+            except BaseException as e:
+                if log.aborted:
+                    proc.wait()
+                    log.join()
+                    raise log.error("SAS job stopped at an error.") from e
+                raise
+
+            rc = proc.wait()
+            log.join()
+            if log.aborted:
+                raise log.error("SAS job stopped at an error.")
+            if rc != 0:
+                raise log.error(f"SAS exited with code {rc}.")
+        finally:
+            if proc.stdout:
+                proc.stdout.close()
+            if proc.poll() is None:
+                proc.terminate()
+            log.join(timeout=1.0)
+            if proc.stderr:
+                proc.stderr.close()
+
+    @asynccontextmanager
+    async def open_async(self, sas_code, encoding="utf-8", log=None, chunk_size=1 << 20):
+        """Run local SAS as an asyncio subprocess; cancellation terminates it."""
+        if log is None:
+            log = SASLog()
+        proc = await asyncio.create_subprocess_exec(
+            *self.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+
+        def terminate():
+            if proc.returncode is None:
+                proc.terminate()
+
+        async def drain_log():
+            log_feeder = _LogFeeder(log, encoding)
+            while data := await proc.stderr.read(chunk_size):
+                log_feeder.feed(data)
+            log_feeder.close()
+
+        decoder = codecs.getincrementaldecoder(encoding)()
+
+        async def recv():
+            while True:
+                data = await proc.stdout.read(chunk_size)
+                text = decoder.decode(data, final=not data)
+                if text or not data:
+                    return text
+
+        log.attach(terminate)
+        log_task = asyncio.ensure_future(drain_log())
+        try:
+            proc.stdin.write(sas_code.encode(encoding))
+            await proc.stdin.drain()
+            proc.stdin.close()
+
+            try:
+                yield AsyncTextStream(recv)
+            except BaseException as e:
+                if log.aborted:
+                    await proc.wait()
+                    await log_task
+                    raise log.error("SAS job stopped at an error.") from e
+                raise
+
+            rc = await proc.wait()
+            await log_task
+            if log.aborted:
+                raise log.error("SAS job stopped at an error.")
+            if rc != 0:
+                raise log.error(f"SAS exited with code {rc}.")
+        finally:
+            terminate()
+            await asyncio.shield(proc.wait())
+            log_task.cancel()
+
+_override: ContextVar[SASTransport | None] = ContextVar("wrds2pg_transport", default=None)
+
+@contextmanager
+def use_transport(transport: SASTransport):
+    """
+    Run all SAS jobs started inside the `with` block through `transport`.
+
+    This replaces both the SSH and local-SAS transports, e.g., to run the
+    whole pipeline against `FakeWRDSTransport` without a WRDS account.
+    Functions still require a `wrds_id` (any string will do).
+
+    Examples
+    ----------
+    >>> from wrds2pg.sas.fake import FakeWRDSTransport
+    >>> with use_transport(FakeWRDSTransport(rows=10_000)):
+    ...     wrds_update_pq("dsf", "crsp", wrds_id="fake", force=True)
+    """
+    token = _override.set(transport)
+    try:
+        yield transport
+    finally:
+        _override.reset(token)
+
+def get_transport(wrds_id: str | None = None, fpath: str | None = None,
+                  ssh_config: SSHConfig | None = None) -> SASTransport:
+    """
+    Return the transport for a SAS job.
+
+    A transport installed with `use_transport()` takes precedence. Otherwise
+    `fpath` selects local SAS and `wrds_id` selects SSH to WRDS.
+    """
+    override = _override.get()
+    if override is not None:
+        return override
+    if fpath is not None:
+        return LocalSASTransport()
+    if wrds_id is not None:
+        return SSHTransport(wrds_id, ssh_config=ssh_config)
+    raise ValueError("Either `wrds_id` or `fpath` must be provided.")
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import io
+import json
+import os
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+class SpoolingStream(io.TextIOBase):
+    """
+    Text stream that copies everything read from `stream` into `f`.
+
+    `complete` becomes True once `stream` has been read to the end.
+    """
+
+    def __init__(self, stream, f):
+        self._stream = stream
+        self._f = f
+        self.complete = False
+
+    def readable(self):
+        return True
+
+    def _copy(self, text, size):
+        if text:
+            self._f.write(text)
+        elif size != 0:
+            self.complete = True
+        return text
+
+    def read(self, size=-1):
+        text = self._stream.read(size)
+        if size is None or size < 0:
+            self.complete = True
+            if text:
+                self._f.write(text)
+            return text
+        return self._copy(text, size)
+
+    def readline(self, size=-1):
+        return self._copy(self._stream.readline(size), size)
+
+class ExtractSpool:
+    """
+    Local store of compressed CSV extracts from WRDS.
+
+    An extract is keyed by library, table, the options that shape the CSV
+    (`drop`, `keep`, `where`, `fix_missing` etc.) and the table's WRDS
+    last-modified stamp, so a table that has not changed on WRDS can be
+    reloaded (e.g., with different `col_types`, into another database or as
+    Parquet) without downloading it again. A new stamp gives a new key;
+    superseded extracts are eventually removed by the size limit, least
+    recently used first. Extracts are stored as decoded text (gzipped
+    UTF-8).
+
+    Parameters
+    ----------
+    directory : str, optional
+        Where extracts are stored. Default is the environment value
+        `WRDS2PG_SPOOL_DIR` or `~/.cache/wrds2pg/spool`.
+    max_bytes : int
+        Maximum total size of stored extracts.
+    compresslevel : int
+        gzip level for new extracts. The default favours speed.
+
+    Examples
+    ----------
+    >>> spool = ExtractSpool("/scratch/wrds_spool", max_bytes=200 * 1024**3)
+    >>> wrds_update_pq("dsf", "crsp", spool=spool)
+    >>> wrds_update("dsf", "crsp", spool=spool, force=True)   # replayed locally
+    """
+
+    def __init__(self, directory=None, max_bytes=50 * 1024**3, compresslevel=1):
+        if directory is None:
+            directory = os.environ.get(
+                "WRDS2PG_SPOOL_DIR", Path.home() / ".cache" / "wrds2pg" / "spool"
+            )
+        self.directory = Path(directory).expanduser()
+        self.max_bytes = max_bytes
+        self.compresslevel = compresslevel
+
+    def key(self, schema, table_name, modified, **options) -> str:
+        payload = json.dumps([schema.lower(), table_name.lower(), modified, options],
+                             sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return self.directory / f"{key}.csv.gz"
+
+    def open(self, key):
+        """Return a text stream over the extract for `key`, or None."""
+        path = self._path(key)
+        try:
+            f = gzip.open(path, mode="rt", encoding="utf-8", newline="")
+        except FileNotFoundError:
+            return None
+        os.utime(path)  # mark as recently used
+        return f
+
+    @contextmanager
+    def recording(self, key):
+        """
+        Yield a function that wraps a text stream so that what is read from
+        it is stored under `key`.
+
+        The extract is kept only if the wrapped stream is read to the end and
+        the `with` block exits without error. Open the export inside the
+        block, so that errors raised when it closes (e.g., a dropped
+        connection or a failed SAS job) discard a truncated extract.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        spooled = []
+        try:
+            with gzip.open(tmp, mode="wt", encoding="utf-8", newline="",
+                           compresslevel=self.compresslevel) as f:
+                def wrap(stream):
+                    spooled.append(SpoolingStream(stream, f))
+                    return spooled[-1]
+                yield wrap
+            if spooled and all(s.complete for s in spooled):
+                os.replace(tmp, path)
+                self.evict()
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    def evict(self) -> None:
+        """Remove least recently used extracts until the spool fits `max_bytes`."""
+        entries = []
+        for path in self.directory.glob("*.csv.gz"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self) -> None:
+        """Remove all extracts."""
+        for path in self.directory.glob("*.csv.gz"):
+            path.unlink(missing_ok=True)
+
+def get_extract_spool(spool=None) -> ExtractSpool | None:
+    """
+    Resolve the `spool` argument: an `ExtractSpool`, True (default spool),
+    False, or None (default spool if `WRDS2PG_SPOOL_DIR` is set).
+    """
+    if spool is None:
+        spool = bool(os.environ.get("WRDS2PG_SPOOL_DIR"))
+    if spool is False:
+        return None
+    if spool is True:
+        return ExtractSpool()
+    if isinstance(spool, ExtractSpool):
+        return spool
+    raise ValueError(f"Unsupported spool {spool!r}; use True or an ExtractSpool.")
@@ -0,0 +1,288 @@
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from ._utils import EncodedStream, IterStream
+from .duck import batches_to_duckdb, get_modified_duckdb
+from .files.csv import get_modified_csv, set_csv_col_types, set_modified_csv, write_csv_gz
+from .files.ipc import IPCWriter, csv_batches, get_ipc_file, get_modified_ipc
+from .files.parquet import _arrow_schema, csv_stream_to_pq, get_modified_pq
+from .files.paths import get_pq_file
+from .postgres.copy import wrds_process_to_pg
+from .postgres.ddl import (
+    create_table_sql, ensure_schema, get_table_comment, process_sql, set_table_comment,
+)
+from .progress import as_progress
+
+class PostgresSink:
+    """
+    Load the table into PostgreSQL with COPY, as `wrds_update()` does.
+
+    The table is replaced and its comment set to the WRDS last-modified
+    stamp once the load completes.
+
+    Parameters
+    ----------
+    engine : SQLAlchemy engine, optional
+        Default is `make_engine()`.
+    create_roles : bool
+        Create and grant the schema roles, as in `wrds_update()`.
+    tz : str
+        PostgreSQL time zone used during import.
+    """
+
+    def __init__(self, engine=None, create_roles=True, tz="UTC"):
+        if engine is None:
+            from .postgres.engine import make_engine
+
+            engine = make_engine()
+        self.engine = engine
+        self.create_roles = create_roles
+        self.tz = tz
+        self.name = f"pg:{engine.url.host or ''}/{engine.url.database}"
+
+    def modified(self, schema, table_name):
+        return get_table_comment(table_name, schema, self.engine)
+
+    def write(self, stream, schema, table_name, meta, modified, encoding, progress):
+        ensure_schema(schema, self.engine, create_roles=self.create_roles)
+        process_sql(f'DROP TABLE IF EXISTS "{schema}"."{table_name}" CASCADE', self.engine)
+        process_sql(create_table_sql(schema, table_name, meta["names"], meta["col_types"]),
+                    self.engine)
+        wrds_process_to_pg(table_name, schema, self.engine, stream, tz=self.tz,
+                           progress=progress)
+        set_table_comment(table_name, schema, modified, self.engine)
+        if self.create_roles:
+            process_sql(f'ALTER TABLE "{schema}"."{table_name}" OWNER TO "{schema}"',
+                        self.engine)
+            process_sql(f'GRANT SELECT ON "{schema}"."{table_name}" TO "{schema}_access"',
+                        self.engine)
+
+class ParquetSink:
+    """
+    Write `{data_dir}/{schema}/{table}.parquet`, as `wrds_update_pq()` does.
+
+    CSV is parsed as it arrives (no temporary CSV file) into a temporary
+    Parquet file that replaces the old one when complete.
+
+    Parameters
+    ----------
+    data_dir : str, optional
+        Default is the environment value `DATA_DIR`.
+    memory_limit : int or str, optional
+        Memory budget for the conversion, as for `wrds_update_pq()`.
+    """
+
+    def __init__(self, data_dir=None, memory_limit=None):
+        if data_dir is None:
+            data_dir = os.environ.get("DATA_DIR")
+        if data_dir is None:
+            raise ValueError("You must provide `data_dir` or set the `DATA_DIR` environment variable.")
+        self.data_dir = data_dir
+        self.memory_limit = memory_limit
+        self.name = f"parquet:{data_dir}"
+
+    def modified(self, schema, table_name):
+        return get_modified_pq(get_pq_file(table_name, schema, self.data_dir, create=False))
+
+    def write(self, stream, schema, table_name, meta, modified, encoding, progress):
+        pq_file = get_pq_file(table_name, schema, self.data_dir)
+        tmp = pq_file.with_name(f".{pq_file.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            csv_stream_to_pq(EncodedStream(stream, encoding), tmp, meta["names"],
+                             meta["col_types"], modified, memory_limit=self.memory_limit,
+                             progress=progress)
+            os.replace(tmp, pq_file)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+class IPCSink:
+    """
+    Write `{data_dir}/{schema}/{table}.arrow`, as `wrds_update_ipc()` does.
+
+    Parameters
+    ----------
+    data_dir : str, optional
+        Default is the environment value `DATA_DIR`.
+    compression : str, optional
+        None (memory-mappable), "lz4" or "zstd".
+    """
+
+    def __init__(self, data_dir=None, compression=None):
+        if data_dir is None:
+            data_dir = os.environ.get("DATA_DIR")
+        if data_dir is None:
+            raise ValueError("You must provide `data_dir` or set the `DATA_DIR` environment variable.")
+        self.data_dir = data_dir
+        self.compression = compression
+        self.name = f"ipc:{data_dir}"
+
+    def modified(self, schema, table_name):
+        return get_modified_ipc(get_ipc_file(table_name, schema, self.data_dir, create=False))
+
+    def write(self, stream, schema, table_name, meta, modified, encoding, progress):
+        ipc_file = get_ipc_file(table_name, schema, self.data_dir)
+        with IPCWriter(ipc_file, modified, compression=self.compression, progress=progress,
+                       schema=_arrow_schema(meta["names"], meta["col_types"])) as writer:
+            for batch in csv_batches(EncodedStream(stream, encoding), meta["names"],
+                                     meta["col_types"], progress=progress):
+                writer.write_batch(batch)
+
+class DuckDBSink:
+    """
+    Write `schema.table` in a DuckDB database, as `wrds_update_duckdb()` does.
+
+    Parameters
+    ----------
+    database : str, optional
+        Path of the database file. Default is the environment value
+        `DUCKDB_DATABASE`.
+    """
+
+    def __init__(self, database=None):
+        if database is None:
+            database = os.environ.get("DUCKDB_DATABASE")
+        if database is None:
+            raise ValueError("You must provide `database` or set the"
+                             " `DUCKDB_DATABASE` environment variable.")
+        self.database = database
+        self.name = f"duckdb:{database}"
+
+    def modified(self, schema, table_name):
+        return get_modified_duckdb(table_name, schema, self.database)
+
+    def write(self, stream, schema, table_name, meta, modified, encoding, progress):
+        batches = csv_batches(EncodedStream(stream, encoding), meta["names"],
+                              meta["col_types"], progress=progress)
+        batches_to_duckdb(batches, table_name, schema, meta["names"], meta["col_types"],
+                          modified, self.database, progress=progress)
+
+class CSVSink:
+    """
+    Write `{data_dir}/{schema}/{table}.csv.gz`, as `wrds_update_csv()` does.
+
+    Parameters
+    ----------
+    data_dir : str, optional
+        Default is the environment value `CSV_DIR`.
+    """
+
+    def __init__(self, data_dir=None):
+        if data_dir is None:
+            data_dir = os.environ.get("CSV_DIR")
+        if data_dir is None:
+            raise ValueError("You must provide `data_dir` or set the `CSV_DIR` environment variable.")
+        self.data_dir = data_dir
+        self.name = f"csv:{data_dir}"
+
+    def _path(self, schema, table_name):
+        return Path(self.data_dir) / schema / f"{table_name}.csv.gz"
+
+    def modified(self, schema, table_name):
+        csv_file = self._path(schema, table_name)
+        return get_modified_csv(csv_file) if csv_file.exists() else ""
+
+    def write(self, stream, schema, table_name, meta, modified, encoding, progress):
+        csv_file = self._path(schema, table_name)
+        csv_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = csv_file.with_name(f".{csv_file.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            write_csv_gz(stream, tmp, encoding=encoding, progress=progress)
+            set_modified_csv(tmp, modified)
+            set_csv_col_types(csv_file, meta["names"], meta["col_types"])
+            os.replace(tmp, csv_file)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+def _queue_chunks(q):
+    """Yield text chunks from `q` until None; raise an exception put on it."""
+    while True:
+        chunk = q.get()
+        if chunk is None:
+            return
+        if isinstance(chunk, BaseException):
+            raise chunk
+        yield chunk
+
+class _Branch:
+    """One sink with its queue and consumer thread."""
+
+    def __init__(self, sink, max_chunks, args):
+        self.sink = sink
+        self.queue = queue.Queue(maxsize=max_chunks)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, args=args,
+                                       name=f"wrds2pg-tee-{sink.name}", daemon=True)
+
+    def _run(self, *args):
+        try:
+            self.sink.write(IterStream(_queue_chunks(self.queue)), *args)
+        except BaseException as e:
+            self.error = e
+
+    def put(self, item):
+        """Put `item` on the queue; False if the sink has stopped reading."""
+        while self.thread.is_alive():
+            try:
+                self.queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+def tee_stream(open_stream, sinks, schema, table_name, meta, modified,
+               encoding="utf-8", chunk_size=1 << 20, max_chunks=8, progress=None):
+    """
+    Copy one CSV text stream to each of `sinks` concurrently.
+
+    `open_stream` returns a context manager yielding the stream (e.g.,
+    `get_wrds_process_stream()`); sinks see the end of the data only after
+    it exits cleanly, so a SAS error reported at exit aborts every sink.
+    Each sink reads from its own queue of at most `max_chunks` chunks of
+    `chunk_size` characters in its own thread, so memory use is bounded and
+    reading from WRDS runs at the pace of the slowest sink. A sink that
+    fails stops receiving data; the others continue.
+
+    Returns
+    -------
+    dict mapping each sink's `name` to None (success) or the exception it
+    raised. If reading the stream fails, or every sink fails, all sinks are
+    aborted and the error is raised.
+    """
+    progress = as_progress(progress)
+    branches = [
+        _Branch(sink, max_chunks,
+                (schema, table_name, meta, modified, encoding, progress))
+        for sink in sinks
+    ]
+    for branch in branches:
+        branch.thread.start()
+
+    end = None
+    try:
+        with open_stream() as stream:
+            while True:
+                t0 = time.perf_counter()
+                chunk = stream.read(chunk_size)
+                t1 = time.perf_counter()
+                if not chunk:
+                    break
+                if not [branch for branch in branches if branch.put(chunk)]:
+                    raise branches[0].error
+                progress.add("tee", bytes=len(chunk), busy=time.perf_counter() - t1,
+                             wait=t1 - t0)
+    except BaseException as e:
+        end = e
+        raise
+    finally:
+        for branch in branches:
+            branch.put(end)
+        for branch in branches:
+            branch.thread.join()
+
+    return {branch.sink.name: branch.error for branch in branches}